@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the Wedding Invitation Service backend.
+
+Usage (from the backend directory):
+    python benchmarks.py importtime [--budget-ms 800] [--output report.json]
+    python benchmarks.py storage [--engines memory,sqlite,mongodb] [--documents 5000]
+    python benchmarks.py traces [--requests 20] [--output traces.json]
+    python benchmarks.py records [--iterations 2000] [--output records.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+
+IMPORT_TIME_BUDGET_MS = float(os.environ.get('IMPORT_TIME_BUDGET_MS', '800'))
+
+def parse_importtime(stderr: str):
+    """Parse `python -X importtime` output into (module, self_us, cumulative_us, depth) rows"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # One separator space, then two spaces per nesting level
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+def bench_importtime(args) -> int:
+    """Measure the import cost of `server` and break it down by direct import"""
+    runs = []
+    for _ in range(args.repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import server"],
+            cwd=BACKEND_DIR, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(result.stderr[-2000:], file=sys.stderr)
+            return 2
+        runs.append(parse_importtime(result.stderr))
+
+    # Best of N: the least noisy estimate of the cold import cost
+    rows = min(runs, key=lambda r: next(c for name, _, c, d in r if name == "server"))
+    server_index = next(i for i, row in enumerate(rows) if row[0] == "server")
+    _, _, total_us, server_depth = rows[server_index]
+
+    # Children are reported before their parent, so walk back from `server`
+    direct = []
+    for name, _, cumulative, depth in reversed(rows[:server_index]):
+        if depth <= server_depth:
+            break
+        if depth == server_depth + 1:
+            direct.append((name, cumulative))
+    direct.sort(key=lambda item: item[1], reverse=True)
+
+    report = {
+        "total_ms": round(total_us / 1000, 1),
+        "budget_ms": args.budget_ms,
+        "within_budget": total_us / 1000 <= args.budget_ms,
+        "imports": [{"module": name, "cumulative_ms": round(c / 1000, 1)} for name, c in direct]
+    }
+
+    print(f"import server: {report['total_ms']}ms (budget {args.budget_ms}ms)")
+    for entry in report["imports"][:args.top]:
+        print(f"  {entry['cumulative_ms']:>8.1f}ms  {entry['module']}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    if not report["within_budget"]:
+        print("❌ Import time budget exceeded")
+        return 1
+    print("✅ Import time within budget")
+    return 0
+
+async def time_storage_engine(engine, documents: int) -> dict:
+    """Time bulk inserts, indexed lookups, scans with sort and updates"""
+    timings = {}
+    batch = [
+        {"id": f"bench-{i}", "user_id": f"user-{i % 100}", "url_slug": f"bench-slug-{i}", "views": i % 1000,
+         "created_at": datetime(2030, 1, 1) + timedelta(seconds=i), "invitation_data": {"bride_name": "B", "groom_name": "G"}}
+        for i in range(documents)
+    ]
+    start = time.perf_counter()
+    await engine.insert_many('invitations', batch)
+    timings["insert_many_ms"] = (time.perf_counter() - start) * 1000
+
+    lookups = min(documents, 2000)
+    start = time.perf_counter()
+    for i in range(lookups):
+        await engine.find_one('invitations', {"url_slug": f"bench-slug-{i * 7 % documents}"})
+    timings["find_one_indexed_us"] = (time.perf_counter() - start) * 1e6 / lookups
+
+    start = time.perf_counter()
+    for i in range(100):
+        await engine.find('invitations', {"user_id": f"user-{i}"}, {"_id": 0, "id": 1, "views": 1}, sort=[("views", -1)], limit=20)
+    timings["find_sorted_projected_us"] = (time.perf_counter() - start) * 1e6 / 100
+
+    start = time.perf_counter()
+    await engine.count('invitations', {"views": {"$gte": 500}})
+    timings["count_range_ms"] = (time.perf_counter() - start) * 1000
+
+    updates = min(documents, 500)
+    start = time.perf_counter()
+    for i in range(updates):
+        await engine.update_one('invitations', {"id": f"bench-{i}"}, {"$inc": {"views": 1}})
+    timings["update_one_us"] = (time.perf_counter() - start) * 1e6 / updates
+    return {name: round(value, 2) for name, value in timings.items()}
+
+async def run_storage_benchmarks(args) -> dict:
+    from storage import MemoryEngine, MongoEngine, SQLiteEngine
+
+    report = {}
+    for name in args.engines.split(','):
+        with tempfile.TemporaryDirectory() as tmp:
+            if name == 'memory':
+                make = MemoryEngine
+            elif name == 'sqlite':
+                make = lambda: SQLiteEngine(str(Path(tmp) / f"bench-{time.monotonic_ns()}.db"))
+            elif name == 'mongodb':
+                db_name = f"storage_bench_{os.getpid()}"
+                make = lambda: MongoEngine(args.mongo_url, db_name, {"serverSelectionTimeoutMS": 2000})
+            else:
+                raise SystemExit(f"unknown engine {name}")
+
+            results = {}
+            engine = make()
+            try:
+                await engine.connect()
+                await engine.ensure_indexes()
+                results["timings"] = await time_storage_engine(engine, args.documents)
+            except Exception as e:
+                results["failures"] = [f"{type(e).__name__}: {e}"]
+            finally:
+                if name == 'mongodb':
+                    try:
+                        await engine.client.drop_database(db_name)
+                    except Exception:
+                        pass
+                await engine.close()
+            report[name] = results
+    return report
+
+def bench_storage(args) -> int:
+    """Timings for each storage engine (conformance lives in tests/test_storage.py)"""
+    report = asyncio.run(run_storage_benchmarks(args))
+    failed = False
+    for name, results in report.items():
+        failures = results.get("failures", [])
+        failed = failed or bool(failures)
+        print(f"{name}: {'✅' if not failures else '❌ failed'}")
+        for failure in failures:
+            print(f"    {failure}")
+        for metric, value in results.get("timings", {}).items():
+            print(f"  {value:>10.2f}  {metric}")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 1 if failed else 0
+
+# Spans each route's trace must contain (first request of each kind)
+EXPECTED_SPANS = {
+    "create_invitation": {"db.find_one", "qr.generate", "db.insert_one"},
+    "get_public_invitation": {"db.find_one", "model.build"},
+    "get_user_invitations": {"db.find", "model.build"},
+}
+
+def check_trace(spans: list) -> list:
+    """Structural checks on one trace; returns failure messages"""
+    failures = []
+    by_id = {span["span_id"]: span for span in spans}
+    roots = [span for span in spans if span["parent_id"] not in by_id]
+    if len(roots) != 1:
+        failures.append(f"expected one root span, got {len(roots)}")
+    for span in spans:
+        parent = by_id.get(span["parent_id"])
+        if parent is None:
+            continue
+        if span["trace_id"] != parent["trace_id"]:
+            failures.append(f"{span['name']} has another trace id than its parent")
+        # Microsecond timestamps are truncated independently, so allow one tick
+        if span["start_unix_us"] + 1 < parent["start_unix_us"] or \
+                span["start_unix_us"] + span["duration_us"] > parent["start_unix_us"] + parent["duration_us"] + 1:
+            failures.append(f"{span['name']} is not within its parent {parent['name']}")
+    return failures
+
+def bench_traces(args) -> int:
+    """Drive requests through the app with the in-memory trace exporter and check the span trees"""
+    os.environ.update({"STORAGE_ENGINE": "memory", "TRACING_EXPORTER": "memory", "TRACE_SAMPLE_RATE": "1",
+                       "RATE_LIMIT_ENABLED": "false", "SNAPSHOTS_ENABLED": "false"})  # public views must reach the app
+    sys.path.insert(0, str(BACKEND_DIR))
+    import logging
+    import server
+    from fastapi.testclient import TestClient
+
+    logging.disable(logging.INFO)
+    exporter = server.trace_exporter
+    invitation_data = {"bride_name": "Ann", "groom_name": "Ben", "wedding_date": "2030-06-01", "wedding_time": "16:00",
+                       "venue_name": "The Barn", "venue_address": "1 Farm Lane"}
+
+    async def login():
+        user = server.User(email="bench@example.com", name="Bench")
+        await server.db_insert_one('users', user.dict())
+        return await server.create_session(user)
+
+    with TestClient(server.app) as client:
+        headers = {"Authorization": f"Bearer {client.portal.call(login)}"}
+        exporter.clear()
+        slugs = []
+        for _ in range(args.requests):
+            response = client.post("/api/invitations", json={"template_id": "classic-elegance", "invitation_data": invitation_data},
+                                   headers=headers)
+            response.raise_for_status()
+            slugs.append(response.json()["url_slug"])
+        for slug in slugs:
+            client.get(f"/api/public/invitations/{slug}").raise_for_status()
+        client.get("/api/invitations", headers=headers).raise_for_status()
+        response = client.get("/api/invitations", headers={**headers, "traceparent": f"00-{'ab' * 16}-{'cd' * 8}-01"})
+        continued = response.headers.get("x-trace-id") == "ab" * 16
+
+    failures = [] if continued else ["incoming traceparent was not continued"]
+    seen = set()
+    routes = defaultdict(lambda: {"requests": 0, "total_ms": 0.0, "spans": defaultdict(float)})
+    for trace in exporter.traces:
+        failures.extend(check_trace(trace))
+        root = next(span for span in trace if span["name"] == "http.request")
+        route = root["attributes"].get("route", root["attributes"]["path"])
+        names = {span["name"] for span in trace}
+        if route in EXPECTED_SPANS and route not in seen:
+            seen.add(route)
+            missing = EXPECTED_SPANS[route] - names
+            if missing:
+                failures.append(f"{route}: missing spans {sorted(missing)}")
+        stats = routes[route]
+        stats["requests"] += 1
+        stats["total_ms"] += root["duration_us"] / 1000
+        for span in trace:
+            if span is not root:
+                stats["spans"][span["name"]] += span["duration_us"] / 1000
+    failures.extend(f"{route}: no trace recorded" for route in EXPECTED_SPANS if route not in seen)
+
+    report = {}
+    for route, stats in routes.items():
+        count = stats["requests"]
+        report[route] = {
+            "requests": count,
+            "mean_ms": round(stats["total_ms"] / count, 3),
+            "mean_span_ms": {name: round(total / count, 3) for name, total in
+                             sorted(stats["spans"].items(), key=lambda item: -item[1])}
+        }
+        print(f"{route}: {count} request(s), {report[route]['mean_ms']:.3f}ms mean")
+        for name, value in report[route]["mean_span_ms"].items():
+            print(f"  {value:>10.3f}ms  {name}")
+    if args.output:
+        Path(args.output).write_text(json.dumps({"routes": report, "failures": failures}, indent=2))
+
+    for failure in failures:
+        print(f"    {failure}")
+    print("❌ Trace checks failed" if failures else "✅ Span trees complete and well-formed")
+    return 1 if failures else 0
+
+def measure(func, iterations: int) -> dict:
+    """CPU per call (best of 5 rounds) and peak traced allocation of one call"""
+    func()
+    best = float("inf")
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        best = min(best, (time.perf_counter() - started) / iterations)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    func()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return {"us": round(best * 1e6, 2), "peak_kb": round(peak / 1024, 1)}
+
+def bench_records(args) -> int:
+    """Compare the pydantic read path with records, per request shape"""
+    os.environ.setdefault("STORAGE_ENGINE", "memory")
+    sys.path.insert(0, str(BACKEND_DIR))
+    import logging
+    import records
+    import server
+    from fastapi.encoders import jsonable_encoder
+    from starlette.responses import JSONResponse
+
+    logging.disable(logging.INFO)
+    # Stored documents, as the app writes them
+    templates = [server.Template(**template).dict() for template in server.DEFAULT_TEMPLATES]
+    user = server.User(email="bench@example.com", name="Bench").dict()
+    invitation = server.Invitation(
+        user_id=user["id"], template_id=templates[0]["id"], url_slug="abc123", qr_code="data:image/png;base64," + "A" * 1500,
+        invitation_data=server.InvitationData(
+            bride_name="Ann", groom_name="Ben", wedding_date="2030-06-01", wedding_time="16:00", venue_name="The Barn",
+            venue_address="1 Farm Lane", events=[{"name": "Dinner", "time": "19:00"}] * 3)
+    ).dict()
+    invitations = [{**invitation, "id": f"inv-{i}"} for i in range(20)]
+
+    def legacy(content) -> bytes:
+        return JSONResponse(jsonable_encoder(content)).body
+
+    def record(content) -> bytes:
+        return server.RecordResponse(content).body
+
+    shapes = {
+        "session_user": (lambda: server.User(**user), lambda: server.UserRecord.from_doc(user)),
+        "auth_me": (lambda: legacy(server.User(**user)), lambda: record(server.UserRecord.from_doc(user))),
+        "template_catalog": (lambda: legacy([server.Template(**t) for t in templates]),
+                             lambda: record(server.TemplateRecord.from_docs(templates))),
+        "public_invitation": (
+            lambda: legacy({"invitation": server.Invitation(**invitation), "template": server.Template(**templates[0])}),
+            lambda: record({"invitation": server.InvitationRecord.from_doc(invitation),
+                            "template": server.TemplateRecord.from_doc(templates[0])})),
+        "invitation_list_20": (lambda: legacy([server.Invitation(**inv) for inv in invitations]),
+                               lambda: record(server.InvitationRecord.from_docs(invitations))),
+    }
+
+    failures = []
+    report = {}
+    print(f"{'shape':<20} {'pydantic us':>12} {'records us':>11} {'speedup':>8} {'pydantic KiB':>13} {'records KiB':>12}")
+    for name, (old, new) in shapes.items():
+        if name != "session_user" and old() != new():
+            failures.append(f"{name}: record response differs from the pydantic one")
+        before, after = measure(old, args.iterations), measure(new, args.iterations)
+        report[name] = {"pydantic": before, "records": after, "speedup": round(before["us"] / after["us"], 2)}
+        print(f"{name:<20} {before['us']:>12.2f} {after['us']:>11.2f} {report[name]['speedup']:>7.2f}x "
+              f"{before['peak_kb']:>13.1f} {after['peak_kb']:>12.1f}")
+    report["encoder"] = "json" if records.orjson is None else "orjson"
+    print(f"encoder: {report['encoder']}")
+    if args.output:
+        Path(args.output).write_text(json.dumps({"shapes": report, "failures": failures}, indent=2))
+
+    for failure in failures:
+        print(f"    {failure}")
+    print("❌ Record responses differ" if failures else "✅ Record responses match the pydantic ones")
+    return 1 if failures else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    importtime = subparsers.add_parser("importtime", help="cold import time of the server module")
+    importtime.add_argument("--budget-ms", type=float, default=IMPORT_TIME_BUDGET_MS)
+    importtime.add_argument("--repeat", type=int, default=3)
+    importtime.add_argument("--top", type=int, default=15)
+    importtime.add_argument("--output", help="write the JSON breakdown here")
+    importtime.set_defaults(run=bench_importtime)
+
+    storage = subparsers.add_parser("storage", help="storage engine timings")
+    storage.add_argument("--engines", default="memory,sqlite", help="comma-separated: memory, sqlite, mongodb")
+    storage.add_argument("--documents", type=int, default=5000)
+    storage.add_argument("--mongo-url", default=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    storage.add_argument("--output", help="write the JSON report here")
+    storage.set_defaults(run=bench_storage)
+
+    traces = subparsers.add_parser("traces", help="span trees of traced requests (in-memory exporter)")
+    traces.add_argument("--requests", type=int, default=20)
+    traces.add_argument("--output", help="write the JSON report here")
+    traces.set_defaults(run=bench_traces)
+
+    records = subparsers.add_parser("records", help="pydantic vs record read path: CPU and allocation per request")
+    records.add_argument("--iterations", type=int, default=2000)
+    records.add_argument("--output", help="write the JSON report here")
+    records.set_defaults(run=bench_records)
+
+    args = parser.parse_args()
+    sys.exit(args.run(args))
+
+if __name__ == "__main__":
+    main()
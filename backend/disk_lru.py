@@ -0,0 +1,124 @@
+"""A size-bounded file cache in one directory, shared by every worker.
+
+Each worker keeps an in-memory index of the files in access order and their
+running byte total, built from one directory scan at startup; after that a
+write evicts from the front of the index without listing the directory. A
+file's mtime is its last use (bumped on reads, at most once a minute), so the
+startup scan recovers the order.
+
+Other workers add and delete files behind the index's back. A read confirms
+the file with a stat and corrects the index; an unlink of a file that is
+already gone is ignored. Files another worker wrote are only counted once
+read here, so the directory can run over budget by what the other workers
+wrote since startup, up to one budget per worker.
+
+Writes go to a temporary name and are renamed into place, so a reader never
+sees a partial file.
+"""
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+TOUCH_INTERVAL = 60
+
+class DiskLRUCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()  # name -> size, least recently used first
+        self._total = 0
+        self._lock = threading.Lock()  # puts run in worker threads
+        self._load()
+
+    def _load(self):
+        """Index the files already on disk, oldest use first"""
+        entries = []
+        try:
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if entry.name.startswith(".tmp-") or not entry.is_file():
+                        continue
+                    try:
+                        stat_result = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat_result.st_mtime, entry.name, stat_result.st_size))
+        except FileNotFoundError:
+            return
+        entries.sort()
+        with self._lock:
+            for _, name, size in entries:
+                self._record(name, size)
+
+    def _record(self, name: str, size: int):
+        self._total += size - self._entries.pop(name, 0)
+        self._entries[name] = size
+
+    def _forget(self, name: str):
+        self._total -= self._entries.pop(name, 0)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str) -> Optional[str]:
+        """Path of a cached file, or None"""
+        path = self.path(name)
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(name)  # evicted by another worker
+            self.misses += 1
+            return None
+        with self._lock:
+            self._record(name, stat_result.st_size)
+        self.hits += 1
+        now = time.time()
+        if now - stat_result.st_mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except FileNotFoundError:
+                pass  # evicted by another worker since; the caller gets a miss on open
+        return path
+
+    def put(self, name: str, data: bytes) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.chmod(temporary, 0o644)
+            os.replace(temporary, self.path(name))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        with self._lock:
+            self._record(name, len(data))
+        self.evict()
+        return self.path(name)
+
+    def evict(self):
+        """Delete least recently used files until the index fits its budget"""
+        while True:
+            with self._lock:
+                if self._total <= self.max_bytes or not self._entries:
+                    return
+                name, size = self._entries.popitem(last=False)
+                self._total -= size
+            try:
+                os.unlink(self.path(name))
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "entries": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes
+        }
@@ -0,0 +1,109 @@
+"""Statistical profiling of individual requests.
+
+A sampler thread periodically captures the event loop thread's stack and
+credits it to the request whose handler is running at that moment, found by
+the frame that started its profile. Several requests can be profiled at once,
+and time spent awaiting I/O is not counted against any of them.
+
+Profiles keep collapsed stacks ("outer;inner;leaf 12"), the input format of
+flamegraph.pl, speedscope and inferno.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Optional
+
+def _label(code) -> str:
+    path = code.co_filename.replace(os.sep, "/").rsplit("/", 2)
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+class RequestProfile:
+    """Samples and timings collected for one request"""
+
+    def __init__(self, profile_id: str, method: str, path: str, interval: float):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.created_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status: Optional[int] = None
+        self.samples = 0
+        self.stacks: Counter = Counter()  # tuple of code objects, outermost first -> samples
+
+    def finish(self, status: Optional[int]):
+        self.duration_ms = round((time.perf_counter() - self.started) * 1000, 2)
+        self.status = status
+
+    def folded(self) -> str:
+        return "\n".join(
+            f"{';'.join(_label(code) for code in stack)} {count}"
+            for stack, count in self.stacks.most_common()
+        )
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            # Samples only land while the request runs on the loop, so this
+            # approximates on-CPU time; the rest of duration_ms was spent waiting
+            "sampled_ms": round(self.samples * self.interval * 1000, 2),
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "created_at": self.created_at.isoformat(),
+            "pid": os.getpid()
+        }
+
+class StackSampler:
+    """Samples one thread's stack while at least one profile is active
+
+    The sampler thread only runs while something is being profiled. It wakes
+    every `interval` seconds, but needs the GIL to take a sample, so CPU-bound
+    stretches are sampled at most once per interpreter switch interval.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._active: Dict[object, RequestProfile] = {}  # owning frame -> profile
+        self._thread: Optional[threading.Thread] = None
+        self._target: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def start(self, frame, profile: RequestProfile):
+        """Credit samples taken beneath `frame` (on this thread) to `profile`"""
+        with self._lock:
+            self._target = threading.get_ident()
+            self._active[frame] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self, frame):
+        with self._lock:
+            self._active.pop(frame, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                frame = sys._current_frames().get(self._target)
+                stack = []
+                while frame is not None:
+                    profile = self._active.get(frame)
+                    if profile is not None:
+                        stack.reverse()
+                        profile.stacks[tuple(stack)] += 1
+                        profile.samples += 1
+                        break
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
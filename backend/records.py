@@ -0,0 +1,97 @@
+"""Compact records for documents read back from storage.
+
+Everything in the database was validated by a pydantic model on its way in,
+so the read paths don't need to validate it again. Records are slotted
+dataclasses built straight from the stored dict (unknown keys such as Mongo's
+`_id` are dropped, missing optional fields take their defaults) and are
+encoded to JSON without going through FastAPI's jsonable_encoder.
+
+Pydantic models stay the schema for request bodies and for new documents.
+orjson is used for encoding when installed; the stdlib fallback produces the
+same JSON.
+"""
+import json
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional accelerator
+    orjson = None
+
+class Record:
+    """Base for records; subclasses are `@dataclass(slots=True)`"""
+    __slots__ = ()
+
+    @classmethod
+    def from_doc(cls, doc: dict):
+        """Build from a stored document, without validation"""
+        # A slotted dataclass lists its fields, in order, in __slots__
+        return cls(**{name: doc[name] for name in cls.__slots__ if name in doc})
+
+    @classmethod
+    def from_docs(cls, docs: List[dict]) -> list:
+        return [cls.from_doc(doc) for doc in docs]
+
+    def to_doc(self) -> dict:
+        """Plain dict for storage or encoding (nested values are shared, not copied)"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+@dataclass(slots=True)
+class UserRecord(Record):
+    id: str
+    email: str
+    name: str
+    picture: Optional[str] = None
+    premium: bool = False
+    stripe_customer_id: Optional[str] = None
+    session_token: Optional[str] = None
+    created_at: Optional[datetime] = None
+    last_login: Optional[datetime] = None
+
+@dataclass(slots=True)
+class TemplateRecord(Record):
+    id: str
+    name: str
+    description: str
+    theme: str
+    preview_url: str
+    html_content: str
+    css_content: str
+    is_premium: bool = False
+    owner_id: Optional[str] = None
+    keywords: List[str] = field(default_factory=list)
+    created_at: Optional[datetime] = None
+
+@dataclass(slots=True)
+class InvitationRecord(Record):
+    id: str
+    user_id: str
+    template_id: str
+    invitation_data: Dict[str, Any]
+    url_slug: str
+    qr_code: Optional[str] = None
+    is_published: bool = False
+    version: int = 1
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+def _default(value):
+    if isinstance(value, Record):
+        return value.to_doc()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, 'model_dump'):
+        return value.model_dump()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def encode_json(content) -> bytes:
+    """JSON for records, pydantic models and plain containers of them"""
+    if orjson is not None:
+        # Records go through _default rather than orjson's dataclass support,
+        # so both paths emit the fields in declaration order
+        return orjson.dumps(content, default=_default, option=orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,225 @@
+"""CPU-bound rendering of invitation artifacts.
+
+Runs inside process-pool workers, so it deliberately imports nothing from the
+application: workers start fast and never touch the database or event loop.
+"""
+import base64
+import hashlib
+import io
+import json
+import re
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Colours lifted from the default template stylesheets
+THEME_PALETTES = {
+    "classic": {"background": "#f8f6f0", "card": "#ffffff", "text": "#1a1a1a", "muted": "#666666", "accent": "#d4af37"},
+    "modern": {"background": "#667eea", "card": "#ffffff", "text": "#2c2c2c", "muted": "#666666", "accent": "#ff6b6b"},
+    "boho": {"background": "#d7ccc8", "card": "#ffffff", "text": "#5d4037", "muted": "#8d6e63", "accent": "#cd853f"},
+    "floral": {"background": "#fce4ec", "card": "#ffffff", "text": "#4a148c", "muted": "#8e24aa", "accent": "#e91e63"},
+}
+
+PAGE_SIZE = (1240, 1754)  # A4 at 150 dpi
+PAGE_DPI = 150
+PAGE_MARGIN = 90
+QR_SIZE = 300
+QR_BOX_SIZE = 10
+QR_BORDER = 5
+# Any of the eight masks yields a valid code; picking the "best" one scores all
+# eight and is two thirds of the encoding time, so batches use a fixed mask
+QR_BATCH_MASK = 0
+
+# Template previews: the sample invitation on the template's page, by width
+THUMBNAIL_WIDTHS = {"sm": 240, "md": 480, "lg": 960}
+THUMBNAIL_FORMATS = {"webp": "image/webp", "avif": "image/avif"}
+THUMBNAIL_ENCODING = {"webp": {"format": "WEBP", "quality": 80, "method": 4}, "avif": {"format": "AVIF", "quality": 60, "speed": 6}}
+THUMBNAIL_VERSION = 2  # bump with layout changes, which the digest cannot see
+SAMPLE_INVITATION = {
+    "invitation_data": {
+        "bride_name": "Emma",
+        "groom_name": "James",
+        "wedding_date": "Saturday, June 14",
+        "wedding_time": "4:00 PM",
+        "venue_name": "Rosewood Manor",
+        "venue_address": "12 Garden Lane",
+        "events": [{"name": "Reception", "time": "6:00 PM"}]
+    }
+}
+
+# Colour declarations in a template stylesheet, and the first hex colour in one
+CSS_COLOR_DECLARATION = re.compile(r"(background(?:-color)?|(?<![-\w])color|border(?:-color)?)\s*:\s*([^;}]+)")
+HEX_COLOR = re.compile(r"#(?:[0-9a-fA-F]{6}|[0-9a-fA-F]{3})\b")
+
+_fonts = {}
+
+def _font(size: int, serif: bool = True):
+    key = (size, serif)
+    if key not in _fonts:
+        try:
+            _fonts[key] = ImageFont.truetype("DejaVuSerif.ttf" if serif else "DejaVuSans.ttf", size)
+        except OSError:
+            try:
+                _fonts[key] = ImageFont.load_default(size=size)
+            except TypeError:  # Pillow < 10.1 has a single fixed-size bitmap font
+                _fonts[key] = ImageFont.load_default()
+    return _fonts[key]
+
+def _wrap(draw, text: str, font, max_width: int):
+    lines, current = [], ""
+    for word in text.split():
+        candidate = f"{current} {word}".strip()
+        if current and draw.textlength(candidate, font=font) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return lines
+
+def _draw_centered(draw, text: str, font, fill: str, y: int, width: int, max_width: int, spacing: int = 12) -> int:
+    """Draw wrapped, horizontally centred text and return the next free y"""
+    for line in _wrap(draw, text, font, max_width):
+        left, top, right, bottom = draw.textbbox((0, 0), line, font=font)
+        draw.text(((width - (right - left)) / 2, y), line, font=font, fill=fill)
+        y += (bottom - top) + spacing
+    return y
+
+def _decode_data_url(data_url: str) -> Image.Image:
+    encoded = data_url.split(",", 1)[1] if "," in data_url else data_url
+    return Image.open(io.BytesIO(base64.b64decode(encoded))).convert("RGB")
+
+def qr_code_png(data: str, mask_pattern: int = None) -> bytes:
+    """Encode data as a black-on-white QR code PNG
+
+    The image is scaled up from the module matrix in one step; qrcode's own image
+    factory draws every module as a separate rectangle.
+    """
+    import qrcode
+    
+    qr = qrcode.QRCode(version=1, box_size=QR_BOX_SIZE, border=QR_BORDER, mask_pattern=mask_pattern)
+    qr.add_data(data)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()  # includes the border
+    modules = len(matrix)
+    image = Image.frombytes("L", (modules, modules), bytes(0 if dark else 255 for row in matrix for dark in row))
+    image = image.convert("1", dither=Image.Dither.NONE).resize((modules * QR_BOX_SIZE, modules * QR_BOX_SIZE), Image.NEAREST)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def qr_code_data_url(data: str, mask_pattern: int = None) -> str:
+    return "data:image/png;base64," + base64.b64encode(qr_code_png(data, mask_pattern)).decode()
+
+def qr_code_data_urls(urls: list) -> list:
+    """QR codes for a batch of links, one pool round-trip per batch"""
+    return [qr_code_data_url(url, QR_BATCH_MASK) for url in urls]
+
+def template_palette(template: dict) -> dict:
+    """The theme's palette, overridden by the colours of the template's own stylesheet
+
+    The first background is the page, the first text colour the text, and the
+    next background or border colour the accent.
+    """
+    found = {}
+    for match in CSS_COLOR_DECLARATION.finditer(template.get("css_content") or ""):
+        colour = HEX_COLOR.search(match.group(2))
+        if not colour:
+            continue
+        if match.group(1) == "color":
+            role = "text"
+        elif match.group(1).startswith("background") and "background" not in found:
+            role = "background"
+        else:
+            role = "accent"
+        found.setdefault(role, colour.group(0))
+    return {**THEME_PALETTES.get(template.get("theme"), THEME_PALETTES["classic"]), **found}
+
+def render_invitation_image(invitation: dict, theme: str, size=PAGE_SIZE, palette: dict = None) -> Image.Image:
+    """Lay out an invitation's details and QR code on a themed page"""
+    palette = palette or THEME_PALETTES.get(theme, THEME_PALETTES["classic"])
+    width, height = size
+    scale = width / PAGE_SIZE[0]
+    margin = int(PAGE_MARGIN * scale)
+    max_width = width - 4 * margin
+
+    image = Image.new("RGB", size, palette["background"])
+    draw = ImageDraw.Draw(image)
+    draw.rounded_rectangle(
+        (margin, margin, width - margin, height - margin),
+        radius=int(40 * scale), fill=palette["card"], outline=palette["accent"], width=max(1, int(3 * scale))
+    )
+
+    data = invitation["invitation_data"]
+    y = int(260 * scale)
+    y = _draw_centered(draw, f"{data['bride_name']} & {data['groom_name']}", _font(int(84 * scale)), palette["text"], y, width, max_width)
+    y += int(30 * scale)
+    draw.line((width / 2 - 80 * scale, y, width / 2 + 80 * scale, y), fill=palette["accent"], width=max(1, int(3 * scale)))
+    y += int(60 * scale)
+    y = _draw_centered(draw, data["wedding_date"], _font(int(56 * scale)), palette["text"], y, width, max_width)
+    y = _draw_centered(draw, data["wedding_time"], _font(int(40 * scale), serif=False), palette["muted"], y, width, max_width)
+    y += int(50 * scale)
+    y = _draw_centered(draw, data["venue_name"], _font(int(48 * scale)), palette["text"], y, width, max_width)
+    y = _draw_centered(draw, data["venue_address"], _font(int(34 * scale), serif=False), palette["muted"], y, width, max_width)
+
+    for event in data.get("events") or []:
+        y = _draw_centered(draw, " · ".join(str(v) for v in event.values() if v), _font(int(30 * scale), serif=False), palette["text"], y, width, max_width)
+    if data.get("additional_message"):
+        y += int(30 * scale)
+        y = _draw_centered(draw, data["additional_message"], _font(int(32 * scale)), palette["muted"], y, width, max_width)
+
+    if invitation.get("qr_code"):
+        qr_size = int(QR_SIZE * scale)
+        qr = _decode_data_url(invitation["qr_code"]).resize((qr_size, qr_size), Image.NEAREST)
+        qr_y = max(y + int(40 * scale), height - margin - qr_size - int(80 * scale))
+        image.paste(qr, ((width - qr_size) // 2, qr_y))
+
+    return image
+
+def render_thumbnails(template: dict, formats: list) -> dict:
+    """Preview of a template at every THUMBNAIL_WIDTHS size, as {(size, fmt): bytes}
+
+    `template` needs its name, theme and css_content. The page is laid out once
+    at the largest width and scaled down, which keeps small text legible where
+    laying out at 240px would not.
+    """
+    largest = max(THUMBNAIL_WIDTHS.values())
+    palette = template_palette(template)
+    page = render_invitation_image(
+        SAMPLE_INVITATION, template.get("theme"), (largest, round(largest * PAGE_SIZE[1] / PAGE_SIZE[0])), palette
+    )
+    if template.get("name"):
+        scale = largest / PAGE_SIZE[0]
+        margin = int(PAGE_MARGIN * scale)
+        font = _font(int(30 * scale), serif=False)
+        _draw_centered(ImageDraw.Draw(page), template["name"], font, palette["muted"],
+                       page.height - margin - int(120 * scale), largest, largest - 4 * margin)
+    thumbnails = {}
+    for size, width in THUMBNAIL_WIDTHS.items():
+        image = page if width == largest else page.resize((width, round(width * page.height / page.width)), Image.LANCZOS)
+        for fmt in formats:
+            buffer = io.BytesIO()
+            image.save(buffer, **THUMBNAIL_ENCODING[fmt])
+            thumbnails[(size, fmt)] = buffer.getvalue()
+    return thumbnails
+
+def thumbnail_formats() -> list:
+    """Thumbnail formats this Pillow build can encode, smallest output first"""
+    from PIL import features
+    return [fmt for fmt in ("avif", "webp") if features.check(fmt)]
+
+def thumbnail_digest(template: dict) -> str:
+    """Changes whenever the template's thumbnails would"""
+    inputs = [THUMBNAIL_VERSION, template.get("name"), template_palette(template),
+              SAMPLE_INVITATION, THUMBNAIL_WIDTHS, THUMBNAIL_ENCODING]
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:12]
+
+def render_invitation(invitation: dict, theme: str, fmt: str) -> bytes:
+    """Render an invitation to PNG or PDF bytes"""
+    image = render_invitation_image(invitation, theme)
+    buffer = io.BytesIO()
+    if fmt == "pdf":
+        image.save(buffer, format="PDF", resolution=PAGE_DPI)
+    else:
+        image.save(buffer, format="PNG")
+    return buffer.getvalue()
@@ -1,50 +1,116 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Depends, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import HTMLResponse, JSONResponse, Response, FileResponse, RedirectResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timedelta
-import qrcode
-import io
 import base64
-from PIL import Image
 import json
-import requests
+import re
+import csv
+import codecs
+import html
 import secrets
 import hashlib
-from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
+import zlib
+import hmac
+import heapq
+import bisect
+import math
+import asyncio
+import time
+import random
+import sys
+import fcntl
+from collections import Counter, OrderedDict, deque
+
+from storage import (
+    StorageEngine, MongoEngine, MemoryEngine, SQLiteEngine, available_compressors, dumps_ext, loads_ext, query_shape
+)
+from profiling import RequestProfile, StackSampler
+from tracing import Tracer, InMemoryExporter, FileExporter
+from records import UserRecord, TemplateRecord, InvitationRecord, encode_json
+from snapshots import SnapshotStore, SNAPSHOT_KINDS
+from disk_lru import DiskLRUCache
+
+# qrcode/PIL, requests, the Stripe integration and the process pool machinery are
+# imported on first use: workers serving only public reads never load them.
+# backend/benchmarks.py importtime keeps import time within IMPORT_TIME_BUDGET_MS.
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection with fallback to in-memory storage
+# Storage engine: mongodb (falls back to memory when unreachable), sqlite or memory
+STORAGE_ENGINE = os.environ.get('STORAGE_ENGINE', 'mongodb')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', str(ROOT_DIR / 'wedding_invitations.db'))
 mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 db_name = os.environ.get('DB_NAME', 'wedding_invitations')
+# When set, an unreachable MongoDB fails startup instead of falling back
+MONGO_REQUIRED = os.environ.get('MONGO_REQUIRED', '').lower() in ('1', 'true', 'yes')
+
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+    "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', '5')),
+    "maxIdleTimeMS": int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000')),
+    "waitQueueTimeoutMS": int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000')),
+    "connectTimeoutMS": int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+    "serverSelectionTimeoutMS": int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+    "compressors": os.environ.get('MONGO_COMPRESSORS', available_compressors()),
+    "retryWrites": True
+}
 
-# In-memory storage for demo purposes
-in_memory_db = {
-    'users': {},
-    'sessions': {},
-    'templates': {},
-    'invitations': {},
-    'payment_transactions': {}
+# Named per-collection profiles. Guest-facing reads may be served by secondaries
+# (they tolerate replication lag); payment writes wait for a majority.
+DB_PROFILES = {
+    "default": {},
+    "public_read": {
+        "read_preference": ReadPreference.SECONDARY_PREFERRED
+        if os.environ.get('MONGO_PUBLIC_READ_PREFERENCE', 'secondaryPreferred') == 'secondaryPreferred'
+        else ReadPreference.PRIMARY_PREFERRED
+    },
+    "payments": {
+        "read_preference": ReadPreference.PRIMARY,
+        "read_concern": ReadConcern("majority"),
+        "write_concern": WriteConcern(w="majority", wtimeout=int(os.environ.get('MONGO_PAYMENTS_WTIMEOUT_MS', '5000')))
+    }
 }
 
-try:
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[db_name]
-    USE_MONGODB = True
-    print("Connected to MongoDB successfully")
-except Exception as e:
-    print(f"Failed to connect to MongoDB: {e}")
-    print("Using in-memory storage for demo")
-    USE_MONGODB = False
+def make_storage_engine() -> StorageEngine:
+    if STORAGE_ENGINE == 'sqlite':
+        return SQLiteEngine(SQLITE_PATH)
+    if STORAGE_ENGINE == 'memory':
+        return MemoryEngine()
+    return MongoEngine(mongo_url, db_name, MONGO_CLIENT_OPTIONS, DB_PROFILES)
+
+storage = make_storage_engine()
+
+async def connect_database():
+    """Connect the storage engine, falling back to in-memory storage if MongoDB is unreachable"""
+    global storage
+    try:
+        await storage.connect()
+        if storage.name == 'mongodb':
+            logger.info("Connected to MongoDB (pool %s-%s, compressors %s)",
+                        MONGO_CLIENT_OPTIONS["minPoolSize"], MONGO_CLIENT_OPTIONS["maxPoolSize"],
+                        MONGO_CLIENT_OPTIONS["compressors"])
+        else:
+            logger.info("Using %s storage", storage.name)
+    except Exception as e:
+        if MONGO_REQUIRED or storage.name != 'mongodb':
+            raise
+        logger.warning("Failed to connect to MongoDB (%s); using in-memory storage for demo", e)
+        await storage.close()
+        storage = MemoryEngine()
+    await storage.ensure_indexes()
 
 # Create the main app without a prefix
 app = FastAPI(title="Wedding Invitation Service")
@@ -52,6 +118,15 @@ app = FastAPI(title="Wedding Invitation Service")
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+class RecordResponse(JSONResponse):
+    """JSON response for records read from storage
+
+    Returning one skips FastAPI's jsonable_encoder, which walks every value of a
+    response; encode_json handles records, datetimes and pydantic models itself.
+    """
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
+
 # Base Models
 class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -74,6 +149,7 @@ class Template(BaseModel):
     css_content: str
     is_premium: bool = False
     owner_id: Optional[str] = None  # for custom AI templates
+    keywords: List[str] = []  # AI generation keywords, indexed for search
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class InvitationData(BaseModel):
@@ -95,6 +171,7 @@ class Invitation(BaseModel):
     url_slug: str
     qr_code: Optional[str] = None
     is_published: bool = False
+    version: int = 1
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -102,6 +179,59 @@ class CreateInvitationRequest(BaseModel):
     template_id: str
     invitation_data: InvitationData
 
+class InvitationDataUpdate(BaseModel):
+    bride_name: Optional[str] = None
+    groom_name: Optional[str] = None
+    wedding_date: Optional[str] = None
+    wedding_time: Optional[str] = None
+    venue_name: Optional[str] = None
+    venue_address: Optional[str] = None
+    events: Optional[List[Dict[str, str]]] = None
+    rsvp_link: Optional[str] = None
+    additional_message: Optional[str] = None
+
+class UpdateInvitationRequest(BaseModel):
+    invitation_data: Optional[InvitationDataUpdate] = None
+    is_published: Optional[bool] = None
+    # When given, the edit only applies on top of this version (409 otherwise)
+    version: Optional[int] = None
+
+class RSVPRequest(BaseModel):
+    name: str = Field(min_length=1, max_length=200)
+    attending: bool
+    guests: int = Field(default=1, ge=0, le=20)
+    message: Optional[str] = Field(default=None, max_length=2000)
+
+class RSVP(RSVPRequest):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    invitation_id: str
+    guest_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class GuestImportRow(BaseModel):
+    name: str = Field(min_length=1, max_length=200)
+    email: Optional[str] = Field(default=None, max_length=320)
+    phone: Optional[str] = Field(default=None, max_length=40)
+    party_size: int = Field(default=1, ge=1, le=20)
+
+class Guest(GuestImportRow):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    invitation_id: str
+    user_id: str
+    token: str  # the guest's link is /i/<url_slug>?g=<token>
+    qr_code: Optional[str] = None
+    opened_at: Optional[datetime] = None
+    rsvp_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class InvitationRevision(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    invitation_id: str
+    user_id: str
+    version: int
+    changes: Dict[str, List[Any]]  # field -> [old, new]
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
 class TemplateCreateRequest(BaseModel):
     name: str
     description: str
@@ -127,98 +257,1308 @@ class SessionData(BaseModel):
     user_id: str
     expires_at: datetime
 
+# Request coalescing
+class SingleFlight:
+    """Share one in-flight call between concurrent callers using the same key"""
+
+    def __init__(self):
+        self._calls: Dict[Any, asyncio.Future] = {}
+
+    def _forget(self, key, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # every waiter may have gone away; mark it retrieved
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            # Run detached so a disconnecting caller never cancels the shared call
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        return await asyncio.shield(task)
+
+read_flight = SingleFlight()
+
+class ConcurrencyLimiter:
+    """Caps concurrent work and turns callers away once the wait queue is full"""
+
+    def __init__(self, limit: int, max_waiting: int, retry_after: int = 1):
+        self._semaphore = asyncio.Semaphore(limit)
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.retry_after = retry_after
+        self.waiting = 0
+
+    async def __aenter__(self):
+        if self._semaphore.locked() and self.waiting >= self.max_waiting:
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, please retry shortly",
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._semaphore.release()
+
+def query_key(op: str, collection_name: str, query: Optional[dict], profile: str = 'default'):
+    return (op, collection_name, profile, json.dumps(query or {}, sort_keys=True, default=str))
+
+# Tracing: each request gets a span tree covering the route, every db_* call,
+# QR rendering and outbound HTTP calls. Off unless TRACING_EXPORTER is set:
+# "file" appends JSON lines to TRACING_FILE, "memory" keeps recent traces in
+# trace_exporter for tests and benchmarks.
+TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', '')
+TRACING_FILE = os.environ.get('TRACING_FILE', '/tmp/wedding-invitations-traces.jsonl')
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '1'))
+
+def make_trace_exporter():
+    if TRACING_EXPORTER == 'file':
+        return FileExporter(TRACING_FILE)
+    if TRACING_EXPORTER == 'memory':
+        return InMemoryExporter()
+    return None
+
+trace_exporter = make_trace_exporter()
+tracer = Tracer(trace_exporter, TRACE_SAMPLE_RATE)
+
+# Query statistics: every db_* call is timed and aggregated by query shape (op,
+# collection and the filter's keys and operators, without values). Calls slower
+# than SLOW_QUERY_MS are logged with their filter and, at most once per shape per
+# SLOW_QUERY_EXPLAIN_INTERVAL, explained by the engine, so a missing index shows
+# up as a scan in the log and in /health/queries.
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '100'))
+SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', 'true').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', '300'))
+QUERY_STATS_MAX_SHAPES = int(os.environ.get('QUERY_STATS_MAX_SHAPES', '1000'))
+
+class QueryStats:
+    """Per-shape count, latency and documents returned"""
+
+    def __init__(self, max_shapes: int):
+        self.max_shapes = max_shapes
+        self.shapes: Dict[tuple, dict] = {}
+        self.untracked = 0
+        self._explained_at: Dict[tuple, float] = {}
+
+    def record(self, key: tuple, elapsed_ms: float, documents: int, slow: bool) -> Optional[dict]:
+        entry = self.shapes.get(key)
+        if entry is None:
+            if len(self.shapes) >= self.max_shapes:
+                self.untracked += 1
+                return None
+            entry = self.shapes[key] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "documents": 0, "slow": 0}
+        entry["count"] += 1
+        entry["total_ms"] += elapsed_ms
+        entry["documents"] += documents
+        if elapsed_ms > entry["max_ms"]:
+            entry["max_ms"] = elapsed_ms
+        if slow:
+            entry["slow"] += 1
+        return entry
+
+    def should_explain(self, key: tuple) -> bool:
+        now = time.monotonic()
+        if now - self._explained_at.get(key, -SLOW_QUERY_EXPLAIN_INTERVAL) < SLOW_QUERY_EXPLAIN_INTERVAL:
+            return False
+        self._explained_at[key] = now
+        return True
+
+    def snapshot(self, sort_by: str = "total_ms", limit: int = 50) -> list:
+        rows = [
+            {
+                "op": op, "collection": collection, "shape": shape,
+                **{name: round(value, 3) if isinstance(value, float) else value for name, value in entry.items()},
+                "mean_ms": round(entry["total_ms"] / entry["count"], 3)
+            }
+            for (op, collection, shape), entry in self.shapes.items()
+        ]
+        rows.sort(key=lambda row: row.get(sort_by, 0), reverse=True)
+        return rows[:limit]
+
+query_stats = QueryStats(QUERY_STATS_MAX_SHAPES)
+explain_tasks = set()
+
+async def explain_slow_query(key: tuple, collection_name: str, query: dict, entry: Optional[dict]):
+    try:
+        plan = await storage.explain(collection_name, query)
+    except Exception as e:
+        logger.warning("Could not explain slow %s on %s: %s", key[0], collection_name, e)
+        return
+    if plan is None:
+        return
+    if entry is not None:
+        entry["plan"] = plan
+    logger.warning("Slow query plan: %s %s {%s}: %s", key[0], collection_name, key[2], plan)
+
+def record_query(op: str, collection_name: str, query: Optional[dict], elapsed_ms: float, documents: int):
+    key = (op, collection_name, query_shape(query))
+    slow = elapsed_ms >= SLOW_QUERY_MS
+    entry = query_stats.record(key, elapsed_ms, documents, slow)
+    if not slow:
+        return
+    logger.warning("Slow query: %s %s took %.1fms, filter %s",
+                   op, collection_name, elapsed_ms, json.dumps(query, default=str)[:1000])
+    if SLOW_QUERY_EXPLAIN and query is not None and query_stats.should_explain(key):
+        task = asyncio.ensure_future(explain_slow_query(key, collection_name, query, entry))
+        explain_tasks.add(task)
+        task.add_done_callback(explain_tasks.discard)
+
+class QueryTimer:
+    """Times one db_* call into query_stats, inside its tracing span"""
+    __slots__ = ('op', 'collection', 'query', 'span', 'documents', 'started')
+
+    def __init__(self, op: str, collection_name: str, query: Optional[dict] = None, **attributes):
+        self.op = op
+        self.collection = collection_name
+        self.query = query
+        self.span = tracer.span(f'db.{op}', collection=collection_name, **attributes)
+        self.documents = 0
+
+    def __enter__(self):
+        self.span.__enter__()
+        self.started = time.perf_counter()
+        return self
+
+    def returned(self, documents: int):
+        self.documents = documents
+        self.span.set(documents=documents)
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = (time.perf_counter() - self.started) * 1000
+        self.span.__exit__(exc_type, exc, tb)
+        record_query(self.op, self.collection, self.query, elapsed_ms, self.documents)
+        return False
+
 # Database operations helper
-async def db_insert_one(collection_name: str, document: dict):
-    if USE_MONGODB:
-        return await db[collection_name].insert_one(document)
-    else:
-        doc_id = document.get('id', str(uuid.uuid4()))
-        in_memory_db[collection_name][doc_id] = document
-        return type('MockResult', (), {'inserted_id': doc_id})()
+async def db_insert_one(collection_name: str, document: dict, profile: str = 'default'):
+    with QueryTimer('insert_one', collection_name):
+        return await storage.insert_one(collection_name, document, profile)
 
-async def db_find_one(collection_name: str, query: dict):
-    if USE_MONGODB:
-        return await db[collection_name].find_one(query)
-    else:
-        for doc in in_memory_db[collection_name].values():
-            if all(doc.get(k) == v for k, v in query.items()):
-                return doc
+async def db_find_one(collection_name: str, query: dict, coalesce: bool = True, profile: str = 'default',
+                      projection: dict = None):
+    with QueryTimer('find_one', collection_name, query, profile=profile) as timer:
+        if not (coalesce and storage.coalesce_reads):
+            document = await storage.find_one(collection_name, query, projection, profile)
+        else:
+            document = await read_flight.do(
+                query_key('find_one', collection_name, {"q": query, "p": projection}, profile),
+                lambda: storage.find_one(collection_name, query, projection, profile)
+            )
+        timer.returned(int(document is not None))
+        return document
+
+async def db_find(collection_name: str, query: dict = None, coalesce: bool = True, profile: str = 'default',
+                  projection: dict = None, sort: List[tuple] = None, limit: int = 1000):
+    with QueryTimer('find', collection_name, query or {}, profile=profile) as timer:
+        if not (coalesce and storage.coalesce_reads):
+            documents = await storage.find(collection_name, query, projection, sort, limit, profile)
+        else:
+            documents = await read_flight.do(
+                query_key('find', collection_name, {"q": query, "p": projection, "s": sort, "l": limit}, profile),
+                lambda: storage.find(collection_name, query, projection, sort, limit, profile)
+            )
+        timer.returned(len(documents))
+        return documents
+
+async def db_find_joined(collection_name: str, query: dict, join: str, local_field: str, as_field: str,
+                         join_projection: dict = None, projection: dict = None, sort: List[tuple] = None,
+                         limit: int = 1000, profile: str = 'default'):
+    """db_find with each document's `join` match attached (a $lookup on MongoDB)"""
+    with QueryTimer('find_joined', collection_name, query or {}, profile=profile, join=join) as timer:
+        documents = await storage.find_joined(collection_name, query, join, local_field, as_field,
+                                              join_projection, projection, sort, limit, profile)
+        timer.returned(len(documents))
+        return documents
+
+async def db_iterate(collection_name: str, query: dict = None, projection: dict = None, after: str = None,
+                     batch_size: int = 500, profile: str = 'default'):
+    """Async iterator over all matching documents in `id` order, read in batches"""
+    # Traced but not timed into query_stats: its duration is the consumer's pace.
+    # The span is not made current either, as this body runs in the consumer's context.
+    span = tracer.span('db.iterate', collection=collection_name, profile=profile)
+    count, error = 0, None
+    try:
+        async for document in storage.iterate(collection_name, query, projection, after, batch_size, profile):
+            count += 1
+            yield document
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        span.set(documents=count)
+        span.end(error)
+
+async def db_update_one(collection_name: str, query: dict, update: dict, profile: str = 'default'):
+    with QueryTimer('update_one', collection_name, query):
+        return await storage.update_one(collection_name, query, update, profile)
+
+async def db_delete_one(collection_name: str, query: dict, profile: str = 'default'):
+    with QueryTimer('delete_one', collection_name, query):
+        return await storage.delete_one(collection_name, query, profile)
+
+async def db_delete_many(collection_name: str, query: dict, profile: str = 'default'):
+    with QueryTimer('delete_many', collection_name, query):
+        return await storage.delete_many(collection_name, query, profile)
+
+async def db_count_documents(collection_name: str, query: dict = None, profile: str = 'default'):
+    with QueryTimer('count', collection_name, query or {}):
+        if not storage.coalesce_reads:
+            return await storage.count(collection_name, query, profile)
+        return await read_flight.do(
+            query_key('count', collection_name, query, profile),
+            lambda: storage.count(collection_name, query, profile)
+        )
+
+async def db_insert_many(collection_name: str, documents: list, profile: str = 'default'):
+    with QueryTimer('insert_many', collection_name, documents=len(documents)):
+        return await storage.insert_many(collection_name, documents, profile)
+
+async def db_bulk_upsert(collection_name: str, documents: list, on_insert: dict = None):
+    """Insert or update documents by their `id` in one round-trip"""
+    with QueryTimer('bulk_upsert', collection_name, documents=len(documents)):
+        return await storage.bulk_upsert(collection_name, documents, on_insert)
+
+async def outbound_request(method: str, url: str, service: str, **kwargs):
+    """Blocking HTTP call made on a worker thread, so it never stalls the event loop"""
+    import requests
+    
+    with tracer.span('http.client', service=service, method=method, url=url.split('?', 1)[0]) as span:
+        response = await asyncio.to_thread(requests.request, method, url, **kwargs)
+        span.set(status=response.status_code)
+        return response
+
+# Caching: a per-process LRU in front of an optional shared tier. The shared tier
+# ("unix") is served over a Unix socket by whichever worker holds the lock file,
+# and also relays pub/sub messages such as cache invalidations between workers.
+# Without it other workers never see an invalidation, so it is the default
+# whenever WEB_CONCURRENCY (uvicorn/gunicorn --workers) asks for more than one.
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', '1'))
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'unix' if WEB_CONCURRENCY > 1 else 'local')  # local, unix
+CACHE_SOCKET_PATH = os.environ.get('CACHE_SOCKET_PATH', '/tmp/wedding-invitations-cache.sock')
+CACHE_LOCAL_SIZE = int(os.environ.get('CACHE_LOCAL_SIZE', '1024'))
+CACHE_SHARED_SIZE = int(os.environ.get('CACHE_SHARED_SIZE', '16384'))
+CACHE_TTL = float(os.environ.get('CACHE_TTL', '300'))
+# How long after an invalidation reads of that key should skip lagging replicas
+CACHE_SETTLE_SECONDS = float(os.environ.get('CACHE_SETTLE_SECONDS', '30'))
+CACHE_SHARED_TIMEOUT = float(os.environ.get('CACHE_SHARED_TIMEOUT', '0.05'))
+CACHE_MAX_CLIENT_BUFFER = 1024 * 1024
+
+def strip_mongo_id(document: Optional[dict]) -> Optional[dict]:
+    if document and '_id' in document:
+        document = {k: v for k, v in document.items() if k != '_id'}
+    return document
+
+class LRUCache:
+    """Bounded in-process LRU with per-entry expiry"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def pop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+# Token buckets for rate limiting. Single-threaded asyncio needs no locks: a take is
+# a dict lookup and some arithmetic.
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000'))
+
+class TokenBuckets:
+    """Token buckets keyed by string; idle (full) buckets are dropped when over max_keys"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, List[float]] = {}  # key -> [tokens, updated]
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key: str, rate: float, burst: float, now: Optional[float] = None) -> float:
+        """Take one token: 0.0 if granted, otherwise seconds until one is available"""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._prune(now, rate, burst)
+            self._buckets[key] = [burst - 1, now]
+            return 0.0
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0.0
+        bucket[0] = tokens
+        return (1 - tokens) / rate
+
+    def _prune(self, now: float, rate: float, burst: float):
+        # A bucket that has refilled is indistinguishable from a missing one
+        idle = [key for key, (tokens, updated) in self._buckets.items() if tokens + (now - updated) * rate >= burst]
+        for key in idle:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            # Still full of active clients: forget the oldest half
+            for key in list(self._buckets)[:len(self._buckets) // 2]:
+                del self._buckets[key]
+
+class CacheBackend:
+    """Shared cache tier; the base class is the single-process no-op tier"""
+    name = 'local'
+    shared = False
+
+    def __init__(self):
+        self._subscribers: Dict[str, List] = {}
+
+    def subscribe(self, channel: str, handler):
+        """Register a handler for messages published by other workers"""
+        self._subscribers.setdefault(channel, []).append(handler)
+
+    def _dispatch(self, channel: str, message):
+        for handler in self._subscribers.get(channel, ()):
+            try:
+                handler(message)
+            except Exception:
+                logger.exception("Cache subscriber for %s failed", channel)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def get(self, key: str):
         return None
 
-async def db_find(collection_name: str, query: dict = None):
-    if USE_MONGODB:
-        cursor = db[collection_name].find(query or {})
-        return await cursor.to_list(1000)
-    else:
-        if query:
-            return [doc for doc in in_memory_db[collection_name].values() 
-                   if all(doc.get(k) == v for k, v in query.items())]
-        return list(in_memory_db[collection_name].values())
-
-async def db_update_one(collection_name: str, query: dict, update: dict):
-    if USE_MONGODB:
-        return await db[collection_name].update_one(query, update)
-    else:
-        for doc_id, doc in in_memory_db[collection_name].items():
-            if all(doc.get(k) == v for k, v in query.items()):
-                if '$set' in update:
-                    doc.update(update['$set'])
-                break
+    async def set(self, key: str, value, ttl: float):
+        pass
 
-async def db_count_documents(collection_name: str, query: dict = None):
-    if USE_MONGODB:
-        return await db[collection_name].count_documents(query or {})
-    else:
-        docs = await db_find(collection_name, query)
-        return len(docs)
+    async def delete(self, key: str):
+        pass
 
-async def db_insert_many(collection_name: str, documents: list):
-    if USE_MONGODB:
-        return await db[collection_name].insert_many(documents)
-    else:
-        for doc in documents:
-            doc_id = doc.get('id', str(uuid.uuid4()))
-            in_memory_db[collection_name][doc_id] = doc
+    async def pop(self, key: str):
+        """Remove a key and return its value, atomically with respect to other workers"""
+        return None
+
+    async def publish(self, channel: str, message):
+        pass
+
+    async def take_token(self, key: str, rate: float, burst: float) -> Optional[float]:
+        """Take a token from a shared bucket: 0 if granted, else seconds to wait;
+        None when there is no shared tier (callers then rely on their local bucket)"""
+        return None
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+class LocalCacheServer:
+    """Shared LRU and pub/sub relay listening on a Unix socket"""
+
+    def __init__(self, path: str, maxsize: int):
+        self.path = path
+        self._entries = LRUCache(maxsize)
+        self._buckets = TokenBuckets(RATE_LIMIT_MAX_KEYS)
+        self._writers = set()
+        self._server = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def _send(self, writer, line: bytes):
+        # A subscriber that stops reading is dropped rather than buffered forever
+        if writer.transport.get_write_buffer_size() > CACHE_MAX_CLIENT_BUFFER:
+            writer.close()
+            return
+        writer.write(line)
+
+    async def _handle(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                op = message["op"]
+                if op == "get":
+                    reply = {"id": message["id"], "value": self._entries.get(message["key"])}
+                    self._send(writer, (json.dumps(reply) + "\n").encode())
+                elif op == "set":
+                    self._entries.set(message["key"], message["value"], message["ttl"])
+                elif op == "delete":
+                    self._entries.delete(message["key"])
+                elif op == "pop":
+                    reply = {"id": message["id"], "value": self._entries.pop(message["key"])}
+                    self._send(writer, (json.dumps(reply) + "\n").encode())
+                elif op == "take":
+                    wait = self._buckets.take(message["key"], message["rate"], message["burst"])
+                    self._send(writer, (json.dumps({"id": message["id"], "value": wait}) + "\n").encode())
+                elif op == "publish":
+                    for other in list(self._writers):
+                        if other is not writer:
+                            self._send(other, line)
+        except (ConnectionError, ValueError, KeyError, asyncio.CancelledError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+class UnixSocketCacheBackend(CacheBackend):
+    """Shared tier client; the worker holding the lock file also runs the server"""
+    name = 'unix'
+    shared = True
+
+    def __init__(self, path: str, maxsize: int):
+        super().__init__()
+        self.path = path
+        self.maxsize = maxsize
+        self._server: Optional[LocalCacheServer] = None
+        self._lock_file = None
+        self._writer = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._maintainer = None
+
+    async def start(self):
+        self._maintainer = asyncio.create_task(self._maintain())
+
+    async def close(self):
+        if self._maintainer:
+            self._maintainer.cancel()
+        if self._writer:
+            self._writer.close()
+        if self._server:
+            await self._server.close()
+        if self._lock_file:
+            self._lock_file.close()
+
+    async def _try_become_server(self):
+        if self._server:
+            return
+        lock_file = open(self.path + '.lock', 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return
+        self._lock_file = lock_file
+        self._server = LocalCacheServer(self.path, self.maxsize)
+        await self._server.start()
+        logger.info("Serving shared cache tier on %s", self.path)
+
+    async def _maintain(self):
+        while True:
+            try:
+                await self._try_become_server()
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(0.5)
+                continue
+            self._writer = writer
+            try:
+                await self._read_loop(reader)
+            finally:
+                self._writer = None
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_result(None)
+                self._pending.clear()
+                # Invalidations may have been missed while disconnected
+                self._dispatch('invalidate', None)
+            await asyncio.sleep(0.1)
+
+    async def _read_loop(self, reader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            message = json.loads(line)
+            if "id" in message:
+                future = self._pending.pop(message["id"], None)
+                if future and not future.done():
+                    future.set_result(message["value"])
+            else:
+                self._dispatch(message["channel"], message["message"])
+
+    def _write(self, message: dict) -> bool:
+        if self._writer is None:
+            return False
+        self._writer.write((json.dumps(message) + "\n").encode())
+        return True
+
+    async def _request(self, message: dict):
+        """Send a request and wait briefly for its reply; None on timeout or disconnect"""
+        self._next_id += 1
+        request_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        if not self._write({**message, "id": request_id}):
+            self._pending.pop(request_id, None)
+            return None
+        try:
+            return await asyncio.wait_for(future, CACHE_SHARED_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._pending.pop(request_id, None)
+            return None
+
+    async def get(self, key: str):
+        value = await self._request({"op": "get", "key": key})
+        return loads_ext(value) if value is not None else None
+
+    async def set(self, key: str, value, ttl: float):
+        self._write({"op": "set", "key": key, "value": dumps_ext(value), "ttl": ttl})
+
+    async def delete(self, key: str):
+        self._write({"op": "delete", "key": key})
+
+    async def pop(self, key: str):
+        value = await self._request({"op": "pop", "key": key})
+        return loads_ext(value) if value is not None else None
+
+    async def publish(self, channel: str, message):
+        self._write({"op": "publish", "channel": channel, "message": message})
+
+    async def take_token(self, key: str, rate: float, burst: float) -> Optional[float]:
+        return await self._request({"op": "take", "key": key, "rate": rate, "burst": burst})
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "connected": self._writer is not None,
+            "serving": self._server is not None
+        }
+
+class TwoLevelCache:
+    """Per-process LRU backed by a shared tier, invalidated over pub/sub"""
+
+    def __init__(self, backend: CacheBackend, local_size: int, ttl: float, settle: float = CACHE_SETTLE_SECONDS):
+        self.backend = backend
+        self.local = LRUCache(local_size)
+        self.ttl = ttl
+        self.settle = settle
+        # key -> when it was last invalidated, here or by another worker
+        self.invalidated = LRUCache(local_size)
+        self._cleared_at = float('-inf')
+        self.hits = {"local": 0, "shared": 0, "miss": 0}
+        backend.subscribe('invalidate', self._on_invalidate)
+
+    def _on_invalidate(self, key):
+        if key is None:
+            self.local.clear()
+            self._cleared_at = time.monotonic()
+        else:
+            self.local.delete(key)
+            self.invalidated.set(key, time.monotonic(), self.settle)
+
+    def invalidated_since(self, key: str, since: float) -> bool:
+        invalidated_at = self.invalidated.get(key)
+        return (invalidated_at is not None and invalidated_at >= since) or self._cleared_at >= since
+
+    def recently_invalidated(self, key: str) -> bool:
+        """Whether replicas may still serve the value from before the last invalidation"""
+        return self.invalidated_since(key, time.monotonic() - self.settle)
+
+    async def get(self, key: str):
+        value = self.local.get(key)
+        if value is not None:
+            self.hits["local"] += 1
+            return value
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits["shared"] += 1
+            self.local.set(key, value, self.ttl)
+            return value
+        self.hits["miss"] += 1
+        return None
+
+    async def set(self, key: str, value, ttl: Optional[float] = None):
+        self.local.set(key, value, ttl or self.ttl)
+        await self.backend.set(key, value, ttl or self.ttl)
+
+    async def invalidate(self, key: str):
+        self._on_invalidate(key)
+        await self.backend.delete(key)
+        await self.backend.publish('invalidate', key)
+
+    async def pop(self, key: str):
+        """Remove a key and return its value; only one caller, in any worker, gets it"""
+        value = self.local.pop(key)
+        self._on_invalidate(key)
+        if self.backend.shared:
+            # Other workers may hold a local copy too: the shared tier decides who wins
+            value = await self.backend.pop(key)
+        await self.backend.publish('invalidate', key)
+        return value
+
+    async def get_or_load(self, key: str, loader):
+        """Return a cached document, loading and caching it on a miss"""
+        value = await self.get(key)
+        if value is None:
+            started = time.monotonic()
+            value = strip_mongo_id(await loader())
+            # A load that raced an invalidation may hold the old value; serve it once
+            if value is not None and not self.invalidated_since(key, started):
+                await self.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        return {**self.backend.stats(), "local_entries": len(self.local), **self.hits}
+
+def make_cache_backend() -> CacheBackend:
+    if CACHE_BACKEND == 'unix':
+        return UnixSocketCacheBackend(CACHE_SOCKET_PATH, CACHE_SHARED_SIZE)
+    return CacheBackend()
+
+cache = TwoLevelCache(make_cache_backend(), CACHE_LOCAL_SIZE, CACHE_TTL)
+
+async def get_template_doc(template_id: str, profile: str = 'public_read') -> Optional[dict]:
+    return await cache.get_or_load(
+        f"template:{template_id}",
+        lambda: db_find_one('templates', {"id": template_id}, profile=profile)
+    )
+
+async def get_published_invitation_doc(url_slug: str) -> Optional[dict]:
+    key = f"invitation:slug:{url_slug}"
+    # Right after an edit or unpublish a secondary may not have it yet; read the primary
+    profile = 'default' if cache.recently_invalidated(key) else 'public_read'
+    return await cache.get_or_load(
+        key,
+        lambda: db_find_one('invitations', {"url_slug": url_slug, "is_published": True}, profile=profile)
+    )
+
+async def invalidate_invitation_cache(invitation: dict):
+    await cache.invalidate(f"invitation:slug:{invitation['url_slug']}")
 
 # Utility Functions
 def generate_url_slug():
     """Generate a unique URL slug for invitations"""
     return secrets.token_urlsafe(8)
 
+def generate_guest_token():
+    """Short per-guest token, appended to the invitation link as ?g="""
+    return secrets.token_urlsafe(6)
+
+def frontend_link(url_slug: str, guest_token: str = None) -> str:
+    link = f"{os.getenv('FRONTEND_URL', 'http://localhost:3000')}/i/{url_slug}"
+    return f"{link}?g={guest_token}" if guest_token else link
+
 def generate_qr_code(url: str) -> str:
     """Generate QR code and return as base64 string"""
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(url)
-    qr.make(fit=True)
+    from rendering import qr_code_data_url
     
-    img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Convert to base64
-    buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    img_base64 = base64.b64encode(buffer.getvalue()).decode()
-    
-    return f"data:image/png;base64,{img_base64}"
+    with tracer.span('qr.generate'):
+        return qr_code_data_url(url)
 
-async def get_user_from_session(request: Request):
-    """Get user from session token"""
+# Session storage
+SESSION_TTL = timedelta(days=7)
+SESSION_SWEEP_INTERVAL = float(os.environ.get('SESSION_SWEEP_INTERVAL', '60'))
+SESSION_SWEEP_BATCH = int(os.environ.get('SESSION_SWEEP_BATCH', '1000'))
+
+def hash_session_token(token: str) -> str:
+    """Hash a session token; only the hash is ever stored"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class SessionRecord:
+    """Compact in-memory session entry"""
+    __slots__ = ('user_id', 'expires_at')
+
+    def __init__(self, user_id: str, expires_at: float):
+        self.user_id = user_id
+        self.expires_at = expires_at
+
+class SessionStore:
+    """In-memory sessions keyed by token hash, with a TTL-ordered heap for expiry.
+
+    Revocation only drops the record; its heap entry goes stale and is skipped
+    (or compacted away) by the sweeper.
+    """
+
+    def __init__(self):
+        self._records: Dict[str, SessionRecord] = {}
+        self._expiry_heap: List[tuple] = []
+        self._stale = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, token_hash: str, user_id: str, expires_at: float):
+        if token_hash in self._records:
+            self._stale += 1
+        self._records[token_hash] = SessionRecord(user_id, expires_at)
+        heapq.heappush(self._expiry_heap, (expires_at, token_hash))
+
+    def get(self, token_hash: str, now: Optional[float] = None) -> Optional[SessionRecord]:
+        record = self._records.get(token_hash)
+        if record is None:
+            return None
+        if record.expires_at <= (now if now is not None else time.time()):
+            del self._records[token_hash]
+            self._stale += 1
+            return None
+        return record
+
+    def revoke(self, token_hash: str) -> bool:
+        if self._records.pop(token_hash, None) is None:
+            return False
+        self._stale += 1
+        return True
+
+    def sweep(self, now: Optional[float] = None, limit: int = SESSION_SWEEP_BATCH) -> int:
+        """Evict up to `limit` expired heap entries; returns sessions removed"""
+        now = now if now is not None else time.time()
+        heap = self._expiry_heap
+        removed = 0
+        for _ in range(limit):
+            if not heap or heap[0][0] > now:
+                break
+            expires_at, token_hash = heapq.heappop(heap)
+            record = self._records.get(token_hash)
+            if record is not None and record.expires_at == expires_at:
+                del self._records[token_hash]
+                removed += 1
+            else:
+                self._stale -= 1
+        # Rebuild the heap once revoked/replaced entries dominate it
+        if self._stale > 1024 and self._stale > len(self._records):
+            self._expiry_heap = [(r.expires_at, h) for h, r in self._records.items()]
+            heapq.heapify(self._expiry_heap)
+            self._stale = 0
+        return removed
+
+session_store = SessionStore()
+
+# Signed session tokens: "v1.<kid>.<claims>.<hmac>", verified without a database read.
+# SESSION_SIGNING_KEYS is "kid:secret,kid:secret"; the first key signs, all keys verify,
+# so rotation is: prepend a new key, wait one SESSION_TTL, drop the old one.
+SESSION_TOKEN_MODE = os.environ.get('SESSION_TOKEN_MODE', 'opaque')
+SIGNED_TOKEN_PREFIX = 'v1.'
+
+def load_signing_keys() -> Dict[str, bytes]:
+    keys = {}
+    for entry in os.environ.get('SESSION_SIGNING_KEYS', '').split(','):
+        kid, _, secret = entry.strip().partition(':')
+        if kid and secret:
+            keys[kid] = secret.encode()
+    return keys
+
+signing_keys = load_signing_keys()
+active_signing_kid = next(iter(signing_keys), None)
+if SESSION_TOKEN_MODE == 'signed' and not signing_keys:
+    raise RuntimeError("SESSION_SIGNING_KEYS is required when SESSION_TOKEN_MODE=signed")
+
+# Revoked token ids until their natural expiry; swept alongside sessions
+revoked_tokens = SessionStore()
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+def _sign(kid: str, signing_input: str) -> bytes:
+    return hmac.new(signing_keys[kid], signing_input.encode(), hashlib.sha256).digest()
+
+def is_signed_token(token: Optional[str]) -> bool:
+    return bool(token) and token.startswith(SIGNED_TOKEN_PREFIX)
+
+def issue_signed_token(user: UserRecord) -> str:
+    """Issue a signed token carrying the claims needed to authorize requests"""
+    claims = {
+        "sub": user.id,
+        "em": user.email,
+        "nm": user.name,
+        "prm": user.premium,
+        "exp": int(time.time() + SESSION_TTL.total_seconds()),
+        "jti": secrets.token_urlsafe(9)
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode())
+    signing_input = f"{SIGNED_TOKEN_PREFIX}{active_signing_kid}.{payload}"
+    return f"{signing_input}.{_b64encode(_sign(active_signing_kid, signing_input))}"
+
+def verify_signed_token(token: str, check_revoked: bool = True) -> Optional[dict]:
+    """Return the claims of a valid signed token"""
+    try:
+        version, kid, payload, signature = token.split('.')
+        if kid not in signing_keys:
+            return None
+        expected = _sign(kid, f"{version}.{kid}.{payload}")
+        if not hmac.compare_digest(expected, _b64decode(signature)):
+            return None
+        claims = json.loads(_b64decode(payload))
+        if claims["exp"] <= time.time():
+            return None
+    except (ValueError, KeyError, TypeError):
+        return None
+    if check_revoked and revoked_tokens.get(claims["jti"]) is not None:
+        return None
+    return claims
+
+def user_from_claims(claims: dict) -> UserRecord:
+    return UserRecord(id=claims["sub"], email=claims["em"], name=claims["nm"], premium=claims["prm"])
+
+async def create_session(user: UserRecord) -> str:
+    """Create a session for a user and return its token"""
+    if SESSION_TOKEN_MODE == 'signed':
+        return issue_signed_token(user)
+    token = secrets.token_urlsafe(32)
+    token_hash = hash_session_token(token)
+    expires_at = datetime.utcnow() + SESSION_TTL
+    if storage.persistent:
+        await db_insert_one('sessions', {
+            "token_hash": token_hash,
+            "user_id": user.id,
+            "expires_at": expires_at
+        })
+    else:
+        session_store.add(token_hash, user.id, time.time() + SESSION_TTL.total_seconds())
+    return token
+
+async def resolve_session(token: str) -> Optional[str]:
+    """Return the user id for a valid opaque session token"""
+    token_hash = hash_session_token(token)
+    if storage.persistent:
+        session = await db_find_one('sessions', {"token_hash": token_hash})
+        if not session or session["expires_at"] < datetime.utcnow():
+            return None
+        return session["user_id"]
+    record = session_store.get(token_hash)
+    return record.user_id if record else None
+
+async def revoke_session(token: str) -> bool:
+    """Revoke a session token"""
+    if is_signed_token(token):
+        claims = verify_signed_token(token)
+        if not claims:
+            return False
+        revoked_tokens.add(claims["jti"], claims["sub"], claims["exp"])
+        await cache.backend.publish('revoke', [claims["jti"], claims["sub"], claims["exp"]])
+        return True
+    token_hash = hash_session_token(token)
+    if storage.persistent:
+        result = await db_delete_one('sessions', {"token_hash": token_hash})
+        return bool(result and result.deleted_count)
+    return session_store.revoke(token_hash)
+
+async def sweep_expired_sessions():
+    """Periodically evict expired in-memory sessions in bounded batches"""
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        for store in (session_store, revoked_tokens):
+            while store.sweep() >= SESSION_SWEEP_BATCH:
+                # Yield between batches so a large backlog never blocks requests
+                await asyncio.sleep(0)
+        if storage.persistent and not storage.ttl_indexes:
+            try:
+                await db_delete_many('sessions', {"expires_at": {"$lt": datetime.utcnow()}})
+            except Exception:
+                logger.exception("Expired session cleanup failed")
+
+def get_bearer_token(request: Request) -> Optional[str]:
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         return None
+    return auth_header.replace("Bearer ", "")
+
+# Template rendering: templates are compiled once into static chunks split on their
+# {{placeholder}} markers, so filling one in is a single join.
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+QR_PLACEHOLDER_HTML = '<div style="width: 120px; height: 120px; background: #f0f0f0; border-radius: 10px; margin: 1rem auto;"></div>'
+
+TAG_PATTERN = re.compile(r"<(/?)([A-Za-z][\w-]*)[^<>]*(>?)")
+RAW_TEXT_ELEMENTS = {'script', 'style', 'title', 'textarea'}
+
+class CompiledTemplate:
+    """Template HTML pre-split into static chunks and placeholder names"""
+    __slots__ = ('chunks', 'placeholders', 'patchable')
+
+    def __init__(self, html_content: str):
+        parts = PLACEHOLDER_PATTERN.split(html_content)
+        self.chunks = parts[0::2]
+        self.placeholders = parts[1::2]
+        # Placeholders that only ever appear as element content can be wrapped in a
+        # preview slot and patched on their own; ones inside tags or attributes cannot
+        self.patchable = set(self.placeholders)
+        for placeholder in PLACEHOLDER_PATTERN.finditer(html_content):
+            start = html_content.rfind('<', 0, placeholder.start())
+            tag = TAG_PATTERN.match(html_content, start, placeholder.start()) if start >= 0 else None
+            if tag and (not tag.group(3) or (not tag.group(1) and tag.group(2).lower() in RAW_TEXT_ELEMENTS)):
+                self.patchable.discard(placeholder.group(1))
+
+    def render(self, values: Dict[str, str], slots: bool = False) -> str:
+        out = [self.chunks[0]]
+        for name, chunk in zip(self.placeholders, self.chunks[1:]):
+            if slots and name in self.patchable:
+                out.append(f'<span data-slot="{name}" style="display: contents">{values.get(name, "")}</span>')
+            else:
+                out.append(values.get(name, ''))
+            out.append(chunk)
+        return ''.join(out)
+
+compiled_templates = LRUCache(int(os.environ.get('COMPILED_TEMPLATE_CACHE_SIZE', '512')))
+
+def get_compiled_template(template: dict) -> CompiledTemplate:
+    entry = compiled_templates.get(template["id"])
+    if entry is None or entry[0] != template["html_content"]:
+        entry = (template["html_content"], CompiledTemplate(template["html_content"]))
+        compiled_templates.set(template["id"], entry, 24 * 3600)
+    return entry[1]
+
+def invitation_placeholder_values(invitation_data: dict, qr_code: Optional[str] = None) -> Dict[str, str]:
+    """HTML-escaped value for each template placeholder"""
+    values = {
+        key: html.escape(value)
+        for key, value in invitation_data.items()
+        if isinstance(value, str)
+    }
+    values["events"] = ''.join(
+        f"<p>{html.escape(event.get('name', ''))} - {html.escape(event.get('time', ''))}</p>"
+        for event in invitation_data.get("events") or []
+    )
+    values["qr_code"] = f'<img src="{html.escape(qr_code)}" alt="QR Code" />' if qr_code else QR_PLACEHOLDER_HTML
+    return values
+
+# Template search: an in-process inverted index over the catalog's text fields,
+# updated incrementally as templates are created (on every worker, via pub/sub).
+# Results carry summaries only, never the template HTML/CSS.
+SEARCH_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+SEARCH_FIELD_WEIGHTS = {"name": 3.0, "keywords": 2.0, "theme": 2.0, "description": 1.0}
+SEARCH_SUMMARY_FIELDS = ("id", "name", "description", "theme", "preview_url", "is_premium", "owner_id", "keywords", "created_at")
+SEARCH_MAX_PREFIX_TERMS = 50
+SEARCH_MAX_PAGE_SIZE = 50
+
+def search_tokens(text: str) -> List[str]:
+    return SEARCH_TOKEN_PATTERN.findall(text.lower())
+
+def template_search_text(template: dict) -> Dict[str, str]:
+    return {
+        "name": template.get("name") or "",
+        "keywords": ' '.join(template.get("keywords") or []),
+        "theme": template.get("theme") or "",
+        "description": template.get("description") or ""
+    }
+
+class TemplateSearchIndex:
+    """Weighted inverted index with theme/premium/owner facets ("catalog" when unowned)"""
+
+    FACETS = ("theme", "premium", "owner")
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._terms: List[str] = []  # sorted vocabulary, for prefix matching
+        self._doc_terms: Dict[str, List[str]] = {}
+        self._by_name: List[tuple] = []  # sorted (name, id), the order of unranked results
+        self._neg_name_rank: Optional[Dict[str, int]] = None  # tie-break for ranked results
+        # facet -> template id -> value, and facet -> value -> template ids
+        self._facet_values: Dict[str, Dict[str, Any]] = {facet: {} for facet in self.FACETS}
+        self._facet_ids: Dict[str, Dict[Any, set]] = {facet: {} for facet in self.FACETS}
+        self.documents: Dict[str, dict] = {}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, template: dict):
+        template_id = template["id"]
+        self.remove(template_id)
+        weights: Dict[str, float] = {}
+        for field, text in template_search_text(template).items():
+            for token in search_tokens(text):
+                weights[token] = weights.get(token, 0.0) + SEARCH_FIELD_WEIGHTS[field]
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                self._terms.insert(bisect.bisect_left(self._terms, token), token)
+            postings[template_id] = weight
+        self._doc_terms[template_id] = list(weights)
+        
+        values = {
+            "theme": template.get("theme"),
+            "premium": bool(template.get("is_premium")),
+            "owner": template.get("owner_id") or "catalog"
+        }
+        for facet, value in values.items():
+            self._facet_values[facet][template_id] = value
+            self._facet_ids[facet].setdefault(value, set()).add(template_id)
+        
+        document = {field: template.get(field) for field in SEARCH_SUMMARY_FIELDS}
+        bisect.insort(self._by_name, (document["name"] or "", template_id))
+        self._neg_name_rank = None
+        self.documents[template_id] = document
+
+    def remove(self, template_id: str):
+        document = self.documents.pop(template_id, None)
+        if document is None:
+            return
+        for token in self._doc_terms.pop(template_id):
+            postings = self._postings[token]
+            del postings[template_id]
+            if not postings:
+                del self._postings[token]
+                del self._terms[bisect.bisect_left(self._terms, token)]
+        for facet in self.FACETS:
+            value = self._facet_values[facet].pop(template_id)
+            ids = self._facet_ids[facet][value]
+            ids.discard(template_id)
+            if not ids:
+                del self._facet_ids[facet][value]
+        del self._by_name[bisect.bisect_left(self._by_name, (document["name"] or "", template_id))]
+        self._neg_name_rank = None
+
+    def _expand(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._terms, prefix)
+        terms = []
+        for term in self._terms[start:start + SEARCH_MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def _score(self, tokens: List[str]) -> Dict[str, float]:
+        """Summed tf-idf over query terms, all of which must match; the last also matches as a prefix"""
+        total_docs = len(self.documents) or 1
+        scores: Optional[Dict[str, float]] = None
+        for position, token in enumerate(tokens):
+            terms = self._expand(token) if position == len(tokens) - 1 else [token]
+            token_scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                idf = math.log(1 + total_docs / len(postings))
+                if not token_scores:
+                    token_scores = {template_id: weight * idf for template_id, weight in postings.items()}
+                    continue
+                for template_id, weight in postings.items():
+                    if weight * idf > token_scores.get(template_id, 0.0):
+                        token_scores[template_id] = weight * idf
+            if not token_scores:
+                return {}  # a required term matches nothing
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {template_id: score + token_scores[template_id]
+                          for template_id, score in scores.items() if template_id in token_scores}
+            if not scores:
+                break
+        return scores or {}
+
+    def search(self, query: str, filters: Dict[str, Any], page: int = 1, page_size: int = 20) -> dict:
+        tokens = search_tokens(query)
+        scores = self._score(tokens) if tokens else None
+        candidates = scores.keys() if scores is not None else self.documents.keys()
+        
+        filter_ids = {
+            facet: self._facet_ids[facet].get(value, set())
+            for facet, value in filters.items() if value is not None
+        }
+        
+        def restrict(ids, skip: Optional[str] = None):
+            for facet, facet_ids in filter_ids.items():
+                if facet != skip:
+                    ids = ids & facet_ids
+            return ids
+        
+        hits = restrict(candidates)
+        # A facet's counts ignore its own filter, so the other options stay visible
+        facets = {}
+        for facet in self.FACETS:
+            ids = restrict(candidates, skip=facet) if facet in filter_ids else hits
+            counts = Counter(map(self._facet_values[facet].__getitem__, ids))
+            facets[facet] = {str(value).lower() if facet == "premium" else value: count for value, count in counts.items()}
+        
+        page_size = max(1, min(page_size, SEARCH_MAX_PAGE_SIZE))
+        page = max(1, page)
+        wanted = page * page_size
+        if scores is not None:
+            if self._neg_name_rank is None:
+                self._neg_name_rank = {template_id: -rank for rank, (_, template_id) in enumerate(self._by_name)}
+            # Highest score first, then by name; the keys are built without Python-level calls
+            ids = list(hits)
+            ranked = [top[2] for top in heapq.nlargest(
+                wanted, zip(map(scores.__getitem__, ids), map(self._neg_name_rank.__getitem__, ids), ids)
+            )]
+        else:
+            ranked = []
+            for _, template_id in self._by_name:
+                if template_id in hits:
+                    ranked.append(template_id)
+                    if len(ranked) == wanted:
+                        break
+        
+        return {
+            "total": len(hits),
+            "page": page,
+            "page_size": page_size,
+            "results": [
+                {**self.documents[template_id], "score": round(scores[template_id], 3) if scores is not None else None}
+                for template_id in ranked[(page - 1) * page_size:]
+            ],
+            "facets": facets
+        }
+
+template_index = TemplateSearchIndex()
+
+async def rebuild_template_index():
+    templates = await db_find(
+        'templates', coalesce=False, limit=0,
+        projection={"_id": 0, "html_content": 0, "css_content": 0}
+    )
+    index = TemplateSearchIndex()
+    for template in templates:
+        index.add(template)
+    global template_index
+    template_index = index
+
+async def index_template(template: Template):
+    """Add a new template to this worker's index and to every other worker's"""
+    summary = {field: getattr(template, field) for field in SEARCH_SUMMARY_FIELDS}
+    summary["created_at"] = template.created_at.isoformat()
+    template_index.add(summary)
+    await cache.backend.publish('template_index', summary)
+
+async def get_user_from_session(request: Request):
+    """Get user from session token"""
+    return await get_user_from_token(get_bearer_token(request))
+
+async def get_user_from_token(token: Optional[str]) -> Optional[UserRecord]:
+    if not token:
+        return None
     
-    token = auth_header.replace("Bearer ", "")
+    # Signed tokens are self-contained
+    if is_signed_token(token):
+        claims = verify_signed_token(token)
+        return user_from_claims(claims) if claims else None
     
     # Check if session exists and is valid
-    session = await db_find_one('sessions', {"token": token})
-    if not session or session["expires_at"] < datetime.utcnow():
+    user_id = await resolve_session(token)
+    if not user_id:
         return None
     
     # Get user
-    user = await db_find_one('users', {"id": session["user_id"]})
-    return User(**user) if user else None
+    user = await db_find_one('users', {"id": user_id})
+    return UserRecord.from_doc(user) if user else None
+
+# Rate limiting: per-route token buckets keyed by user id (or client IP when
+# anonymous). The local bucket is checked first, so over-limit clients are refused
+# without any I/O; with a shared cache tier, allowed requests are then also checked
+# against the bucket shared by all workers.
+class RateLimitPolicy:
+    __slots__ = ('name', 'rate', 'burst', 'scope')
+
+    def __init__(self, name: str, spec: str, scope: str):
+        # spec is "<requests>/<seconds>"; the burst is the full allowance
+        count, period = spec.split('/')
+        self.name = name
+        self.burst = float(count)
+        self.rate = float(count) / float(period)
+        self.scope = scope  # user, ip
+
+def rate_limit_policy(name: str, default: str, scope: str) -> RateLimitPolicy:
+    return RateLimitPolicy(name, os.environ.get(f'RATE_LIMIT_{name.upper()}', default), scope)
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RATE_LIMIT_SHARED = os.environ.get('RATE_LIMIT_SHARED', 'true').lower() in ('1', 'true', 'yes')
+# Only behind a trusted proxy: X-Forwarded-For is client-controlled otherwise
+RATE_LIMIT_TRUST_FORWARDED = os.environ.get('RATE_LIMIT_TRUST_FORWARDED', '').lower() in ('1', 'true', 'yes')
+
+RATE_LIMIT_POLICIES = {
+    policy.name: policy for policy in (
+        rate_limit_policy('auth', '20/60', 'ip'),
+        rate_limit_policy('ai_generate', '10/3600', 'user'),
+        rate_limit_policy('create_invitation', '30/60', 'user'),
+        rate_limit_policy('checkout', '10/60', 'user'),
+        rate_limit_policy('export', '30/60', 'user'),
+        rate_limit_policy('guest_import', '10/60', 'user'),
+        rate_limit_policy('account_export', '10/3600', 'user'),
+        rate_limit_policy('rsvp', '20/60', 'ip'),
+    )
+}
+rate_limit_buckets = TokenBuckets(RATE_LIMIT_MAX_KEYS)
+rate_limit_stats = {"allowed": 0, "limited": 0, "shared_unavailable": 0}
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+async def check_rate_limit(policy: RateLimitPolicy, key: str):
+    bucket_key = f"{policy.name}:{key}"
+    wait = rate_limit_buckets.take(bucket_key, policy.rate, policy.burst)
+    if not wait and RATE_LIMIT_SHARED and cache.backend.name != 'local':
+        shared_wait = await cache.backend.take_token(bucket_key, policy.rate, policy.burst)
+        if shared_wait is None:
+            rate_limit_stats["shared_unavailable"] += 1
+        else:
+            wait = shared_wait
+    if wait:
+        rate_limit_stats["limited"] += 1
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests, please retry later",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))}
+        )
+    rate_limit_stats["allowed"] += 1
+
+def rate_limit(policy_name: str):
+    """Route dependency enforcing a named rate limit policy"""
+    policy = RATE_LIMIT_POLICIES[policy_name]
+    
+    async def dependency(request: Request, user: Optional[UserRecord] = Depends(get_user_from_session)):
+        if not RATE_LIMIT_ENABLED:
+            return
+        key = f"user:{user.id}" if policy.scope == 'user' and user else f"ip:{client_ip(request)}"
+        await check_rate_limit(policy, key)
+    
+    return Depends(dependency)
 
 # Auth Endpoints
-@api_router.post("/auth/google")
+@api_router.post("/auth/google", dependencies=[rate_limit('auth')])
 async def google_auth(request: Request):
     """Handle Google OAuth authentication"""
     body = await request.json()
@@ -229,8 +1569,8 @@ async def google_auth(request: Request):
     
     # Call Emergent auth API
     try:
-        response = requests.get(
-            "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
+        response = await outbound_request(
+            "GET", "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data", "emergent_auth",
             headers={"X-Session-ID": session_id}
         )
         
@@ -243,65 +1583,113 @@ async def google_auth(request: Request):
         existing_user = await db_find_one('users', {"email": user_data["email"]})
         
         if existing_user:
-            user = User(**existing_user)
+            user = UserRecord.from_doc(existing_user)
             user.last_login = datetime.utcnow()
             await db_update_one(
                 'users',
                 {"id": user.id},
-                {"$set": user.dict(exclude={"id"})}
+                {"$set": {"last_login": user.last_login}}
             )
         else:
             # Create new user
-            user = User(
+            user_doc = User(
                 email=user_data["email"],
                 name=user_data["name"],
                 picture=user_data.get("picture")
-            )
-            await db_insert_one('users', user.dict())
+            ).dict()
+            await db_insert_one('users', user_doc)
+            user = UserRecord.from_doc(user_doc)
         
         # Create session
-        session_token = secrets.token_urlsafe(32)
-        session_data = {
-            "token": session_token,
-            "user_id": user.id,
-            "expires_at": datetime.utcnow() + timedelta(days=7)
-        }
-        await db_insert_one('sessions', session_data)
+        session_token = await create_session(user)
         
-        return {
-            "user": user.dict(),
+        return RecordResponse({
+            "user": user,
             "session_token": session_token
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/auth/logout")
+async def logout(request: Request):
+    """Revoke the current session token"""
+    token = get_bearer_token(request)
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    await revoke_session(token)
+    return {"message": "Logged out"}
+
+@api_router.post("/auth/refresh")
+async def refresh_session(request: Request, user: UserRecord = Depends(get_user_from_session)):
+    """Rotate the session token, picking up changes such as a premium upgrade"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    stored = await db_find_one('users', {"id": user.id})
+    if not stored:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user = UserRecord.from_doc(stored)
+    session_token = await create_session(user)
+    await revoke_session(get_bearer_token(request))
+    return RecordResponse({
+        "user": user,
+        "session_token": session_token
+    })
+
 @api_router.get("/auth/me")
-async def get_current_user(user: User = Depends(get_user_from_session)):
+async def get_current_user(request: Request, user: UserRecord = Depends(get_user_from_session)):
     """Get current authenticated user"""
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    return user
+    if is_signed_token(get_bearer_token(request)):
+        # Signed tokens only carry authorization claims; load the full profile
+        stored = await db_find_one('users', {"id": user.id})
+        return RecordResponse(UserRecord.from_doc(stored) if stored else user)
+    return RecordResponse(user)
 
 # Template Endpoints
 @api_router.get("/templates")
 async def get_templates():
     """Get all available templates"""
-    templates = await db_find('templates')
-    return [Template(**template) for template in templates]
+    templates = await db_find('templates', profile='public_read')
+    return RecordResponse(TemplateRecord.from_docs(templates))
+
+@api_router.get("/templates/search")
+async def search_templates(
+    request: Request,
+    q: str = "",
+    theme: Optional[str] = None,
+    premium: Optional[bool] = None,
+    owner: Optional[str] = None,
+    page: int = 1,
+    page_size: int = 20
+):
+    """Ranked, faceted template search; owner is "catalog", "me" or a user id"""
+    started = time.perf_counter()
+    owner_id = owner
+    if owner == "me":
+        user = await get_user_from_session(request)
+        if not user:
+            raise HTTPException(status_code=401, detail="Authentication required")
+        owner_id = user.id
+    
+    filters = {"theme": theme, "premium": premium, "owner": owner_id}
+    result = template_index.search(q, filters, page, page_size)
+    result["took_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return result
 
 @api_router.get("/templates/{template_id}")
 async def get_template(template_id: str):
     """Get specific template by ID"""
-    template = await db_find_one('templates', {"id": template_id})
+    template = await get_template_doc(template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
-    return Template(**template)
+    return RecordResponse(TemplateRecord.from_doc(template))
 
 @api_router.post("/templates")
 async def create_template(
     template_data: TemplateCreateRequest,
-    user: User = Depends(get_user_from_session)
+    user: UserRecord = Depends(get_user_from_session)
 ):
     """Create a new template (premium users only)"""
     if not user:
@@ -310,25 +1698,174 @@ async def create_template(
     if not user.premium:
         raise HTTPException(status_code=403, detail="Premium subscription required")
     
+    template_id = str(uuid.uuid4())
     template = Template(
+        id=template_id,
         name=template_data.name,
         description=template_data.description,
         theme=template_data.theme,
         html_content=template_data.html_content,
         css_content=template_data.css_content,
-        preview_url=f"/templates/{template_data.theme}/preview",
+        preview_url=template_preview_path(template_id),
         is_premium=True,
         owner_id=user.id
     )
     
     await db_insert_one('templates', template.dict())
+    await index_template(template)
     return template
 
+# Live preview: the editor sends only the fields that changed and gets back the
+# re-rendered placeholder slots, or the full HTML when a changed placeholder sits
+# inside markup and cannot be patched on its own.
+PREVIEW_DEFAULTS = {
+    "bride_name": "Bride Name",
+    "groom_name": "Groom Name",
+    "wedding_date": "Wedding Date",
+    "wedding_time": "Time",
+    "venue_name": "Venue Name",
+    "venue_address": "Venue Address"
+}
+PREVIEW_EVENTS_PLACEHOLDER = '<p>Event Details</p>'
+PREVIEW_SESSION_TTL = 1800
+PREVIEW_DEBOUNCE_MS = float(os.environ.get('PREVIEW_DEBOUNCE_MS', '25'))
+
+class PreviewRequest(BaseModel):
+    template_id: str
+    invitation_data: InvitationDataUpdate = InvitationDataUpdate()
+    # Returned by the previous call; unknown or expired ids get a full render
+    preview_id: Optional[str] = None
+
+class PreviewState:
+    """Last rendered placeholder values of one editor session"""
+    __slots__ = ('template_id', 'data', 'values')
+
+    def __init__(self, template_id: str):
+        self.template_id = template_id
+        self.data: Dict[str, Any] = {}
+        self.values: Optional[Dict[str, str]] = None
+
+preview_sessions = LRUCache(int(os.environ.get('PREVIEW_SESSION_CACHE_SIZE', '4096')))
+
+def preview_placeholder_values(data: dict) -> Dict[str, str]:
+    preview_data = {**data, **{key: data.get(key) or default for key, default in PREVIEW_DEFAULTS.items()}}
+    preview_data["events"] = [event for event in data.get("events") or [] if event.get("name") and event.get("time")]
+    values = invitation_placeholder_values(preview_data)
+    values["events"] = values["events"] or PREVIEW_EVENTS_PLACEHOLDER
+    return values
+
+def apply_preview_changes(state: PreviewState, template: dict, changes: dict) -> dict:
+    """Merge changed fields into a preview and return slot patches or full HTML"""
+    state.data.update(changes)
+    values = preview_placeholder_values(state.data)
+    compiled = get_compiled_template(template)
+    previous, state.values = state.values, values
+    if previous is None:
+        return {"html": compiled.render(values, slots=True)}
+    changed = [name for name in dict.fromkeys(compiled.placeholders) if values.get(name) != previous.get(name)]
+    if any(name not in compiled.patchable for name in changed):
+        return {"html": compiled.render(values, slots=True)}
+    return {"patches": [{"slot": name, "html": values.get(name, '')} for name in changed]}
+
+@api_router.post("/preview")
+async def preview_invitation(preview_request: PreviewRequest):
+    """Render a template preview, incrementally when a preview_id is given"""
+    template = await get_template_doc(preview_request.template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    
+    state = preview_sessions.get(preview_request.preview_id) if preview_request.preview_id else None
+    preview_id = preview_request.preview_id
+    if state is None or state.template_id != preview_request.template_id:
+        preview_id = secrets.token_urlsafe(12)
+        state = PreviewState(preview_request.template_id)
+    
+    result = apply_preview_changes(state, template, preview_request.invitation_data.dict(exclude_unset=True))
+    preview_sessions.set(preview_id, state, PREVIEW_SESSION_TTL)
+    return {"preview_id": preview_id, **result}
+
+@api_router.websocket("/preview/ws")
+async def preview_socket(websocket: WebSocket):
+    """Preview channel: {"template_id", "invitation_data", "seq"} in, patches or HTML out.
+
+    Messages arriving within PREVIEW_DEBOUNCE_MS of each other are merged into
+    one render; replies echo the last merged `seq`.
+    """
+    await websocket.accept()
+    inbox: asyncio.Queue = asyncio.Queue()
+    
+    async def read_messages():
+        try:
+            while True:
+                text = await websocket.receive_text()
+                try:
+                    await inbox.put(json.loads(text))
+                except ValueError as e:
+                    await inbox.put(e)  # answered with an error frame, like any non-object
+        except WebSocketDisconnect:
+            pass
+        finally:
+            await inbox.put(None)
+    
+    reader = asyncio.create_task(read_messages())
+    state: Optional[PreviewState] = None
+    try:
+        while True:
+            message = await inbox.get()
+            if message is None:
+                break
+            await asyncio.sleep(PREVIEW_DEBOUNCE_MS / 1000)
+            batch = [message]
+            while not inbox.empty():
+                batch.append(inbox.get_nowait())
+            closed = batch[-1] is None
+            batch = [m for m in batch if m is not None]
+            for m in batch:
+                if not isinstance(m, dict):
+                    error = f"Invalid JSON: {m}" if isinstance(m, ValueError) else "Messages must be JSON objects"
+                    await websocket.send_json({"seq": None, "error": error})
+            batch = [m for m in batch if isinstance(m, dict)]
+            if not batch:
+                if closed:
+                    break
+                continue
+            
+            try:
+                updates = [
+                    PreviewRequest(template_id=m.get("template_id") or (state.template_id if state else ""),
+                                   invitation_data=m.get("invitation_data") or {})
+                    for m in batch
+                ]
+            except ValueError as e:
+                await websocket.send_json({"seq": batch[-1].get("seq"), "error": str(e)})
+                continue
+            
+            template_id = updates[-1].template_id
+            template = await get_template_doc(template_id)
+            if not template:
+                await websocket.send_json({"seq": batch[-1].get("seq"), "error": "Template not found"})
+                continue
+            if state is None or state.template_id != template_id:
+                # Switching templates keeps the typed details but renders in full
+                data = state.data if state else {}
+                state = PreviewState(template_id)
+                state.data = data
+            changes = {}
+            for preview_request in updates:
+                changes.update(preview_request.invitation_data.dict(exclude_unset=True))
+            await websocket.send_json({"seq": batch[-1].get("seq"), **apply_preview_changes(state, template, changes)})
+            if closed:
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+
 # AI Template Generation
-@api_router.post("/templates/generate-ai")
+@api_router.post("/templates/generate-ai", dependencies=[rate_limit('ai_generate')])
 async def generate_ai_template(
     request: Request,
-    user: User = Depends(get_user_from_session)
+    user: UserRecord = Depends(get_user_from_session)
 ):
     """Generate AI-powered wedding invitation template"""
     if not user:
@@ -373,7 +1910,7 @@ async def generate_ai_template(
             }]
         }
         
-        response = requests.post(ai_api_url, headers=headers, json=ai_payload)
+        response = await outbound_request("POST", ai_api_url, "gemini", headers=headers, json=ai_payload)
         
         if response.status_code == 200:
             ai_response = response.json()
@@ -392,18 +1929,22 @@ async def generate_ai_template(
             """
             
             # Create new template
+            template_id = str(uuid.uuid4())
             template = Template(
+                id=template_id,
                 name=f"AI Generated - {keywords}",
                 description=f"AI-generated template with {keywords} theme",
                 theme=theme,
                 html_content=html_content,
                 css_content=css_content,
-                preview_url=f"/templates/ai/{uuid.uuid4()}/preview",
+                preview_url=template_preview_path(template_id),
                 is_premium=True,
-                owner_id=user.id
+                owner_id=user.id,
+                keywords=search_tokens(keywords)
             )
             
             await db_insert_one('templates', template.dict())
+            await index_template(template)
             return template
         else:
             raise HTTPException(status_code=500, detail="AI template generation failed")
@@ -411,18 +1952,237 @@ async def generate_ai_template(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI generation error: {str(e)}")
 
+# Live invitation events: RSVPs and view-count deltas are pushed to the owner's open
+# dashboards instead of being polled. Each event is encoded once and fanned out to
+# bounded per-subscriber queues; other workers receive it over the cache pub/sub.
+INVITATION_STAT_FIELDS = ("views", "rsvp_attending", "rsvp_declined", "guests")
+EVENT_QUEUE_SIZE = int(os.environ.get('EVENT_QUEUE_SIZE', '64'))
+EVENT_HEARTBEAT_INTERVAL = float(os.environ.get('EVENT_HEARTBEAT_INTERVAL', '25'))
+VIEW_FLUSH_INTERVAL = float(os.environ.get('VIEW_FLUSH_INTERVAL', '2'))
+
+class EventSubscription:
+    """One connected dashboard: a bounded queue of encoded events"""
+    __slots__ = ('invitation_ids', 'queue', 'overflowed')
+
+    def __init__(self, invitation_ids: List[str], maxsize: int):
+        self.invitation_ids = invitation_ids
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+class EventHub:
+    """Fans invitation events out to this worker's subscribers"""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, set] = {}
+        self.published = 0
+        self.delivered = 0
+        self.overflows = 0
+
+    def subscribe(self, invitation_ids: List[str]) -> EventSubscription:
+        subscription = EventSubscription(invitation_ids, self.queue_size)
+        for invitation_id in invitation_ids:
+            self._subscribers.setdefault(invitation_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: EventSubscription):
+        for invitation_id in subscription.invitation_ids:
+            subscribers = self._subscribers.get(invitation_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[invitation_id]
+
+    def fan_out(self, event: dict):
+        subscribers = self._subscribers.get(event["invitation_id"])
+        if not subscribers:
+            return
+        encoded = json.dumps(event, separators=(',', ':'))
+        for subscription in subscribers:
+            if subscription.overflowed:
+                continue
+            try:
+                subscription.queue.put_nowait(encoded)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                # A slow consumer skips its backlog and gets a fresh snapshot instead
+                subscription.overflowed = True
+                self.overflows += 1
+
+    async def publish(self, event: dict):
+        self.published += 1
+        self.fan_out(event)
+        await cache.backend.publish('invitation_events', event)
+
+    def stats(self) -> dict:
+        return {
+            "invitations": len(self._subscribers),
+            "subscriptions": len({s for subscribers in self._subscribers.values() for s in subscribers}),
+            "published": self.published,
+            "delivered": self.delivered,
+            "overflows": self.overflows
+        }
+
+invitation_events = EventHub(EVENT_QUEUE_SIZE)
+
+class ViewCounter:
+    """Buffers invitation views; flushed as one $inc and one event per invitation"""
+
+    def __init__(self):
+        self._pending: Dict[str, int] = {}
+
+    def record(self, invitation_id: str):
+        self._pending[invitation_id] = self._pending.get(invitation_id, 0) + 1
+
+    def pending(self, invitation_id: str) -> int:
+        return self._pending.get(invitation_id, 0)
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        for invitation_id, count in pending.items():
+            try:
+                await db_update_one('invitations', {"id": invitation_id}, {"$inc": {"stats.views": count}})
+            except Exception:
+                logger.exception("Failed to record %s views for %s", count, invitation_id)
+                continue
+            await invitation_events.publish({"type": "views", "invitation_id": invitation_id, "delta": {"views": count}})
+
+view_counter = ViewCounter()
+
+async def flush_view_counts():
+    while True:
+        await asyncio.sleep(VIEW_FLUSH_INTERVAL)
+        await view_counter.flush()
+
+async def invitation_stats_snapshot(invitation_ids: List[str]) -> str:
+    invitations = await db_find(
+        'invitations', {"id": {"$in": invitation_ids}},
+        coalesce=False, projection={"_id": 0, "id": 1, "stats": 1}
+    )
+    stats = {}
+    for invitation in invitations:
+        counters = invitation.get("stats") or {}
+        stats[invitation["id"]] = {name: counters.get(name, 0) for name in INVITATION_STAT_FIELDS}
+        stats[invitation["id"]]["views"] += view_counter.pending(invitation["id"])
+    return json.dumps({"type": "snapshot", "stats": stats}, separators=(',', ':'))
+
+async def owned_invitation_ids(user: UserRecord, requested: Optional[str]) -> List[str]:
+    invitations = await db_find('invitations', {"user_id": user.id}, projection={"_id": 0, "id": 1})
+    owned = [invitation["id"] for invitation in invitations]
+    if requested:
+        wanted = set(requested.split(','))
+        owned = [invitation_id for invitation_id in owned if invitation_id in wanted]
+    return owned
+
+async def subscription_messages(subscription: EventSubscription):
+    """Encoded messages for one subscriber: a snapshot, then events and heartbeats"""
+    yield await invitation_stats_snapshot(subscription.invitation_ids)
+    while True:
+        if subscription.overflowed:
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.overflowed = False
+            yield await invitation_stats_snapshot(subscription.invitation_ids)
+            continue
+        try:
+            yield await asyncio.wait_for(subscription.queue.get(), EVENT_HEARTBEAT_INTERVAL)
+        except asyncio.TimeoutError:
+            yield '{"type":"heartbeat"}'
+
+# EventSource and browser WebSockets cannot send an Authorization header, and a
+# session token in the URL would end up in access and proxy logs. Instead they pass
+# a single-use ticket, kept in the cache (so any worker can redeem it) for a few seconds.
+STREAM_TICKET_TTL = float(os.environ.get('STREAM_TICKET_TTL', '30'))
+
+def stream_ticket_key(ticket: str) -> str:
+    return f"stream_ticket:{hash_session_token(ticket)}"
+
+async def redeem_stream_ticket(ticket: Optional[str]) -> Optional[UserRecord]:
+    if not ticket:
+        return None
+    user = await cache.pop(stream_ticket_key(ticket))
+    return UserRecord(**user) if user is not None else None
+
+@api_router.post("/invitations/events/ticket")
+async def create_event_stream_ticket(user: UserRecord = Depends(get_user_from_session)):
+    """Single-use ticket for opening an event stream (?ticket=)"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    ticket = secrets.token_urlsafe(24)
+    await cache.set(
+        stream_ticket_key(ticket),
+        {"id": user.id, "email": user.email, "name": user.name, "premium": user.premium},
+        STREAM_TICKET_TTL
+    )
+    return {"ticket": ticket, "expires_in": STREAM_TICKET_TTL}
+
+@api_router.get("/invitations/events")
+async def invitation_event_stream(request: Request, ids: Optional[str] = None, ticket: Optional[str] = None):
+    """Server-sent events for the user's invitations (EventSource passes ?ticket=)"""
+    user = await get_user_from_session(request) or await redeem_stream_ticket(ticket)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    from fastapi.responses import StreamingResponse
+    
+    subscription = invitation_events.subscribe(await owned_invitation_ids(user, ids))
+    
+    async def stream():
+        try:
+            async for message in subscription_messages(subscription):
+                yield f"data: {message}\n\n"
+        finally:
+            invitation_events.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.websocket("/invitations/events/ws")
+async def invitation_event_socket(websocket: WebSocket, ids: Optional[str] = None, ticket: Optional[str] = None):
+    """WebSocket variant of /invitations/events"""
+    user = await redeem_stream_ticket(ticket)
+    if not user:
+        await websocket.close(code=4401)
+        return
+    await websocket.accept()
+    
+    subscription = invitation_events.subscribe(await owned_invitation_ids(user, ids))
+    
+    async def watch_disconnect():
+        try:
+            while True:
+                await websocket.receive_text()
+        except WebSocketDisconnect:
+            pass
+    
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        async for message in subscription_messages(subscription):
+            if watcher.done():
+                break
+            await websocket.send_text(message)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        watcher.cancel()
+        invitation_events.unsubscribe(subscription)
+
 # Invitation Endpoints
-@api_router.post("/invitations")
+@api_router.post("/invitations", dependencies=[rate_limit('create_invitation')])
 async def create_invitation(
     invitation_request: CreateInvitationRequest,
-    user: User = Depends(get_user_from_session)
+    user: UserRecord = Depends(get_user_from_session)
 ):
     """Create a new wedding invitation"""
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
-    # Check if template exists
-    template = await db_find_one('templates', {"id": invitation_request.template_id})
+    # Check if template exists (on the primary: it may have just been generated)
+    template = await get_template_doc(invitation_request.template_id, profile='default')
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     
@@ -441,68 +2201,777 @@ async def create_invitation(
     )
     
     # Generate QR code
-    qr_url = f"{os.getenv('FRONTEND_URL', 'http://localhost:3000')}/i/{url_slug}"
-    invitation.qr_code = generate_qr_code(qr_url)
+    invitation.qr_code = generate_qr_code(frontend_link(url_slug))
     
-    await db_insert_one('invitations', invitation.dict())
-    return invitation
+    invitation_doc = invitation.dict()
+    await db_insert_one('invitations', invitation_doc)
+    await write_invitation_snapshot(invitation_doc, template)
+    return RecordResponse(InvitationRecord.from_doc(invitation_doc))
 
 @api_router.get("/invitations")
-async def get_user_invitations(user: User = Depends(get_user_from_session)):
+async def get_user_invitations(user: UserRecord = Depends(get_user_from_session)):
     """Get current user's invitations"""
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     invitations = await db_find('invitations', {"user_id": user.id})
-    return [Invitation(**inv) for inv in invitations]
+    with tracer.span('model.build', model='InvitationRecord', count=len(invitations)):
+        return RecordResponse(InvitationRecord.from_docs(invitations))
+
+# Template fields the dashboard shows next to each invitation
+DASHBOARD_TEMPLATE_PROJECTION = {"_id": 0, "id": 1, "name": 1, "theme": 1, "preview_url": 1, "is_premium": 1}
+
+@api_router.get("/dashboard")
+async def get_dashboard(user: UserRecord = Depends(get_user_from_session)):
+    """The user's invitations, newest first, with template summaries and counters in one query"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    invitations = await db_find_joined(
+        'invitations', {"user_id": user.id}, 'templates', 'template_id', 'template',
+        join_projection=DASHBOARD_TEMPLATE_PROJECTION,
+        # The QR code is most of an invitation's size and the dashboard never shows it
+        projection={"_id": 0, "qr_code": 0},
+        sort=[("created_at", -1)]
+    )
+    summaries = []
+    for invitation in invitations:
+        counters = invitation.pop("stats", None) or {}
+        stats = {name: counters.get(name, 0) for name in INVITATION_STAT_FIELDS}
+        stats["views"] += view_counter.pending(invitation["id"])
+        summaries.append({**invitation, "stats": stats})
+    return RecordResponse({"invitations": summaries})
+
+@api_router.get("/invitations/{invitation_id}")
+async def get_invitation(
+    invitation_id: str,
+    user: UserRecord = Depends(get_user_from_session)
+):
+    """Get specific invitation"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    invitation = await db_find_one('invitations', {
+        "id": invitation_id,
+        "user_id": user.id
+    })
+    if not invitation:
+        raise HTTPException(status_code=404, detail="Invitation not found")
+    
+    return RecordResponse(InvitationRecord.from_doc(invitation))
+
+# Revisions kept per invitation; older ones are pruned on edit
+INVITATION_HISTORY_LIMIT = int(os.environ.get('INVITATION_HISTORY_LIMIT', '50'))
+
+@api_router.patch("/invitations/{invitation_id}")
+async def update_invitation(
+    invitation_id: str,
+    update_request: UpdateInvitationRequest,
+    user: UserRecord = Depends(get_user_from_session)
+):
+    """Edit invitation fields in place; the slug and QR code are kept"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    invitation = await db_find_one('invitations', {
+        "id": invitation_id,
+        "user_id": user.id
+    }, coalesce=False)
+    if not invitation:
+        raise HTTPException(status_code=404, detail="Invitation not found")
+    
+    current_version = invitation.get("version", 1)
+    if update_request.version is not None and update_request.version != current_version:
+        raise HTTPException(status_code=409, detail="Invitation was modified, reload and retry")
+    
+    # Only fields whose value actually changes are written and recorded
+    changes = {}
+    if update_request.invitation_data:
+        stored = invitation["invitation_data"]
+        for field, value in update_request.invitation_data.dict(exclude_unset=True).items():
+            if stored.get(field) != value:
+                changes[f"invitation_data.{field}"] = [stored.get(field), value]
+        merged = {**stored, **{path.split('.', 1)[1]: new for path, (_, new) in changes.items()}}
+        try:
+            InvitationData(**merged)
+        except ValidationError as e:
+            # Same shape as FastAPI's own 422s, located in the request body
+            raise RequestValidationError([
+                {**error, "loc": ("body", "invitation_data", *error["loc"])}
+                for error in e.errors(include_url=False)
+            ])
+    if update_request.is_published is not None and update_request.is_published != invitation.get("is_published"):
+        changes["is_published"] = [invitation.get("is_published"), update_request.is_published]
+    
+    if not changes:
+        return RecordResponse(InvitationRecord.from_doc(invitation))
+    
+    new_version = current_version + 1
+    updated_at = datetime.utcnow()
+    result = await db_update_one(
+        'invitations',
+        # Missing `version` matches None, so pre-versioning documents update too
+        {"id": invitation_id, "user_id": user.id, "version": invitation.get("version")},
+        {"$set": {
+            **{path: new for path, (_, new) in changes.items()},
+            "version": new_version,
+            "updated_at": updated_at
+        }}
+    )
+    if not result.matched_count:
+        raise HTTPException(status_code=409, detail="Invitation was modified, reload and retry")
+    
+    revision = InvitationRevision(
+        invitation_id=invitation_id,
+        user_id=user.id,
+        version=new_version,
+        changes=changes,
+        created_at=updated_at
+    )
+    await db_insert_one('invitation_revisions', revision.dict())
+    if new_version > INVITATION_HISTORY_LIMIT:
+        await db_delete_many('invitation_revisions', {
+            "invitation_id": invitation_id,
+            "version": {"$lte": new_version - INVITATION_HISTORY_LIMIT}
+        })
+    
+    # Public pages read through the cache; exports are keyed by updated_at
+    await invalidate_invitation_cache(invitation)
+    
+    updated = await db_find_one('invitations', {"id": invitation_id}, coalesce=False)
+    await refresh_invitation_snapshot(updated)
+    return RecordResponse(InvitationRecord.from_doc(updated))
+
+@api_router.get("/invitations/{invitation_id}/history")
+async def get_invitation_history(
+    invitation_id: str,
+    limit: int = 20,
+    user: UserRecord = Depends(get_user_from_session)
+):
+    """Recent edits to an invitation, newest first"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    revisions = await db_find(
+        'invitation_revisions',
+        {"invitation_id": invitation_id, "user_id": user.id},
+        projection={"_id": 0},
+        sort=[("version", -1)],
+        limit=max(1, min(limit, INVITATION_HISTORY_LIMIT))
+    )
+    return [InvitationRevision(**revision) for revision in revisions]
+
+# Invitation export: rasterization runs in a process pool, never on the event loop
+EXPORT_FORMATS = {"png": "image/png", "pdf": "application/pdf"}
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', str(min(2, os.cpu_count() or 1))))
+EXPORT_CONCURRENCY = int(os.environ.get('EXPORT_CONCURRENCY', str(EXPORT_WORKERS)))
+EXPORT_MAX_WAITING = int(os.environ.get('EXPORT_MAX_WAITING', '16'))
+EXPORT_CACHE_TTL = 24 * 3600
+
+export_cache = LRUCache(int(os.environ.get('EXPORT_CACHE_SIZE', '64')))
+export_flight = SingleFlight()
+export_limiter = ConcurrencyLimiter(EXPORT_CONCURRENCY, EXPORT_MAX_WAITING, retry_after=5)
+render_pool = None
+
+def get_render_pool():
+    global render_pool
+    if render_pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        
+        # spawn: workers import only the rendering module, not this one
+        render_pool = ProcessPoolExecutor(
+            max_workers=EXPORT_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return render_pool
+
+async def run_in_render_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(get_render_pool(), fn, *args)
+
+async def render_export(cache_key: str, invitation: dict, theme: str, fmt: str) -> bytes:
+    from rendering import render_invitation
+    
+    async with export_limiter:
+        with tracer.span('render.export', format=fmt):
+            content = await run_in_render_pool(render_invitation, invitation, theme, fmt)
+    export_cache.set(cache_key, content, EXPORT_CACHE_TTL)
+    return content
+
+# Template previews: each template's sample invitation is rendered in the render
+# pool at every thumbnail size, as WebP and (where Pillow can encode it) AVIF, and
+# kept in a disk LRU shared by the workers. File names carry the template id and a
+# digest of everything the image depends on (name, stylesheet colours, layout), so
+# they are served as immutable; a template's stable preview URL redirects to its
+# current thumbnail.
+THUMBNAIL_DIR = os.environ.get('THUMBNAIL_DIR', '/tmp/wedding-invitations-thumbnails')
+THUMBNAIL_CACHE_BYTES = int(os.environ.get('THUMBNAIL_CACHE_MB', '256')) * 1024 * 1024
+THUMBNAIL_NAME = re.compile(r"([A-Za-z0-9_-]+)-([0-9a-f]{12})-([a-z]+)\.([a-z]+)$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+thumbnail_cache = DiskLRUCache(THUMBNAIL_DIR, THUMBNAIL_CACHE_BYTES)
+thumbnail_flight = SingleFlight()
+
+def template_preview_path(template_id: str) -> str:
+    return f"{api_router.prefix}/templates/{template_id}/preview"
+
+def thumbnail_source(template: dict) -> dict:
+    """The parts of a template its thumbnails depend on"""
+    return {field: template.get(field) for field in ("name", "theme", "css_content")}
+
+def thumbnail_name(template_id: str, digest: str, size: str, fmt: str) -> str:
+    return f"{template_id}-{digest}-{size}.{fmt}"
+
+def store_thumbnails(template_id: str, digest: str, thumbnails: dict):
+    for (size, fmt), data in thumbnails.items():
+        thumbnail_cache.put(thumbnail_name(template_id, digest, size, fmt), data)
+
+async def render_template_thumbnails(template_id: str, digest: str, source: dict) -> dict:
+    """Render and store every size and format; returns {(size, format): bytes}"""
+    from rendering import render_thumbnails, thumbnail_formats
+    
+    async with export_limiter:
+        with tracer.span('render.thumbnails', template_id=template_id):
+            thumbnails = await run_in_render_pool(render_thumbnails, source, thumbnail_formats())
+    await asyncio.to_thread(store_thumbnails, template_id, digest, thumbnails)
+    return thumbnails
+
+@api_router.get("/templates/{template_id}/preview")
+async def get_template_preview(request: Request, template_id: str, size: str = "md", format: Optional[str] = None):
+    """Redirect to the template's thumbnail (size: sm, md, lg; format: avif or webp, else from Accept)"""
+    from rendering import THUMBNAIL_FORMATS, THUMBNAIL_WIDTHS, thumbnail_digest, thumbnail_formats
+    
+    if size not in THUMBNAIL_WIDTHS:
+        raise HTTPException(status_code=400, detail=f"Unsupported size, use one of: {', '.join(THUMBNAIL_WIDTHS)}")
+    formats = thumbnail_formats()
+    if format is None:
+        accept = request.headers.get("accept", "")
+        format = next((fmt for fmt in formats if THUMBNAIL_FORMATS[fmt] in accept), "webp")
+    elif format not in formats:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, use one of: {', '.join(formats)}")
+    
+    template = await get_template_doc(template_id)
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    digest = thumbnail_digest(thumbnail_source(template))
+    return RedirectResponse(
+        f"{api_router.prefix}/thumbnails/{thumbnail_name(template_id, digest, size, format)}",
+        status_code=302,
+        headers={"Cache-Control": "public, max-age=3600", "Vary": "Accept"}
+    )
+
+@api_router.get("/thumbnails/{name}")
+async def get_thumbnail(name: str):
+    """A rendered template thumbnail; its name changes whenever its content would"""
+    from rendering import THUMBNAIL_FORMATS, THUMBNAIL_WIDTHS, thumbnail_digest, thumbnail_formats
+    
+    match = THUMBNAIL_NAME.match(name)
+    if not match:
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    template_id, digest, size, fmt = match.groups()
+    if size not in THUMBNAIL_WIDTHS or fmt not in thumbnail_formats():
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    path = thumbnail_cache.get(name)
+    if path is not None:
+        return FileResponse(path, media_type=THUMBNAIL_FORMATS[fmt], headers=headers)
+    
+    # Only the template's current digest is rendered; older names stay gone
+    template = await get_template_doc(template_id)
+    source = thumbnail_source(template) if template else None
+    if not source or digest != thumbnail_digest(source):
+        raise HTTPException(status_code=404, detail="Thumbnail not found")
+    # One render covers every size and format. Serve the rendered bytes: the file
+    # may already have been evicted by a write from another worker.
+    thumbnails = await thumbnail_flight.do(
+        f"{template_id}:{digest}", lambda: render_template_thumbnails(template_id, digest, source)
+    )
+    return Response(content=thumbnails[(size, fmt)], media_type=THUMBNAIL_FORMATS[fmt], headers=headers)
+
+@api_router.get("/invitations/{invitation_id}/export", dependencies=[rate_limit('export')])
+async def export_invitation(
+    invitation_id: str,
+    format: str = "png",
+    user: UserRecord = Depends(get_user_from_session)
+):
+    """Download an invitation as a PNG image or printable PDF"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, use one of: {', '.join(EXPORT_FORMATS)}")
+    
+    invitation = await db_find_one('invitations', {
+        "id": invitation_id,
+        "user_id": user.id
+    })
+    if not invitation:
+        raise HTTPException(status_code=404, detail="Invitation not found")
+    
+    updated_at = invitation.get("updated_at")
+    version = updated_at.isoformat() if isinstance(updated_at, datetime) else str(updated_at)
+    cache_key = f"{invitation_id}:{version}:{format}"
+    
+    content = export_cache.get(cache_key)
+    if content is None:
+        template = await get_template_doc(invitation["template_id"])
+        theme = template["theme"] if template else "classic"
+        payload = {
+            "invitation_data": invitation["invitation_data"],
+            "qr_code": invitation.get("qr_code")
+        }
+        content = await export_flight.do(
+            cache_key, lambda: render_export(cache_key, payload, theme, format)
+        )
+    
+    return Response(
+        content=content,
+        media_type=EXPORT_FORMATS[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="invitation-{invitation["url_slug"]}.{format}"',
+            "Cache-Control": "private, max-age=0, must-revalidate",
+            "ETag": f'"{hashlib.sha1(cache_key.encode()).hexdigest()}"'
+        }
+    )
+
+# Guest lists: every guest gets a short token under the invitation's link
+# (/i/<slug>?g=<token>) and a QR code of their own. Uploads are parsed as they
+# stream in and written in chunks, so memory stays flat however long the list is;
+# each chunk's QR codes are split across the render pool while the next chunk is
+# being read.
+GUEST_IMPORT_FORMATS = ("csv", "ndjson")
+GUEST_IMPORT_CHUNK = int(os.environ.get('GUEST_IMPORT_CHUNK', '500'))
+GUEST_IMPORT_MAX_LINE = 64 * 1024
+GUEST_IMPORT_ERRORS_SHOWN = 20
+GUEST_LIMIT = int(os.environ.get('GUEST_LIMIT', '5000'))  # per invitation
+# CSV header aliases; unknown columns are ignored
+GUEST_CSV_COLUMNS = {
+    "name": "name", "guest": "name", "full_name": "name",
+    "email": "email", "phone": "phone",
+    "party_size": "party_size", "guests": "party_size", "size": "party_size",
+}
+
+async def iter_upload_lines(request: Request):
+    """Decoded lines of a streamed upload; overlong lines are yielded as None"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    buffer, overlong = '', False
+    async for chunk in request.stream():
+        *lines, buffer = (buffer + decoder.decode(chunk)).split('\n')
+        for line in lines:
+            yield None if overlong else line
+            overlong = False
+        if len(buffer) > GUEST_IMPORT_MAX_LINE:
+            buffer, overlong = '', True
+    buffer += decoder.decode(b'', final=True)
+    if overlong or buffer:
+        yield None if overlong else buffer
+
+async def iter_csv_guest_rows(lines):
+    """(row number, fields, error) per CSV record; quoted fields may span lines"""
+    columns, record, row_number = None, '', 0
+    async for line in lines:
+        if line is None:
+            row_number += 1
+            yield row_number, None, "Row is too long"
+            record = ''
+            continue
+        record += line + '\n'
+        if record.count('"') % 2:
+            if len(record) <= GUEST_IMPORT_MAX_LINE:
+                continue  # inside a quoted field
+            row_number += 1
+            yield row_number, None, "Row is too long"
+            record = ''
+            continue
+        values = next(csv.reader([record]), [])
+        record = ''
+        if columns is None:
+            columns = [GUEST_CSV_COLUMNS.get(value.strip().lower().replace(' ', '_')) for value in values]
+            if "name" not in columns:
+                raise HTTPException(status_code=400, detail="CSV header must include a name column")
+            continue
+        row_number += 1
+        if not any(value.strip() for value in values):
+            yield row_number, None, None
+            continue
+        yield row_number, {
+            column: value.strip()
+            for column, value in zip(columns, values) if column and value.strip()
+        }, None
+
+async def iter_ndjson_guest_rows(lines):
+    """(row number, fields, error) per NDJSON line"""
+    row_number = 0
+    async for line in lines:
+        row_number += 1
+        if line is None:
+            yield row_number, None, "Row is too long"
+        elif not line.strip():
+            yield row_number, None, None
+        else:
+            try:
+                fields = json.loads(line)
+            except ValueError:
+                yield row_number, None, "Invalid JSON"
+                continue
+            if isinstance(fields, dict):
+                yield row_number, fields, None
+            else:
+                yield row_number, None, "Expected a JSON object"
+
+async def save_guest_batch(url_slug: str, guests: List[Guest]) -> int:
+    """Render the batch's QR codes across the render pool, then insert it"""
+    from rendering import qr_code_data_urls
+    
+    links = [frontend_link(url_slug, guest.token) for guest in guests]
+    size = math.ceil(len(links) / EXPORT_WORKERS)
+    with tracer.span('qr.batch', count=len(links)):
+        parts = await asyncio.gather(*(
+            run_in_render_pool(qr_code_data_urls, links[start:start + size])
+            for start in range(0, len(links), size)
+        ))
+    for guest, qr_code in zip(guests, (qr_code for part in parts for qr_code in part)):
+        guest.qr_code = qr_code
+    await db_insert_many('guests', [guest.dict() for guest in guests])
+    return len(guests)
+
+@api_router.post("/invitations/{invitation_id}/guests/import", dependencies=[rate_limit('guest_import')])
+async def import_guests(
+    invitation_id: str,
+    request: Request,
+    format: Optional[str] = None,
+    user: UserRecord = Depends(get_user_from_session)
+):
+    """Import a CSV or NDJSON guest list, streamed row by row"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "ndjson" in content_type or "jsonl" in content_type else "csv"
+    if format not in GUEST_IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(GUEST_IMPORT_FORMATS)}")
+    
+    invitation = await db_find_one('invitations', {
+        "id": invitation_id,
+        "user_id": user.id
+    }, projection={"_id": 0, "url_slug": 1})
+    if not invitation:
+        raise HTTPException(status_code=404, detail="Invitation not found")
+    
+    started = time.perf_counter()
+    capacity = GUEST_LIMIT - await db_count_documents('guests', {"invitation_id": invitation_id})
+    lines = iter_upload_lines(request)
+    rows = iter_ndjson_guest_rows(lines) if format == "ndjson" else iter_csv_guest_rows(lines)
+    imported, accepted, skipped, errors = 0, 0, 0, []
+    batch, saving = [], None
+    
+    def reject(row_number, error):
+        nonlocal skipped
+        skipped += 1
+        if len(errors) < GUEST_IMPORT_ERRORS_SHOWN:
+            errors.append({"row": row_number, "error": error})
+    
+    try:
+        async for row_number, fields, error in rows:
+            if error:
+                reject(row_number, error)
+                continue
+            if fields is None:
+                continue  # blank line
+            if accepted >= capacity:
+                reject(row_number, f"Guest limit of {GUEST_LIMIT} reached")
+                break
+            try:
+                row = GuestImportRow(**fields)
+            except ValidationError as e:
+                error = e.errors()[0]
+                reject(row_number, f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}")
+                continue
+            batch.append(Guest(
+                invitation_id=invitation_id,
+                user_id=user.id,
+                token=generate_guest_token(),
+                **row.dict()
+            ))
+            accepted += 1
+            if len(batch) >= GUEST_IMPORT_CHUNK:
+                # Keep reading the upload while this chunk renders and saves
+                if saving:
+                    imported += await saving
+                saving = asyncio.ensure_future(save_guest_batch(invitation["url_slug"], batch))
+                batch = []
+        if saving:
+            imported += await saving
+            saving = None
+        if batch:
+            imported += await save_guest_batch(invitation["url_slug"], batch)
+    finally:
+        if saving and not saving.done():
+            saving.cancel()
+    
+    logger.info("Imported %d guests into invitation %s (%d skipped)", imported, invitation_id, skipped)
+    return {
+        "imported": imported,
+        "skipped": skipped,
+        "errors": errors,
+        "took_ms": round((time.perf_counter() - started) * 1000)
+    }
 
-@api_router.get("/invitations/{invitation_id}")
-async def get_invitation(
+@api_router.get("/invitations/{invitation_id}/guests")
+async def get_invitation_guests(
     invitation_id: str,
-    user: User = Depends(get_user_from_session)
+    include_qr: bool = False,
+    user: UserRecord = Depends(get_user_from_session)
 ):
-    """Get specific invitation"""
+    """List an invitation's guests with their personal links"""
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
     invitation = await db_find_one('invitations', {
         "id": invitation_id,
         "user_id": user.id
-    })
+    }, projection={"_id": 0, "url_slug": 1})
     if not invitation:
         raise HTTPException(status_code=404, detail="Invitation not found")
     
-    return Invitation(**invitation)
+    guests = await db_find(
+        'guests', {"invitation_id": invitation_id},
+        projection={"_id": 0} if include_qr else {"_id": 0, "qr_code": 0},
+        sort=[("created_at", 1)], limit=GUEST_LIMIT
+    )
+    return [
+        {**Guest(**guest).dict(), "link": frontend_link(invitation["url_slug"], guest["token"])}
+        for guest in guests
+    ]
+
+# Account data export: NDJSON streamed straight off storage cursors, one
+# collection after another in `id` order, so memory stays bounded by a batch
+# however large the account is. Every document line carries a cursor; passing
+# the last one received as ?cursor= resumes right after that document.
+#
+# The rate limit counts exports, not requests: cursors carry the id of the export
+# they belong to, and resuming an export the cache still knows for this user is free.
+ACCOUNT_EXPORT_COLLECTIONS = (
+    ("invitations", "user_id"),
+    ("templates", "owner_id"),
+    ("payment_transactions", "user_id"),
+)
+ACCOUNT_EXPORT_BATCH = int(os.environ.get('ACCOUNT_EXPORT_BATCH', '200'))
+ACCOUNT_EXPORT_RESUME_TTL = float(os.environ.get('ACCOUNT_EXPORT_RESUME_TTL', '3600'))
+
+def encode_export_cursor(position: int, after: str, export_id: str) -> str:
+    return _b64encode(json.dumps([position, after, export_id], separators=(',', ':')).encode())
+
+def decode_export_cursor(cursor: str) -> tuple:
+    """(position, after, export id); cursors issued before export ids have none"""
+    try:
+        position, after, *rest = json.loads(_b64decode(cursor))
+        export_id = rest[0] if rest else None
+        if not (isinstance(position, int) and 0 <= position < len(ACCOUNT_EXPORT_COLLECTIONS) and isinstance(after, str)
+                and (export_id is None or isinstance(export_id, str)) and len(rest) <= 1):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid export cursor")
+    return position, after, export_id
+
+def account_export_key(export_id: str) -> str:
+    return f"account_export:{export_id}"
+
+async def start_account_export(user: UserRecord, export_id: Optional[str]) -> str:
+    """Rate-limit a new export, or let a known one resume; returns the export id"""
+    key = account_export_key(export_id) if export_id else None
+    if key and await cache.get(key) == user.id:
+        return export_id
+    if RATE_LIMIT_ENABLED:
+        await check_rate_limit(RATE_LIMIT_POLICIES['account_export'], f"user:{user.id}")
+    export_id = secrets.token_urlsafe(9)
+    await cache.set(account_export_key(export_id), user.id, ACCOUNT_EXPORT_RESUME_TTL)
+    return export_id
+
+def _export_json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+async def account_export_chunks(user_id: str, export_id: str, position: int = 0, after: str = None):
+    """NDJSON text, one chunk per storage batch, ending with an "end" line"""
+    counts = {}
+    for index in range(position, len(ACCOUNT_EXPORT_COLLECTIONS)):
+        collection, owner_field = ACCOUNT_EXPORT_COLLECTIONS[index]
+        lines, count = [], 0
+        async for document in db_iterate(collection, {owner_field: user_id}, {"_id": 0},
+                                         after if index == position else None, ACCOUNT_EXPORT_BATCH):
+            lines.append(json.dumps({
+                "type": "document",
+                "collection": collection,
+                "cursor": encode_export_cursor(index, document["id"], export_id),
+                "data": document
+            }, default=_export_json_default, separators=(',', ':')))
+            count += 1
+            if len(lines) >= ACCOUNT_EXPORT_BATCH:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+        counts[collection] = count
+    yield json.dumps({"type": "end", "counts": counts}) + '\n'
+
+@api_router.get("/export")
+async def export_account(
+    cursor: Optional[str] = None,
+    gzip: bool = False,
+    user: UserRecord = Depends(get_user_from_session)
+):
+    """Stream the user's invitations, templates and payments as NDJSON"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    from fastapi.responses import StreamingResponse
+    
+    position, after, export_id = decode_export_cursor(cursor) if cursor else (0, None, None)
+    export_id = await start_account_export(user, export_id)
+    chunks = account_export_chunks(user.id, export_id, position, after)
+    filename = "account-export.ndjson"
+    
+    if gzip:
+        # Flushed per chunk: a cut-off download still decompresses up to its last
+        # complete line, whose cursor resumes the export
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        
+        def compress(chunk: str) -> bytes:
+            return compressor.compress(chunk.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        
+        async def gzip_chunks():
+            async for chunk in chunks:
+                yield await asyncio.to_thread(compress, chunk)
+            yield compressor.flush()
+        
+        return StreamingResponse(
+            gzip_chunks(),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.gz"', "Cache-Control": "no-store"}
+        )
+    
+    return StreamingResponse(
+        chunks,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"}
+    )
 
 # Public Invitation Display
-@api_router.get("/public/invitations/{url_slug}")
-async def get_public_invitation(url_slug: str):
-    """Get public invitation by URL slug"""
-    invitation = await db_find_one('invitations', {
-        "url_slug": url_slug,
-        "is_published": True
+public_invitation_flight = SingleFlight()
+
+async def load_public_invitation(url_slug: str):
+    """Load and build a published invitation with its template"""
+    invitation = await get_published_invitation_doc(url_slug)
+    if not invitation:
+        return None, None
+    
+    template = await get_template_doc(invitation["template_id"])
+    with tracer.span('model.build', model='InvitationRecord,TemplateRecord'):
+        if not template:
+            return InvitationRecord.from_doc(invitation), None
+        return InvitationRecord.from_doc(invitation), TemplateRecord.from_doc(template)
+
+async def record_guest_open(guest_token: str, invitation_id: str):
+    # Only the first open writes: the filter stops matching once it is set
+    await db_update_one('guests', {"token": guest_token, "invitation_id": invitation_id, "opened_at": None}, {
+        "$set": {"opened_at": datetime.utcnow()}
     })
+
+@api_router.get("/public/invitations/{url_slug}")
+async def get_public_invitation(url_slug: str, g: Optional[str] = None):
+    """Get public invitation by URL slug (g: a guest's personal token)"""
+    # Guests opening a freshly shared link all share one load and render
+    invitation, template = await public_invitation_flight.do(
+        url_slug, lambda: load_public_invitation(url_slug)
+    )
     if not invitation:
         raise HTTPException(status_code=404, detail="Invitation not found")
-    
-    # Get template
-    template = await db_find_one('templates', {"id": invitation["template_id"]})
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     
-    return {
-        "invitation": Invitation(**invitation),
-        "template": Template(**template)
-    }
+    view_counter.record(invitation.id)
+    schedule_invitation_snapshot(invitation, template)
+    if g:
+        await record_guest_open(g, invitation.id)
+    return RecordResponse({
+        "invitation": invitation,
+        "template": template
+    })
+
+@api_router.get("/public/invitations/{url_slug}/page")
+async def get_public_invitation_page(url_slug: str, g: Optional[str] = None):
+    """The invitation rendered as a standalone HTML page"""
+    invitation, template = await public_invitation_flight.do(
+        url_slug, lambda: load_public_invitation(url_slug)
+    )
+    if not invitation or not template:
+        raise HTTPException(status_code=404, detail="Invitation not found")
+    
+    view_counter.record(invitation.id)
+    schedule_invitation_snapshot(invitation, template)
+    if g:
+        await record_guest_open(g, invitation.id)
+    return HTMLResponse(render_invitation_page(invitation.to_doc(), template.to_doc()))
+
+@api_router.post("/public/invitations/{url_slug}/rsvp", dependencies=[rate_limit('rsvp')])
+async def submit_rsvp(url_slug: str, rsvp_request: RSVPRequest, g: Optional[str] = None):
+    """Record a guest's RSVP and notify the couple's open dashboards"""
+    invitation = await get_published_invitation_doc(url_slug)
+    if not invitation:
+        raise HTTPException(status_code=404, detail="Invitation not found")
+    
+    guest = None
+    if g:
+        guest = await db_find_one('guests', {"token": g, "invitation_id": invitation["id"]},
+                                  coalesce=False, projection={"_id": 0, "id": 1})
+        if not guest:
+            raise HTTPException(status_code=404, detail="Guest not found")
+    
+    rsvp = RSVP(invitation_id=invitation["id"], guest_id=guest["id"] if guest else None, **rsvp_request.dict())
+    await db_insert_one('rsvps', rsvp.dict())
+    if guest:
+        await db_update_one('guests', {"id": guest["id"]}, {"$set": {"rsvp_id": rsvp.id}})
+    delta = {"rsvp_attending": 1, "guests": rsvp.guests} if rsvp.attending else {"rsvp_declined": 1}
+    await db_update_one('invitations', {"id": invitation["id"]}, {
+        "$inc": {f"stats.{name}": value for name, value in delta.items()}
+    })
+    await invitation_events.publish({
+        "type": "rsvp",
+        "invitation_id": invitation["id"],
+        "delta": delta,
+        "rsvp": {
+            "name": rsvp.name,
+            "attending": rsvp.attending,
+            "guests": rsvp.guests,
+            "message": rsvp.message,
+            "created_at": rsvp.created_at.isoformat()
+        }
+    })
+    return {"message": "RSVP received", "id": rsvp.id}
 
 # Stripe Payment Integration
 stripe_api_key = os.getenv("STRIPE_SECRET_KEY")
-if stripe_api_key:
-    stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url="")
+_stripe_checkout = None
+
+def get_stripe_checkout():
+    """Build the Stripe client on first use"""
+    global _stripe_checkout
+    if _stripe_checkout is None:
+        if not stripe_api_key:
+            raise HTTPException(status_code=503, detail="Payments are not configured")
+        from emergentintegrations.payments.stripe.checkout import StripeCheckout
+        
+        _stripe_checkout = StripeCheckout(api_key=stripe_api_key, webhook_url="")
+    return _stripe_checkout
 
-@api_router.post("/payments/checkout/session")
+@api_router.post("/payments/checkout/session", dependencies=[rate_limit('checkout')])
 async def create_checkout_session(request: Request):
     """Create Stripe checkout session for premium subscription"""
+    stripe_checkout = get_stripe_checkout()
     try:
         body = await request.json()
         host_url = body.get("host_url", "http://localhost:3000")
@@ -519,6 +2988,8 @@ async def create_checkout_session(request: Request):
             "source": "web_checkout"
         }
         
+        from emergentintegrations.payments.stripe.checkout import CheckoutSessionRequest
+        
         checkout_request = CheckoutSessionRequest(
             amount=amount,
             currency=currency,
@@ -527,7 +2998,8 @@ async def create_checkout_session(request: Request):
             metadata=metadata
         )
         
-        session = await stripe_checkout.create_checkout_session(checkout_request)
+        with tracer.span('http.client', service='stripe', op='create_checkout_session'):
+            session = await stripe_checkout.create_checkout_session(checkout_request)
         
         # Create payment transaction record
         transaction = PaymentTransaction(
@@ -538,7 +3010,7 @@ async def create_checkout_session(request: Request):
             metadata=metadata
         )
         
-        await db_insert_one('payment_transactions', transaction.dict())
+        await db_insert_one('payment_transactions', transaction.dict(), profile='payments')
         
         return {
             "url": session.url,
@@ -551,8 +3023,10 @@ async def create_checkout_session(request: Request):
 @api_router.get("/payments/checkout/status/{session_id}")
 async def get_checkout_status(session_id: str):
     """Get payment status for a checkout session"""
+    stripe_checkout = get_stripe_checkout()
     try:
-        status_response = await stripe_checkout.get_checkout_status(session_id)
+        with tracer.span('http.client', service='stripe', op='get_checkout_status'):
+            status_response = await stripe_checkout.get_checkout_status(session_id)
         
         # Update transaction record
         await db_update_one(
@@ -561,17 +3035,19 @@ async def get_checkout_status(session_id: str):
             {"$set": {
                 "payment_status": status_response.payment_status,
                 "updated_at": datetime.utcnow().isoformat()
-            }}
+            }},
+            profile='payments'
         )
         
         # If payment is successful, upgrade user to premium
         if status_response.payment_status == "paid":
-            transaction = await db_find_one('payment_transactions', {"session_id": session_id})
+            transaction = await db_find_one('payment_transactions', {"session_id": session_id}, coalesce=False, profile='payments')
             if transaction and transaction.get("user_id"):
                 await db_update_one(
                     'users',
                     {"id": transaction["user_id"]},
-                    {"$set": {"premium": True}}
+                    {"$set": {"premium": True}},
+                    profile='payments'
                 )
         
         return status_response
@@ -582,12 +3058,14 @@ async def get_checkout_status(session_id: str):
 @api_router.post("/webhook/stripe")
 async def stripe_webhook(request: Request):
     """Handle Stripe webhooks"""
+    stripe_checkout = get_stripe_checkout()
     try:
         body = await request.body()
-        webhook_response = await stripe_checkout.handle_webhook(
-            body, 
-            request.headers.get("Stripe-Signature")
-        )
+        with tracer.span('http.client', service='stripe', op='handle_webhook'):
+            webhook_response = await stripe_checkout.handle_webhook(
+                body, 
+                request.headers.get("Stripe-Signature")
+            )
         
         if webhook_response.event_type == "checkout.session.completed":
             # Update payment transaction
@@ -597,17 +3075,19 @@ async def stripe_webhook(request: Request):
                 {"$set": {
                     "payment_status": webhook_response.payment_status,
                     "updated_at": datetime.utcnow().isoformat()
-                }}
+                }},
+                profile='payments'
             )
             
             # Upgrade user to premium if payment successful
             if webhook_response.payment_status == "paid":
-                transaction = await db_find_one('payment_transactions', {"session_id": webhook_response.session_id})
+                transaction = await db_find_one('payment_transactions', {"session_id": webhook_response.session_id}, coalesce=False, profile='payments')
                 if transaction and transaction.get("user_id"):
                     await db_update_one(
                         'users',
                         {"id": transaction["user_id"]},
-                        {"$set": {"premium": True}}
+                        {"$set": {"premium": True}},
+                        profile='payments'
                     )
         
         return {"status": "success"}
@@ -615,451 +3095,984 @@ async def stripe_webhook(request: Request):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# Initialize default templates
-@api_router.post("/init-templates")
-async def init_default_templates():
-    """Initialize default wedding templates"""
-    # Check if templates already exist
-    existing = await db_count_documents('templates')
-    if existing > 0:
-        return {"message": "Templates already initialized"}
-    
-    default_templates = [
-        {
-            "id": "classic-elegance",
-            "name": "Classic Elegance",
-            "description": "Timeless and sophisticated wedding invitation with gold accents",
-            "theme": "classic",
-            "preview_url": "https://images.unsplash.com/photo-1632610992723-82d7c212f6d7?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDF8MHwxfHNlYXJjaHwxfHx3ZWRkaW5nJTIwaW52aXRhdGlvbnxlbnwwfHx8fDE3NTM2MTczODZ8MA&ixlib=rb-4.1.0&q=85",
-            "html_content": """
-            <div class="invitation-container classic-theme">
-                <div class="hero-section">
-                    <div class="ornament-top"></div>
-                    <h1 class="couple-names">{{bride_name}} & {{groom_name}}</h1>
-                    <div class="separator"></div>
-                    <h2 class="wedding-date">{{wedding_date}}</h2>
-                    <p class="wedding-time">{{wedding_time}}</p>
-                    <div class="venue-section">
-                        <h3 class="venue-name">{{venue_name}}</h3>
-                        <p class="venue-address">{{venue_address}}</p>
-                    </div>
-                    <div class="qr-code">{{qr_code}}</div>
-                    <div class="ornament-bottom"></div>
+# Template catalog seeding. The manifest hash covers every seeded field, so editing
+# a default template (or bumping the version) re-seeds it on the next startup.
+TEMPLATE_SEED_VERSION = 1
+
+DEFAULT_TEMPLATES = [
+    {
+        "id": "classic-elegance",
+        "name": "Classic Elegance",
+        "description": "Timeless and sophisticated wedding invitation with gold accents",
+        "theme": "classic",
+        "preview_url": template_preview_path("classic-elegance"),
+        "html_content": """
+        <div class="invitation-container classic-theme">
+            <div class="hero-section">
+                <div class="ornament-top"></div>
+                <h1 class="couple-names">{{bride_name}} & {{groom_name}}</h1>
+                <div class="separator"></div>
+                <h2 class="wedding-date">{{wedding_date}}</h2>
+                <p class="wedding-time">{{wedding_time}}</p>
+                <div class="venue-section">
+                    <h3 class="venue-name">{{venue_name}}</h3>
+                    <p class="venue-address">{{venue_address}}</p>
                 </div>
+                <div class="qr-code">{{qr_code}}</div>
+                <div class="ornament-bottom"></div>
             </div>
-            """,
-            "css_content": """
-            .classic-theme {
-                font-family: 'Playfair Display', serif;
-                background: linear-gradient(135deg, #f8f6f0 0%, #ffffff 100%);
-                color: #1a1a1a;
-                text-align: center;
-                padding: 4rem 2rem;
-                min-height: 100vh;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-            }
-            .hero-section {
-                max-width: 500px;
-                width: 100%;
-                background: rgba(255, 255, 255, 0.9);
-                border-radius: 20px;
-                padding: 3rem;
-                box-shadow: 0 20px 60px rgba(0, 0, 0, 0.1);
-            }
-            .ornament-top, .ornament-bottom {
-                width: 60px;
-                height: 60px;
-                background: url('data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="%23d4af37"><path d="M12 2l3.09 6.26L22 9.27l-5 4.87 1.18 6.88L12 17.77l-6.18 3.25L7 14.14 2 9.27l6.91-1.01L12 2z"/></svg>') center/contain no-repeat;
-                margin: 0 auto 2rem;
-            }
-            .ornament-bottom {
-                margin: 2rem auto 0;
-            }
-            .couple-names {
-                font-size: 2.5rem;
-                font-weight: 300;
-                letter-spacing: 3px;
-                margin-bottom: 1.5rem;
-                color: #1a1a1a;
-            }
-            .separator {
-                width: 80px;
-                height: 2px;
-                background: #d4af37;
-                margin: 1.5rem auto;
-            }
-            .wedding-date {
-                font-size: 1.6rem;
-                font-weight: 400;
-                letter-spacing: 2px;
-                margin-bottom: 0.5rem;
-                color: #333;
-            }
-            .wedding-time {
-                font-size: 1.2rem;
-                font-weight: 300;
-                color: #666;
-                margin-bottom: 2rem;
-            }
-            .venue-section {
-                margin-bottom: 2rem;
-            }
-            .venue-name {
-                font-size: 1.4rem;
-                font-weight: 500;
-                color: #1a1a1a;
-                margin-bottom: 0.5rem;
-            }
-            .venue-address {
-                font-size: 1rem;
-                color: #666;
-                line-height: 1.4;
-            }
-            .qr-code img {
-                width: 120px;
-                height: 120px;
-                border-radius: 10px;
-                margin-top: 1rem;
-            }
-            """,
-            "is_premium": False,
-            "owner_id": None,
-            "created_at": datetime.utcnow()
-        },
-        {
-            "id": "modern-minimalist",
-            "name": "Modern Minimalist",
-            "description": "Clean and contemporary design with bold typography",
-            "theme": "modern",
-            "preview_url": "https://images.unsplash.com/photo-1721176487015-5408ae0e9bc2?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDQ2NDF8MHwxfHNlYXJjaHwyfHx3ZWRkaW5nJTIwaW52aXRhdGlvbnxlbnwwfHx8fDE3NTM2MTczODZ8MA&ixlib=rb-4.1.0&q=85",
-            "html_content": """
-            <div class="invitation-container modern-theme">
-                <div class="hero-section">
-                    <div class="geometric-pattern"></div>
-                    <h1 class="couple-names">{{bride_name}} & {{groom_name}}</h1>
-                    <div class="separator"></div>
-                    <h2 class="wedding-date">{{wedding_date}}</h2>
-                    <p class="wedding-time">{{wedding_time}}</p>
-                    <div class="venue-section">
-                        <h3 class="venue-name">{{venue_name}}</h3>
-                        <p class="venue-address">{{venue_address}}</p>
-                    </div>
-                    <div class="qr-code">{{qr_code}}</div>
+        </div>
+        """,
+        "css_content": """
+        .classic-theme {
+            font-family: 'Playfair Display', serif;
+            background: linear-gradient(135deg, #f8f6f0 0%, #ffffff 100%);
+            color: #1a1a1a;
+            text-align: center;
+            padding: 4rem 2rem;
+            min-height: 100vh;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+        }
+        .hero-section {
+            max-width: 500px;
+            width: 100%;
+            background: rgba(255, 255, 255, 0.9);
+            border-radius: 20px;
+            padding: 3rem;
+            box-shadow: 0 20px 60px rgba(0, 0, 0, 0.1);
+        }
+        .ornament-top, .ornament-bottom {
+            width: 60px;
+            height: 60px;
+            background: url('data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" fill="%23d4af37"><path d="M12 2l3.09 6.26L22 9.27l-5 4.87 1.18 6.88L12 17.77l-6.18 3.25L7 14.14 2 9.27l6.91-1.01L12 2z"/></svg>') center/contain no-repeat;
+            margin: 0 auto 2rem;
+        }
+        .ornament-bottom {
+            margin: 2rem auto 0;
+        }
+        .couple-names {
+            font-size: 2.5rem;
+            font-weight: 300;
+            letter-spacing: 3px;
+            margin-bottom: 1.5rem;
+            color: #1a1a1a;
+        }
+        .separator {
+            width: 80px;
+            height: 2px;
+            background: #d4af37;
+            margin: 1.5rem auto;
+        }
+        .wedding-date {
+            font-size: 1.6rem;
+            font-weight: 400;
+            letter-spacing: 2px;
+            margin-bottom: 0.5rem;
+            color: #333;
+        }
+        .wedding-time {
+            font-size: 1.2rem;
+            font-weight: 300;
+            color: #666;
+            margin-bottom: 2rem;
+        }
+        .venue-section {
+            margin-bottom: 2rem;
+        }
+        .venue-name {
+            font-size: 1.4rem;
+            font-weight: 500;
+            color: #1a1a1a;
+            margin-bottom: 0.5rem;
+        }
+        .venue-address {
+            font-size: 1rem;
+            color: #666;
+            line-height: 1.4;
+        }
+        .qr-code img {
+            width: 120px;
+            height: 120px;
+            border-radius: 10px;
+            margin-top: 1rem;
+        }
+        """,
+        "is_premium": False,
+        "owner_id": None
+    },
+    {
+        "id": "modern-minimalist",
+        "name": "Modern Minimalist",
+        "description": "Clean and contemporary design with bold typography",
+        "theme": "modern",
+        "preview_url": template_preview_path("modern-minimalist"),
+        "html_content": """
+        <div class="invitation-container modern-theme">
+            <div class="hero-section">
+                <div class="geometric-pattern"></div>
+                <h1 class="couple-names">{{bride_name}} & {{groom_name}}</h1>
+                <div class="separator"></div>
+                <h2 class="wedding-date">{{wedding_date}}</h2>
+                <p class="wedding-time">{{wedding_time}}</p>
+                <div class="venue-section">
+                    <h3 class="venue-name">{{venue_name}}</h3>
+                    <p class="venue-address">{{venue_address}}</p>
                 </div>
+                <div class="qr-code">{{qr_code}}</div>
             </div>
-            """,
-            "css_content": """
-            .modern-theme {
-                font-family: 'Montserrat', sans-serif;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                color: #2c2c2c;
-                text-align: center;
-                padding: 4rem 2rem;
-                min-height: 100vh;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-            }
-            .hero-section {
-                max-width: 500px;
-                width: 100%;
-                background: rgba(255, 255, 255, 0.95);
-                border-radius: 25px;
-                padding: 3rem;
-                box-shadow: 0 25px 80px rgba(0, 0, 0, 0.2);
-                position: relative;
-                overflow: hidden;
-            }
-            .geometric-pattern {
-                position: absolute;
-                top: -50px;
-                right: -50px;
-                width: 100px;
-                height: 100px;
-                background: linear-gradient(45deg, #ff6b6b, #ffa726);
-                transform: rotate(45deg);
-                opacity: 0.1;
-            }
-            .couple-names {
-                font-size: 2.8rem;
-                font-weight: 600;
-                letter-spacing: -1px;
-                margin-bottom: 1.5rem;
-                color: #2c2c2c;
-            }
-            .separator {
-                width: 60px;
-                height: 3px;
-                background: #ff6b6b;
-                margin: 1.5rem auto;
-                border-radius: 2px;
-            }
-            .wedding-date {
-                font-size: 1.4rem;
-                font-weight: 500;
-                letter-spacing: 1px;
-                margin-bottom: 0.5rem;
-                color: #2c2c2c;
-            }
-            .wedding-time {
-                font-size: 1.1rem;
-                font-weight: 400;
-                color: #666;
-                margin-bottom: 2rem;
-            }
-            .venue-section {
-                margin-bottom: 2rem;
-            }
-            .venue-name {
-                font-size: 1.3rem;
-                font-weight: 600;
-                color: #2c2c2c;
-                margin-bottom: 0.5rem;
-            }
-            .venue-address {
-                font-size: 1rem;
-                color: #666;
-                line-height: 1.4;
-            }
-            .qr-code img {
-                width: 120px;
-                height: 120px;
-                border-radius: 15px;
-                border: 3px solid #ff6b6b;
-                margin-top: 1rem;
-            }
-            """,
-            "is_premium": False,
-            "owner_id": None,
-            "created_at": datetime.utcnow()
-        },
-        {
-            "id": "boho-chic",
-            "name": "Boho Chic",
-            "description": "Bohemian style with earthy tones and flowing typography",
-            "theme": "boho",
-            "preview_url": "https://images.pexels.com/photos/262023/pexels-photo-262023.jpeg",
-            "html_content": """
-            <div class="invitation-container boho-theme">
-                <div class="hero-section">
-                    <div class="floral-border"></div>
-                    <h1 class="couple-names">{{bride_name}} & {{groom_name}}</h1>
-                    <div class="separator"></div>
-                    <h2 class="wedding-date">{{wedding_date}}</h2>
-                    <p class="wedding-time">{{wedding_time}}</p>
-                    <div class="venue-section">
-                        <h3 class="venue-name">{{venue_name}}</h3>
-                        <p class="venue-address">{{venue_address}}</p>
-                    </div>
-                    <div class="qr-code">{{qr_code}}</div>
+        </div>
+        """,
+        "css_content": """
+        .modern-theme {
+            font-family: 'Montserrat', sans-serif;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            color: #2c2c2c;
+            text-align: center;
+            padding: 4rem 2rem;
+            min-height: 100vh;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+        }
+        .hero-section {
+            max-width: 500px;
+            width: 100%;
+            background: rgba(255, 255, 255, 0.95);
+            border-radius: 25px;
+            padding: 3rem;
+            box-shadow: 0 25px 80px rgba(0, 0, 0, 0.2);
+            position: relative;
+            overflow: hidden;
+        }
+        .geometric-pattern {
+            position: absolute;
+            top: -50px;
+            right: -50px;
+            width: 100px;
+            height: 100px;
+            background: linear-gradient(45deg, #ff6b6b, #ffa726);
+            transform: rotate(45deg);
+            opacity: 0.1;
+        }
+        .couple-names {
+            font-size: 2.8rem;
+            font-weight: 600;
+            letter-spacing: -1px;
+            margin-bottom: 1.5rem;
+            color: #2c2c2c;
+        }
+        .separator {
+            width: 60px;
+            height: 3px;
+            background: #ff6b6b;
+            margin: 1.5rem auto;
+            border-radius: 2px;
+        }
+        .wedding-date {
+            font-size: 1.4rem;
+            font-weight: 500;
+            letter-spacing: 1px;
+            margin-bottom: 0.5rem;
+            color: #2c2c2c;
+        }
+        .wedding-time {
+            font-size: 1.1rem;
+            font-weight: 400;
+            color: #666;
+            margin-bottom: 2rem;
+        }
+        .venue-section {
+            margin-bottom: 2rem;
+        }
+        .venue-name {
+            font-size: 1.3rem;
+            font-weight: 600;
+            color: #2c2c2c;
+            margin-bottom: 0.5rem;
+        }
+        .venue-address {
+            font-size: 1rem;
+            color: #666;
+            line-height: 1.4;
+        }
+        .qr-code img {
+            width: 120px;
+            height: 120px;
+            border-radius: 15px;
+            border: 3px solid #ff6b6b;
+            margin-top: 1rem;
+        }
+        """,
+        "is_premium": False,
+        "owner_id": None
+    },
+    {
+        "id": "boho-chic",
+        "name": "Boho Chic",
+        "description": "Bohemian style with earthy tones and flowing typography",
+        "theme": "boho",
+        "preview_url": template_preview_path("boho-chic"),
+        "html_content": """
+        <div class="invitation-container boho-theme">
+            <div class="hero-section">
+                <div class="floral-border"></div>
+                <h1 class="couple-names">{{bride_name}} & {{groom_name}}</h1>
+                <div class="separator"></div>
+                <h2 class="wedding-date">{{wedding_date}}</h2>
+                <p class="wedding-time">{{wedding_time}}</p>
+                <div class="venue-section">
+                    <h3 class="venue-name">{{venue_name}}</h3>
+                    <p class="venue-address">{{venue_address}}</p>
                 </div>
+                <div class="qr-code">{{qr_code}}</div>
             </div>
-            """,
-            "css_content": """
-            .boho-theme {
-                font-family: 'Dancing Script', cursive;
-                background: linear-gradient(135deg, #d7ccc8 0%, #f4f1e8 100%);
-                color: #5d4037;
-                text-align: center;
-                padding: 4rem 2rem;
-                min-height: 100vh;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-            }
-            .hero-section {
-                max-width: 500px;
-                width: 100%;
-                background: rgba(255, 255, 255, 0.9);
-                border-radius: 30px;
-                padding: 3rem;
-                box-shadow: 0 20px 60px rgba(139, 69, 19, 0.1);
-                position: relative;
-                border: 2px solid #cd853f;
-            }
-            .floral-border {
-                position: absolute;
-                top: -10px;
-                left: 50%;
-                transform: translateX(-50%);
-                width: 80px;
-                height: 20px;
-                background: url('data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 20" fill="%23cd853f"><circle cx="20" cy="10" r="3"/><circle cx="50" cy="10" r="5"/><circle cx="80" cy="10" r="3"/></svg>') center/contain no-repeat;
-            }
-            .couple-names {
-                font-size: 3.2rem;
-                font-weight: 600;
-                letter-spacing: 2px;
-                margin-bottom: 1.5rem;
-                color: #8b4513;
-            }
-            .separator {
-                width: 100px;
-                height: 2px;
-                background: #cd853f;
-                margin: 1.5rem auto;
-                border-radius: 1px;
-            }
-            .wedding-date {
-                font-family: 'Lato', sans-serif;
-                font-size: 1.4rem;
-                font-weight: 400;
-                letter-spacing: 1px;
-                margin-bottom: 0.5rem;
-                color: #5d4037;
-            }
-            .wedding-time {
-                font-family: 'Lato', sans-serif;
-                font-size: 1.1rem;
-                font-weight: 300;
-                color: #8d6e63;
-                margin-bottom: 2rem;
-            }
-            .venue-section {
-                margin-bottom: 2rem;
-            }
-            .venue-name {
-                font-family: 'Lato', sans-serif;
-                font-size: 1.3rem;
-                font-weight: 500;
-                color: #5d4037;
-                margin-bottom: 0.5rem;
-            }
-            .venue-address {
-                font-family: 'Lato', sans-serif;
-                font-size: 1rem;
-                color: #8d6e63;
-                line-height: 1.4;
-            }
-            .qr-code img {
-                width: 120px;
-                height: 120px;
-                border-radius: 20px;
-                border: 2px solid #cd853f;
-                margin-top: 1rem;
-            }
-            """,
-            "is_premium": False,
-            "owner_id": None,
-            "created_at": datetime.utcnow()
-        },
-        {
-            "id": "floral-romance",
-            "name": "Floral Romance",
-            "description": "Romantic floral design with soft pink accents",
-            "theme": "floral",
-            "preview_url": "https://images.pexels.com/photos/2395249/pexels-photo-2395249.jpeg",
-            "html_content": """
-            <div class="invitation-container floral-theme">
-                <div class="hero-section">
-                    <div class="floral-header"></div>
-                    <h1 class="couple-names">{{bride_name}} & {{groom_name}}</h1>
-                    <div class="separator"></div>
-                    <h2 class="wedding-date">{{wedding_date}}</h2>
-                    <p class="wedding-time">{{wedding_time}}</p>
-                    <div class="venue-section">
-                        <h3 class="venue-name">{{venue_name}}</h3>
-                        <p class="venue-address">{{venue_address}}</p>
-                    </div>
-                    <div class="qr-code">{{qr_code}}</div>
-                    <div class="floral-footer"></div>
+        </div>
+        """,
+        "css_content": """
+        .boho-theme {
+            font-family: 'Dancing Script', cursive;
+            background: linear-gradient(135deg, #d7ccc8 0%, #f4f1e8 100%);
+            color: #5d4037;
+            text-align: center;
+            padding: 4rem 2rem;
+            min-height: 100vh;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+        }
+        .hero-section {
+            max-width: 500px;
+            width: 100%;
+            background: rgba(255, 255, 255, 0.9);
+            border-radius: 30px;
+            padding: 3rem;
+            box-shadow: 0 20px 60px rgba(139, 69, 19, 0.1);
+            position: relative;
+            border: 2px solid #cd853f;
+        }
+        .floral-border {
+            position: absolute;
+            top: -10px;
+            left: 50%;
+            transform: translateX(-50%);
+            width: 80px;
+            height: 20px;
+            background: url('data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 20" fill="%23cd853f"><circle cx="20" cy="10" r="3"/><circle cx="50" cy="10" r="5"/><circle cx="80" cy="10" r="3"/></svg>') center/contain no-repeat;
+        }
+        .couple-names {
+            font-size: 3.2rem;
+            font-weight: 600;
+            letter-spacing: 2px;
+            margin-bottom: 1.5rem;
+            color: #8b4513;
+        }
+        .separator {
+            width: 100px;
+            height: 2px;
+            background: #cd853f;
+            margin: 1.5rem auto;
+            border-radius: 1px;
+        }
+        .wedding-date {
+            font-family: 'Lato', sans-serif;
+            font-size: 1.4rem;
+            font-weight: 400;
+            letter-spacing: 1px;
+            margin-bottom: 0.5rem;
+            color: #5d4037;
+        }
+        .wedding-time {
+            font-family: 'Lato', sans-serif;
+            font-size: 1.1rem;
+            font-weight: 300;
+            color: #8d6e63;
+            margin-bottom: 2rem;
+        }
+        .venue-section {
+            margin-bottom: 2rem;
+        }
+        .venue-name {
+            font-family: 'Lato', sans-serif;
+            font-size: 1.3rem;
+            font-weight: 500;
+            color: #5d4037;
+            margin-bottom: 0.5rem;
+        }
+        .venue-address {
+            font-family: 'Lato', sans-serif;
+            font-size: 1rem;
+            color: #8d6e63;
+            line-height: 1.4;
+        }
+        .qr-code img {
+            width: 120px;
+            height: 120px;
+            border-radius: 20px;
+            border: 2px solid #cd853f;
+            margin-top: 1rem;
+        }
+        """,
+        "is_premium": False,
+        "owner_id": None
+    },
+    {
+        "id": "floral-romance",
+        "name": "Floral Romance",
+        "description": "Romantic floral design with soft pink accents",
+        "theme": "floral",
+        "preview_url": template_preview_path("floral-romance"),
+        "html_content": """
+        <div class="invitation-container floral-theme">
+            <div class="hero-section">
+                <div class="floral-header"></div>
+                <h1 class="couple-names">{{bride_name}} & {{groom_name}}</h1>
+                <div class="separator"></div>
+                <h2 class="wedding-date">{{wedding_date}}</h2>
+                <p class="wedding-time">{{wedding_time}}</p>
+                <div class="venue-section">
+                    <h3 class="venue-name">{{venue_name}}</h3>
+                    <p class="venue-address">{{venue_address}}</p>
                 </div>
+                <div class="qr-code">{{qr_code}}</div>
+                <div class="floral-footer"></div>
             </div>
-            """,
-            "css_content": """
-            .floral-theme {
-                font-family: 'Playfair Display', serif;
-                background: linear-gradient(135deg, #fce4ec 0%, #ffffff 100%);
-                color: #4a148c;
-                text-align: center;
-                padding: 4rem 2rem;
-                min-height: 100vh;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-            }
-            .hero-section {
-                max-width: 500px;
-                width: 100%;
-                background: rgba(255, 255, 255, 0.95);
-                border-radius: 25px;
-                padding: 3rem;
-                box-shadow: 0 20px 60px rgba(233, 30, 99, 0.1);
-                position: relative;
-                border: 1px solid #f8bbd9;
-            }
-            .floral-header, .floral-footer {
-                width: 120px;
-                height: 30px;
-                background: url('data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 120 30" fill="%23e91e63"><path d="M10 15c0-5 5-10 10-10s10 5 10 10-5 10-10 10-10-5-10-10z M50 10c0-3 3-6 6-6s6 3 6 6-3 6-6 6-6-3-6-6z M90 20c0-4 4-8 8-8s8 4 8 8-4 8-8 8-8-4-8-8z"/></svg>') center/contain no-repeat;
-                margin: 0 auto 2rem;
-            }
-            .floral-footer {
-                margin: 2rem auto 0;
-            }
-            .couple-names {
-                font-size: 2.8rem;
-                font-weight: 400;
-                letter-spacing: 2px;
-                margin-bottom: 1.5rem;
-                color: #4a148c;
-            }
-            .separator {
-                width: 80px;
-                height: 2px;
-                background: #e91e63;
-                margin: 1.5rem auto;
-                border-radius: 1px;
-            }
-            .wedding-date {
-                font-size: 1.5rem;
-                font-weight: 400;
-                letter-spacing: 1px;
-                margin-bottom: 0.5rem;
-                color: #6a1b99;
-            }
-            .wedding-time {
-                font-size: 1.1rem;
-                font-weight: 300;
-                color: #8e24aa;
-                margin-bottom: 2rem;
-            }
-            .venue-section {
-                margin-bottom: 2rem;
-            }
-            .venue-name {
-                font-size: 1.3rem;
-                font-weight: 500;
-                color: #4a148c;
-                margin-bottom: 0.5rem;
-            }
-            .venue-address {
-                font-size: 1rem;
-                color: #8e24aa;
-                line-height: 1.4;
-            }
-            .qr-code img {
-                width: 120px;
-                height: 120px;
-                border-radius: 15px;
-                border: 2px solid #e91e63;
-                margin-top: 1rem;
-            }
-            """,
-            "is_premium": False,
-            "owner_id": None,
-            "created_at": datetime.utcnow()
+        </div>
+        """,
+        "css_content": """
+        .floral-theme {
+            font-family: 'Playfair Display', serif;
+            background: linear-gradient(135deg, #fce4ec 0%, #ffffff 100%);
+            color: #4a148c;
+            text-align: center;
+            padding: 4rem 2rem;
+            min-height: 100vh;
+            display: flex;
+            align-items: center;
+            justify-content: center;
         }
-    ]
+        .hero-section {
+            max-width: 500px;
+            width: 100%;
+            background: rgba(255, 255, 255, 0.95);
+            border-radius: 25px;
+            padding: 3rem;
+            box-shadow: 0 20px 60px rgba(233, 30, 99, 0.1);
+            position: relative;
+            border: 1px solid #f8bbd9;
+        }
+        .floral-header, .floral-footer {
+            width: 120px;
+            height: 30px;
+            background: url('data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 120 30" fill="%23e91e63"><path d="M10 15c0-5 5-10 10-10s10 5 10 10-5 10-10 10-10-5-10-10z M50 10c0-3 3-6 6-6s6 3 6 6-3 6-6 6-6-3-6-6z M90 20c0-4 4-8 8-8s8 4 8 8-4 8-8 8-8-4-8-8z"/></svg>') center/contain no-repeat;
+            margin: 0 auto 2rem;
+        }
+        .floral-footer {
+            margin: 2rem auto 0;
+        }
+        .couple-names {
+            font-size: 2.8rem;
+            font-weight: 400;
+            letter-spacing: 2px;
+            margin-bottom: 1.5rem;
+            color: #4a148c;
+        }
+        .separator {
+            width: 80px;
+            height: 2px;
+            background: #e91e63;
+            margin: 1.5rem auto;
+            border-radius: 1px;
+        }
+        .wedding-date {
+            font-size: 1.5rem;
+            font-weight: 400;
+            letter-spacing: 1px;
+            margin-bottom: 0.5rem;
+            color: #6a1b99;
+        }
+        .wedding-time {
+            font-size: 1.1rem;
+            font-weight: 300;
+            color: #8e24aa;
+            margin-bottom: 2rem;
+        }
+        .venue-section {
+            margin-bottom: 2rem;
+        }
+        .venue-name {
+            font-size: 1.3rem;
+            font-weight: 500;
+            color: #4a148c;
+            margin-bottom: 0.5rem;
+        }
+        .venue-address {
+            font-size: 1rem;
+            color: #8e24aa;
+            line-height: 1.4;
+        }
+        .qr-code img {
+            width: 120px;
+            height: 120px;
+            border-radius: 15px;
+            border: 2px solid #e91e63;
+            margin-top: 1rem;
+        }
+        """,
+        "is_premium": False,
+        "owner_id": None
+    }
+]
+
+TEMPLATE_SEED_HASH = hashlib.sha256(
+    json.dumps([TEMPLATE_SEED_VERSION, DEFAULT_TEMPLATES], sort_keys=True).encode()
+).hexdigest()
+
+# Catalog version this process has confirmed; answers /init-templates without a query
+catalog_state: Dict[str, Any] = {"version": None, "hash": None}
+
+async def seed_template_catalog() -> bool:
+    """Upsert the default templates unless this manifest was already seeded"""
+    meta = await db_find_one('catalog_meta', {"id": "templates"}, coalesce=False)
+    if meta and meta.get("hash") == TEMPLATE_SEED_HASH:
+        catalog_state.update(version=meta["version"], hash=meta["hash"])
+        return False
     
-    await db_insert_many('templates', default_templates)
-    return {"message": "Default templates initialized", "count": len(default_templates)}
+    await db_bulk_upsert('templates', DEFAULT_TEMPLATES, on_insert={"created_at": datetime.utcnow()})
+    await db_bulk_upsert('catalog_meta', [{
+        "id": "templates",
+        "version": TEMPLATE_SEED_VERSION,
+        "hash": TEMPLATE_SEED_HASH,
+        "count": len(DEFAULT_TEMPLATES),
+        "seeded_at": datetime.utcnow()
+    }])
+    for template in DEFAULT_TEMPLATES:
+        await cache.invalidate(f"template:{template['id']}")
+        template_index.add(template)
+    catalog_state.update(version=TEMPLATE_SEED_VERSION, hash=TEMPLATE_SEED_HASH)
+    if SNAPSHOTS_ENABLED:
+        await asyncio.to_thread(snapshot_store.prune)
+    logger.info("Seeded template catalog v%s (%d templates)", TEMPLATE_SEED_VERSION, len(DEFAULT_TEMPLATES))
+    return True
+
+@api_router.post("/init-templates")
+async def init_default_templates():
+    """Report the template catalog version (seeding runs at startup)"""
+    if catalog_state["version"] is None:
+        await seed_template_catalog()
+    return {
+        "message": "Templates already initialized",
+        "version": catalog_state["version"],
+        "count": len(DEFAULT_TEMPLATES)
+    }
+
+# Static snapshots: each published invitation's public payload and rendered page
+# are written to local disk, plain and gzipped, when it is published or edited
+# (and on the first view of one published before this existed). Once a worker
+# knows a slug has a snapshot, SnapshotMiddleware answers plain views of it from
+# the file without routing, database reads or encoding. Views with a query
+# string (a guest token) still go through the app, which records the open. The
+# generation follows the template catalog, so a catalog change retires every
+# snapshot at once. With SNAPSHOT_ACCEL_PREFIX set, the proxy sends the file
+# instead (X-Accel-Redirect to an `internal` nginx location aliased to
+# SNAPSHOT_DIR).
+SNAPSHOTS_ENABLED = os.environ.get('SNAPSHOTS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', '/tmp/wedding-invitations-snapshots')
+SNAPSHOT_ACCEL_PREFIX = os.environ.get('SNAPSHOT_ACCEL_PREFIX', '')
+SNAPSHOT_INDEX_SIZE = int(os.environ.get('SNAPSHOT_INDEX_SIZE', '100000'))
+SNAPSHOT_INDEX_TTL = 24 * 3600
+SNAPSHOT_PATH = re.compile(r"/api/public/invitations/([A-Za-z0-9_-]+)(/page)?$")
+
+snapshot_store = SnapshotStore(SNAPSHOT_DIR, TEMPLATE_SEED_HASH[:16])
+snapshot_ids = LRUCache(SNAPSHOT_INDEX_SIZE)  # slug -> invitation id, for counting views
+snapshot_tasks = set()
+
+def render_invitation_page(invitation: dict, template: dict) -> str:
+    data = invitation["invitation_data"]
+    body = get_compiled_template(template).render(invitation_placeholder_values(data, invitation.get("qr_code")))
+    title = html.escape(f"{data.get('bride_name', '')} & {data.get('groom_name', '')}")
+    css = (template.get("css_content") or "").replace("</", "<\\/")
+    return (
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+        '<meta name="viewport" content="width=device-width, initial-scale=1">'
+        f'<title>{title}</title><style>{css}</style></head><body>{body}</body></html>'
+    )
+
+def invitation_snapshot_documents(invitation: dict, template: dict) -> Dict[str, bytes]:
+    return {
+        # Byte for byte what get_public_invitation returns
+        "json": encode_json({"invitation": InvitationRecord.from_doc(invitation), "template": TemplateRecord.from_doc(template)}),
+        "html": render_invitation_page(invitation, template).encode()
+    }
+
+async def write_invitation_snapshot(invitation: dict, template: Optional[dict], replace: bool = True) -> bool:
+    """Write (or with replace=False, only create) a published invitation's snapshot"""
+    if not SNAPSHOTS_ENABLED or not template or not invitation.get("is_published"):
+        return False
+    slug = invitation["url_slug"]
+    try:
+        created = await asyncio.to_thread(snapshot_store.write, slug, invitation_snapshot_documents(invitation, template), replace)
+    except OSError as e:
+        logger.warning("Could not write snapshot for %s: %s", slug, e)
+        return False
+    snapshot_ids.set(slug, invitation["id"], SNAPSHOT_INDEX_TTL)
+    return created
+
+async def refresh_invitation_snapshot(invitation: dict):
+    """Rewrite the snapshot after an edit, or drop it once unpublished"""
+    if not SNAPSHOTS_ENABLED:
+        return
+    if invitation.get("is_published"):
+        await write_invitation_snapshot(invitation, await get_template_doc(invitation["template_id"], profile='default'))
+    else:
+        await asyncio.to_thread(snapshot_store.remove, invitation["url_slug"])
+
+async def create_missing_snapshot(invitation: dict, template: dict):
+    if await asyncio.to_thread(snapshot_store.exists, invitation["url_slug"]):
+        snapshot_ids.set(invitation["url_slug"], invitation["id"], SNAPSHOT_INDEX_TTL)
+        return
+    if not await write_invitation_snapshot(invitation, template, replace=False):
+        return
+    # The view that triggered this may have read a copy an edit has since
+    # replaced; if so drop the snapshot, the next view makes a fresh one
+    current = await db_find_one('invitations', {"id": invitation["id"]}, coalesce=False)
+    if not current or not current.get("is_published") or current.get("version") != invitation.get("version"):
+        await asyncio.to_thread(snapshot_store.remove, invitation["url_slug"])
+
+def schedule_invitation_snapshot(invitation: InvitationRecord, template: TemplateRecord):
+    """Create a snapshot in the background for a view the app had to serve"""
+    if not SNAPSHOTS_ENABLED or snapshot_ids.get(invitation.url_slug) is not None:
+        return
+    snapshot_ids.set(invitation.url_slug, invitation.id, SNAPSHOT_INDEX_TTL)
+    task = asyncio.create_task(create_missing_snapshot(invitation.to_doc(), template.to_doc()))
+    snapshot_tasks.add(task)
+    task.add_done_callback(snapshot_tasks.discard)
+
+class SnapshotMiddleware:
+    """Serves plain public invitation views from their static snapshot"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD") or scope["query_string"]:
+            return await self.app(scope, receive, send)
+        match = SNAPSHOT_PATH.match(scope["path"])
+        invitation_id = snapshot_ids.get(match.group(1)) if match else None
+        if invitation_id is None:
+            return await self.app(scope, receive, send)
+        
+        slug, kind = match.group(1), "html" if match.group(2) else "json"
+        gzipped = b"gzip" in dict(scope["headers"]).get(b"accept-encoding", b"")
+        path = snapshot_store.path(slug, kind, gzipped)
+        headers = {"Vary": "Accept-Encoding"}
+        if gzipped:
+            headers["Content-Encoding"] = "gzip"
+        try:
+            if SNAPSHOT_ACCEL_PREFIX:
+                os.stat(path)
+                headers["X-Accel-Redirect"] = SNAPSHOT_ACCEL_PREFIX + snapshot_store.relative_path(slug, kind, gzipped)
+                response = Response(headers=headers, media_type=SNAPSHOT_KINDS[kind])
+            elif "http.response.pathsend" in scope.get("extensions", {}):
+                # The server sends the file itself (sendfile)
+                response = FileResponse(path, headers=headers, media_type=SNAPSHOT_KINDS[kind],
+                                        stat_result=os.stat(path), method=scope["method"])
+            else:
+                # Snapshots are a few KB and hot in the page cache: one read here
+                # is cheaper than FileResponse's chunked reads in a thread
+                with open(path, 'rb') as file:
+                    body = file.read()
+                response = Response(b"" if scope["method"] == "HEAD" else body, headers=headers,
+                                    media_type=SNAPSHOT_KINDS[kind])
+                if scope["method"] == "HEAD":
+                    response.headers["content-length"] = str(len(body))
+        except OSError:
+            # Not written yet, or removed by another worker: the app decides
+            return await self.app(scope, receive, send)
+        
+        if scope["method"] == "GET":
+            view_counter.record(invitation_id)
+        await response(scope, receive, send)
+
+# Health and warm-up
+WARM_UP_RETRY_INTERVAL = float(os.environ.get('WARM_UP_RETRY_INTERVAL', '5'))
+warm_state: Dict[str, Any] = {"ready": False, "templates": 0, "duration_ms": None, "error": None}
+
+async def warm_up():
+    """Load the public catalog and compiled templates before taking traffic"""
+    started = time.perf_counter()
+    templates = await db_find('templates', {"owner_id": None}, coalesce=False, profile='public_read')
+    for template in templates:
+        template = strip_mongo_id(template)
+        encode_json(TemplateRecord.from_doc(template))  # exercise the read path once
+        await cache.set(f"template:{template['id']}", template)
+        get_compiled_template(template)
+    await rebuild_template_index()
+    warm_state.update(
+        ready=True,
+        templates=len(templates),
+        duration_ms=round((time.perf_counter() - started) * 1000, 1),
+        error=None
+    )
+    logger.info("Worker warm in %sms (%d templates)", warm_state["duration_ms"], len(templates))
+
+async def retry_warm_up():
+    while not warm_state["ready"]:
+        await asyncio.sleep(WARM_UP_RETRY_INTERVAL)
+        try:
+            await warm_up()
+        except Exception as e:
+            warm_state["error"] = str(e)
+
+# Admission control: every HTTP request is classified by route into a priority
+# class before it reaches the app. A class has its own concurrency limit and a
+# bounded FIFO wait queue, and may only use a share of the worker's capacity, so
+# expensive work (AI generation, QR rendering, Stripe, bulk exports) can never
+# take the slots guest page views need. When a higher-priority request has to
+# queue, lower-priority waiters are shed at once and new lower-priority arrivals
+# are refused with 503 + Retry-After instead of joining the queue.
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ADMISSION_CAPACITY = int(os.environ.get('ADMISSION_CAPACITY', '64'))
+
+class AdmissionClass:
+    __slots__ = ('name', 'priority', 'limit', 'max_waiting', 'share', 'timeout', 'retry_after',
+                 'in_flight', 'queue', 'admitted', 'shed')
+
+    def __init__(self, name: str, priority: int, spec: str, share: float, timeout: float, retry_after: int):
+        # spec is "<concurrent>/<queued>"; lower priority values are served first
+        limit, max_waiting = spec.split('/')
+        self.name = name
+        self.priority = priority
+        self.limit = int(limit)
+        self.max_waiting = int(max_waiting)
+        self.share = share
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.queue: deque = deque()
+        self.admitted = 0
+        self.shed = 0
+
+def admission_class(name: str, priority: int, default: str, share: float, timeout: float, retry_after: int) -> AdmissionClass:
+    return AdmissionClass(name, priority, os.environ.get(f'ADMISSION_{name.upper()}', default), share, timeout, retry_after)
+
+class AdmissionController:
+    """Per-class concurrency limits and queues over one shared capacity"""
+
+    def __init__(self, capacity: int, classes: List[AdmissionClass]):
+        self.capacity = capacity
+        self.classes = {admission.name: admission for admission in classes}
+        self._by_priority = sorted(classes, key=lambda admission: admission.priority)
+        self.in_flight = 0
+
+    def _fits(self, admission: AdmissionClass) -> bool:
+        return admission.in_flight < admission.limit and self.in_flight < self.capacity * admission.share
+
+    def _starved_above(self, priority: int) -> bool:
+        """Whether higher-priority requests are queued for shared capacity
+
+        Waiters held back only by their own class limit don't count: a slot
+        given to another class takes nothing from them.
+        """
+        return any(other.queue and other.in_flight < other.limit
+                   for other in self._by_priority if other.priority < priority)
+
+    def _admit(self, admission: AdmissionClass):
+        admission.in_flight += 1
+        admission.admitted += 1
+        self.in_flight += 1
+
+    def _shed_below(self, priority: int):
+        for other in self._by_priority:
+            if other.priority > priority:
+                while other.queue:
+                    waiter = other.queue.popleft()
+                    if not waiter.done():
+                        other.shed += 1
+                        waiter.set_result(False)
+
+    def _expire(self, admission: AdmissionClass, waiter: asyncio.Future):
+        if not waiter.done():
+            admission.queue.remove(waiter)
+            admission.shed += 1
+            waiter.set_result(False)
+
+    async def acquire(self, admission: AdmissionClass) -> bool:
+        """Wait for a slot; False means the request is shed"""
+        starved = self._starved_above(admission.priority)
+        if not admission.queue and not starved and self._fits(admission):
+            self._admit(admission)
+            return True
+        if starved or len(admission.queue) >= admission.max_waiting or admission.timeout <= 0:
+            admission.shed += 1
+            return False
+        if admission.in_flight < admission.limit:
+            # Waiting for shared capacity: lower-priority waiters would only get
+            # in the way, so shed them now rather than at their timeout
+            self._shed_below(admission.priority)
+        waiter = asyncio.get_running_loop().create_future()
+        admission.queue.append(waiter)
+        expiry = asyncio.get_running_loop().call_later(admission.timeout, self._expire, admission, waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            # The client went away while queued, or just after being handed a slot
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self.release(admission)
+            elif waiter in admission.queue:
+                admission.queue.remove(waiter)
+            raise
+        finally:
+            expiry.cancel()
+
+    def release(self, admission: AdmissionClass):
+        admission.in_flight -= 1
+        self.in_flight -= 1
+        # Slots are handed over directly, highest priority first
+        for other in self._by_priority:
+            while other.queue and self._fits(other):
+                waiter = other.queue.popleft()
+                if not waiter.done():
+                    self._admit(other)
+                    waiter.set_result(True)
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "classes": {
+                admission.name: {
+                    "in_flight": admission.in_flight,
+                    "waiting": len(admission.queue),
+                    "admitted": admission.admitted,
+                    "shed": admission.shed
+                } for admission in self._by_priority
+            }
+        }
+
+admission = AdmissionController(ADMISSION_CAPACITY, [
+    admission_class('guest', 0, f'{ADMISSION_CAPACITY}/256', 1.0, 2.0, 1),
+    admission_class('default', 1, '48/64', 0.75, 1.0, 1),
+    admission_class('payments', 2, '8/16', 0.5, 2.0, 2),
+    admission_class('render', 2, '8/16', 0.5, 1.0, 2),
+    admission_class('ai_generate', 3, '2/4', 0.25, 0.5, 10),
+    admission_class('bulk', 3, '2/2', 0.25, 0.5, 30),
+])
+
+# First match wins; None bypasses admission (probes, long-lived streams)
+ADMISSION_ROUTES = [
+    (None, re.compile(r"/api/(health|debug)/"), None),
+    ("GET", re.compile(r"/api/invitations/events$"), None),
+    ("GET", re.compile(r"/api/public/invitations/[^/]+(/page)?$"), 'guest'),
+    ("POST", re.compile(r"/api/public/invitations/[^/]+/rsvp$"), 'guest'),
+    ("POST", re.compile(r"/api/templates/generate-ai$"), 'ai_generate'),
+    ("POST", re.compile(r"/api/invitations$"), 'render'),
+    ("GET", re.compile(r"/api/invitations/[^/]+/export$"), 'render'),
+    ("POST", re.compile(r"/api/invitations/[^/]+/guests/import$"), 'render'),
+    (None, re.compile(r"/api/(payments|webhook)/"), 'payments'),
+    ("GET", re.compile(r"/api/export$"), 'bulk'),
+]
+
+def admission_class_for(method: str, path: str) -> Optional[AdmissionClass]:
+    for route_method, pattern, name in ADMISSION_ROUTES:
+        if (route_method is None or route_method == method) and pattern.match(path):
+            return admission.classes[name] if name else None
+    return admission.classes['default']
+
+class AdmissionMiddleware:
+    """Queues or sheds each request according to its route's admission class"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+        request_class = admission_class_for(scope["method"], scope["path"])
+        if request_class is None:
+            return await self.app(scope, receive, send)
+        if not await admission.acquire(request_class):
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server busy, please retry shortly"},
+                headers={"Retry-After": str(request_class.retry_after)}
+            )
+            return await response(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release(request_class)
+
+class TracingMiddleware:
+    """Opens each request's root span; continues an incoming traceparent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        traceparent = dict(scope["headers"]).get(b"traceparent")
+        root = tracer.trace(
+            'http.request', traceparent.decode('latin-1') if traceparent else None,
+            method=scope["method"], path=scope["path"]
+        )
+        if root.trace_id is None:
+            return await self.app(scope, receive, send)
+        
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                root.set(status=message["status"])
+                message = {**message, "headers": [*message.get("headers", []), (b"x-trace-id", root.trace_id.encode())]}
+            await send(message)
+        
+        with root:
+            try:
+                await self.app(scope, receive, send_with_trace_id)
+            finally:
+                # The router leaves the matched endpoint in the scope
+                endpoint = scope.get("endpoint")
+                if endpoint is not None:
+                    root.set(route=endpoint.__name__)
+
+# Request profiling: off unless configured, and then the middleware only steps in
+# for requests carrying the admin token header or picked by the sample rate.
+# Profiles land in a per-worker ring buffer (and the shared cache tier, so any
+# worker can serve them) as collapsed stacks ready for a flamegraph.
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_PATHS = tuple(path for path in os.environ.get('PROFILE_PATHS', '/api/').split(',') if path)
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL_MS', '1')) / 1000
+PROFILE_BUFFER_SIZE = int(os.environ.get('PROFILE_BUFFER_SIZE', '32'))
+PROFILE_TTL = 3600
+PROFILING_ENABLED = bool(PROFILING_TOKEN) or PROFILE_SAMPLE_RATE > 0
+
+profile_sampler = StackSampler(PROFILE_INTERVAL)
+recent_profiles = deque(maxlen=PROFILE_BUFFER_SIZE)
+
+def has_profiling_token(token) -> bool:
+    if not PROFILING_TOKEN or not token:
+        return False
+    if isinstance(token, str):
+        token = token.encode('latin-1')  # how Starlette decoded the raw header
+    # Bytes: compare_digest rejects str with non-ASCII characters
+    return hmac.compare_digest(token, PROFILING_TOKEN.encode())
+
+async def store_profile(profile: RequestProfile):
+    record = {**profile.summary(), "folded": profile.folded()}
+    recent_profiles.append(record)
+    if cache.backend.name != 'local':
+        await cache.backend.set(f"profile:{profile.id}", record, PROFILE_TTL)
+
+class ProfilingMiddleware:
+    """Profiles requests sent with X-Profile-Token, plus a random sample"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(PROFILE_PATHS):
+            return await self.app(scope, receive, send)
+        forced = has_profiling_token(dict(scope["headers"]).get(b"x-profile-token"))
+        if not forced and not (PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE):
+            return await self.app(scope, receive, send)
+        
+        profile = RequestProfile(secrets.token_hex(6), scope["method"], scope["path"], PROFILE_INTERVAL)
+        status = None
+        
+        async def send_with_profile_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if forced:
+                    message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+        
+        # Samples are credited to this request while this frame is on the stack
+        frame = sys._getframe()
+        profile_sampler.start(frame, profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile_sampler.stop(frame)
+            profile.finish(status)
+            await store_profile(profile)
+
+def require_profiling_token(request: Request):
+    if not has_profiling_token(request.headers.get("X-Profile-Token")):
+        raise HTTPException(status_code=403, detail="Profiling access denied")
+
+@api_router.get("/debug/profiles", dependencies=[Depends(require_profiling_token)])
+async def list_profiles():
+    """This worker's recent request profiles, newest first"""
+    return {
+        "pid": os.getpid(),
+        "profiles": [
+            {key: value for key, value in record.items() if key != "folded"}
+            for record in reversed(recent_profiles)
+        ]
+    }
+
+@api_router.get("/debug/profiles/{profile_id}", dependencies=[Depends(require_profiling_token)])
+async def get_profile(profile_id: str, format: str = "folded"):
+    """A profile as collapsed stacks (format=folded) or JSON"""
+    record = next((record for record in recent_profiles if record["id"] == profile_id), None)
+    if record is None and cache.backend.name != 'local':
+        record = await cache.backend.get(f"profile:{profile_id}")
+    if record is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "json":
+        return record
+    return Response(content=record["folded"], media_type="text/plain")
+
+@api_router.get("/health/live")
+async def liveness():
+    """Process is up"""
+    return {"status": "ok"}
+
+@api_router.get("/health/db")
+async def database_health():
+    """Storage engine details; for MongoDB, pool, topology latency and profiles"""
+    return storage.stats()
+
+@api_router.get("/health/queries")
+async def query_statistics(sort: str = "total_ms", limit: int = 50):
+    """Per-query-shape statistics, slowest in total first (sort: total_ms, max_ms, mean_ms, count)"""
+    if sort not in ("total_ms", "max_ms", "mean_ms", "count", "documents", "slow"):
+        raise HTTPException(status_code=400, detail="Unknown sort field")
+    return {
+        "slow_query_ms": SLOW_QUERY_MS,
+        "shapes": query_stats.snapshot(sort, min(max(limit, 1), QUERY_STATS_MAX_SHAPES)),
+        "untracked": query_stats.untracked
+    }
+
+@api_router.get("/health/ready")
+async def readiness():
+    """Worker is warm and ready for traffic"""
+    if not warm_state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming", "error": warm_state["error"]})
+    return {
+        "status": "ready",
+        "templates": warm_state["templates"],
+        "warm_up_ms": warm_state["duration_ms"],
+        "cache": cache.stats(),
+        "events": invitation_events.stats(),
+        "rate_limit": {**rate_limit_stats, "buckets": len(rate_limit_buckets)},
+        "admission": admission.stats(),
+        "thumbnails": thumbnail_cache.stats()
+    }
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Inside CORS, so browsers can read a shed request's 503
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+# Outside admission: a snapshot hit costs a stat and a sendfile
+if SNAPSHOTS_ENABLED:
+    app.add_middleware(SnapshotMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1068,6 +4081,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Not installed at all unless configured, so it costs nothing by default
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+if tracer.enabled:
+    app.add_middleware(TracingMiddleware)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -1075,7 +4094,54 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_connect_database():
+    await connect_database()
+
+@app.on_event("startup")
+async def start_session_maintenance():
+    app.state.session_sweeper = asyncio.create_task(sweep_expired_sessions())
+    app.state.view_flusher = asyncio.create_task(flush_view_counts())
+
+@app.on_event("startup")
+async def start_cache():
+    # Logouts on other workers revoke signed tokens here too
+    cache.backend.subscribe('revoke', lambda m: revoked_tokens.add(m[0], m[1], m[2]))
+    # Dashboard events and new templates from other workers
+    cache.backend.subscribe('invitation_events', invitation_events.fan_out)
+    cache.backend.subscribe('template_index', lambda summary: template_index.add(summary))
+    await cache.backend.start()
+    if cache.backend.name != 'local' and not storage.persistent:
+        logger.warning("In-memory storage is per-process; workers will not share data")
+
+@app.on_event("startup")
+async def seed_catalog():
+    try:
+        await seed_template_catalog()
+    except Exception:
+        # /init-templates retries; the API still serves whatever is stored
+        logger.exception("Template catalog seeding failed")
+
+@app.on_event("startup")
+async def warm_worker():
+    # Runs after seeding so the preloaded catalog is complete
+    try:
+        await warm_up()
+    except Exception as e:
+        warm_state["error"] = str(e)
+        logger.exception("Warm-up failed; worker stays unready and retries")
+        app.state.warm_up_retry = asyncio.create_task(retry_warm_up())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    if USE_MONGODB:
-        client.close()
\ No newline at end of file
+    for task_name in ('session_sweeper', 'view_flusher', 'warm_up_retry'):
+        task = getattr(app.state, task_name, None)
+        if task:
+            task.cancel()
+    await view_counter.flush()
+    await cache.backend.close()
+    if render_pool:
+        render_pool.shutdown(wait=False, cancel_futures=True)
+    await storage.close()
+    if isinstance(trace_exporter, FileExporter):
+        trace_exporter.close()
\ No newline at end of file
@@ -0,0 +1,90 @@
+"""Static snapshots of published invitations on local disk.
+
+Each snapshot is a set of documents (the public API payload, the rendered page)
+stored next to gzip-compressed copies, so a view can be answered with a file:
+sendfile through the ASGI pathsend extension, or an X-Accel-Redirect that
+leaves it to the proxy.
+
+Files are written under a temporary name and renamed into place, so readers
+see a whole old or a whole new file, never a partial one. Snapshots live in a
+generation directory; moving to a new generation (the template catalog
+changed) makes every older snapshot unreachable at once.
+"""
+import gzip
+import os
+import shutil
+import tempfile
+from typing import Dict
+
+SNAPSHOT_KINDS = {"json": "application/json", "html": "text/html; charset=utf-8"}
+
+class SnapshotStore:
+    def __init__(self, root: str, generation: str):
+        self.root = root
+        self.generation = generation
+        self.directory = os.path.join(root, generation)
+
+    def relative_path(self, key: str, kind: str, gzipped: bool = False) -> str:
+        return f"{self.generation}/{key}.{kind}{'.gz' if gzipped else ''}"
+
+    def path(self, key: str, kind: str, gzipped: bool = False) -> str:
+        return os.path.join(self.root, self.relative_path(key, kind, gzipped))
+
+    def exists(self, key: str) -> bool:
+        return all(os.path.exists(self.path(key, kind)) for kind in SNAPSHOT_KINDS)
+
+    def write(self, key: str, documents: Dict[str, bytes], replace: bool = True) -> bool:
+        """Store `documents` (kind -> body) and their gzipped copies
+
+        With replace=False nothing is overwritten, and the return value says
+        whether this call created the snapshot.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        created = False
+        for kind, body in documents.items():
+            # The gzipped copy first: a plain file is never newer than its copy
+            self._store(self.path(key, kind, True), gzip.compress(body, 9, mtime=0), replace)
+            created = self._store(self.path(key, kind), body, replace) or created
+        return created
+
+    def _store(self, path: str, data: bytes, replace: bool) -> bool:
+        fd, temporary = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.chmod(temporary, 0o644)  # readable by a proxy serving X-Accel-Redirect
+            if replace:
+                os.replace(temporary, path)
+                return True
+            try:
+                os.link(temporary, path)  # atomic, and fails when the file exists
+                return True
+            except FileExistsError:
+                return False
+        finally:
+            # Gone after a replace; still there after a link or a failure
+            try:
+                os.unlink(temporary)
+            except FileNotFoundError:
+                pass
+
+    def remove(self, key: str):
+        for kind in SNAPSHOT_KINDS:
+            for gzipped in (False, True):
+                try:
+                    os.unlink(self.path(key, kind, gzipped))
+                except FileNotFoundError:
+                    pass
+
+    def prune(self) -> int:
+        """Delete the other generations; returns how many were removed"""
+        removed = 0
+        try:
+            entries = os.listdir(self.root)
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            if entry != self.generation:
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+                removed += 1
+        return removed
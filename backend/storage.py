@@ -0,0 +1,913 @@
+"""Storage engines behind the db_* helpers.
+
+Every engine implements the same small document API (Mongo-style equality and
+comparison queries, projections, sorts, limits and update operators), so the
+application is engine-agnostic:
+
+- MongoEngine: Motor, with named per-collection read/write profiles
+- MemoryEngine: process-local dicts with hash indexes, for demos and tests
+- SQLiteEngine: one embedded file (WAL mode, JSON documents, generated-column
+  indexes) for small single-node deployments
+
+benchmarks.py storage runs the same conformance checks and timings against each.
+"""
+import asyncio
+import importlib.util
+import json
+import logging
+import re
+import sqlite3
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne, monitoring
+
+logger = logging.getLogger(__name__)
+
+# Fields looked up on hot paths; every engine indexes these (plus `id`)
+INDEXED_FIELDS = {
+    'users': ['email'],
+    'sessions': ['token_hash'],
+    'templates': ['owner_id'],
+    'invitations': ['url_slug', 'user_id'],
+    'invitation_revisions': ['invitation_id'],
+    'rsvps': ['invitation_id'],
+    'guests': ['invitation_id', 'token'],
+    'payment_transactions': ['session_id', 'user_id'],
+}
+UNIQUE_FIELDS = {'token_hash', 'url_slug', 'token'}
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_]\w*$')
+_FIELD_PATH = re.compile(r'^[A-Za-z_]\w*(\.[A-Za-z_]\w*)*$')
+_MISSING = object()
+
+# JSON encoding that round-trips datetimes (Mongo extended JSON style)
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _json_object_hook(obj):
+    if len(obj) == 1 and "$date" in obj:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+def dumps_ext(value) -> str:
+    """JSON-encode a document, preserving datetimes"""
+    return json.dumps(value, default=_json_default, separators=(',', ':'))
+
+def loads_ext(data):
+    return json.loads(data, object_hook=_json_object_hook)
+
+# Query and update semantics shared by the non-Mongo engines
+def get_path(document: dict, path: str):
+    value = document
+    for part in path.split('.'):
+        if not isinstance(value, dict):
+            return _MISSING
+        value = value.get(part, _MISSING)
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+def _set_path(document: dict, path: str, value):
+    *parents, leaf = path.split('.')
+    for part in parents:
+        document = document.setdefault(part, {})
+    document[leaf] = value
+
+def _is_operator_dict(condition) -> bool:
+    return isinstance(condition, dict) and bool(condition) and all(k.startswith('$') for k in condition)
+
+def _compare(op: str, value, operand) -> bool:
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if op == '$gt':
+            return value > operand
+        if op == '$gte':
+            return value >= operand
+        if op == '$lt':
+            return value < operand
+        return value <= operand
+    except TypeError:
+        return False
+
+def match_condition(value, condition) -> bool:
+    if not _is_operator_dict(condition):
+        return (None if value is _MISSING else value) == condition
+    for op, operand in condition.items():
+        if op == '$in':
+            ok = (None if value is _MISSING else value) in operand
+        elif op == '$nin':
+            ok = (None if value is _MISSING else value) not in operand
+        elif op == '$ne':
+            ok = (None if value is _MISSING else value) != operand
+        elif op == '$exists':
+            ok = (value is not _MISSING) == bool(operand)
+        elif op in ('$gt', '$gte', '$lt', '$lte'):
+            ok = _compare(op, value, operand)
+        else:
+            raise ValueError(f"Unsupported query operator {op}")
+        if not ok:
+            return False
+    return True
+
+def matches(document: dict, query: Optional[dict]) -> bool:
+    return all(match_condition(get_path(document, key), condition) for key, condition in (query or {}).items())
+
+def query_shape(query: Optional[dict]) -> str:
+    """A query's structure without its values, e.g. "created_at:$gt,user_id"
+
+    Queries differing only in their values share a shape, which is what
+    per-query statistics are keyed on.
+    """
+    if not query:
+        return "{}"
+    parts = []
+    for key in sorted(query):
+        condition = query[key]
+        if key in ('$or', '$and', '$nor') and isinstance(condition, list):
+            parts.append(f"{key}({'|'.join(query_shape(c) for c in condition)})")
+        elif _is_operator_dict(condition):
+            parts.append(f"{key}:{'/'.join(sorted(condition))}")
+        else:
+            parts.append(key)
+    return ",".join(parts)
+
+def apply_update(document: dict, update: dict) -> bool:
+    """Apply Mongo-style update operators in place; returns whether anything changed"""
+    changed = False
+    for op, fields in update.items():
+        if op == '$setOnInsert':
+            continue
+        for path, value in fields.items():
+            current = get_path(document, path)
+            if op == '$set':
+                if current is _MISSING or current != value:
+                    _set_path(document, path, value)
+                    changed = True
+            elif op == '$unset':
+                if current is not _MISSING:
+                    *parents, leaf = path.split('.')
+                    parent = get_path(document, '.'.join(parents)) if parents else document
+                    del parent[leaf]
+                    changed = True
+            elif op == '$inc':
+                _set_path(document, path, (0 if current is _MISSING else current) + value)
+                changed = changed or value != 0
+            elif op == '$push':
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                array = [] if current is _MISSING else list(current)
+                array.extend(items)
+                if isinstance(value, dict) and "$slice" in value:
+                    limit = value["$slice"]
+                    array = array[limit:] if limit < 0 else array[:limit]
+                _set_path(document, path, array)
+                changed = True
+            else:
+                raise ValueError(f"Unsupported update operator {op}")
+    return changed
+
+def project(document: dict, projection: Optional[dict]) -> dict:
+    if not projection:
+        return document
+    included = [path for path, flag in projection.items() if flag and path != '_id']
+    if included:
+        out = {}
+        for path in included:
+            value = get_path(document, path)
+            if value is not _MISSING:
+                _set_path(out, path, value)
+        return out
+    return {k: v for k, v in document.items() if projection.get(k, 1)}
+
+def sort_documents(documents: list, sort: List[tuple]) -> list:
+    """Stable multi-key sort; missing and null values order first, as in Mongo"""
+    for path, direction in reversed(sort):
+        def key(document, path=path):
+            value = get_path(document, path)
+            return (0, 0) if value is _MISSING or value is None else (1, value)
+        documents.sort(key=key, reverse=direction < 0)
+    return documents
+
+class WriteResult:
+    """Result of a write on the non-Mongo engines (mirrors pymongo's fields)"""
+    __slots__ = ('inserted_id', 'matched_count', 'modified_count', 'deleted_count', 'upserted_count')
+
+    def __init__(self, inserted_id=None, matched_count=0, modified_count=0, deleted_count=0, upserted_count=0):
+        self.inserted_id = inserted_id
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+        self.deleted_count = deleted_count
+        self.upserted_count = upserted_count
+
+class StorageEngine:
+    """Document storage interface used by the db_* helpers"""
+    name = 'base'
+    persistent = False  # survives restarts and is shared by every worker
+    ttl_indexes = False  # expires documents itself (Mongo TTL indexes)
+    coalesce_reads = False  # reads await I/O, so concurrent duplicates are worth sharing
+
+    async def connect(self):
+        pass
+
+    async def ensure_indexes(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"engine": self.name}
+
+    async def find_one(self, collection: str, query: dict, projection: dict = None, profile: str = 'default'):
+        documents = await self.find(collection, query, projection, limit=1, profile=profile)
+        return documents[0] if documents else None
+
+    async def find(self, collection: str, query: dict = None, projection: dict = None,
+                   sort: List[tuple] = None, limit: int = 1000, profile: str = 'default') -> list:
+        raise NotImplementedError
+
+    async def iterate(self, collection: str, query: dict = None, projection: dict = None, after: str = None,
+                      batch_size: int = 500, profile: str = 'default'):
+        """Yield every matching document in `id` order, starting after the id `after`
+
+        Reads one batch at a time, so memory is bounded however many documents
+        match. Pages are keyed on `id` (which the projection must keep), so a
+        consumer can resume from the last id it saw.
+        """
+        while True:
+            page_query = dict(query or {})
+            if after is not None:
+                page_query["id"] = {"$gt": after}
+            batch = await self.find(collection, page_query, projection, [("id", 1)], batch_size, profile)
+            for document in batch:
+                yield document
+            if len(batch) < batch_size:
+                return
+            after = batch[-1]["id"]
+
+    async def find_joined(self, collection: str, query: dict, join: str, local_field: str, as_field: str,
+                          join_projection: dict = None, projection: dict = None, sort: List[tuple] = None,
+                          limit: int = 1000, profile: str = 'default') -> list:
+        """find(), with the `join` document whose id is each document's `local_field` under `as_field`
+
+        A left join: documents without a match get None. The projection is applied
+        before joining, so it must keep `local_field`; the join projection must keep
+        `id`. This version is a batched loader, one $in read for the distinct ids
+        of the whole result.
+        """
+        documents = await self.find(collection, query, projection, sort, limit, profile)
+        keys = list(dict.fromkeys(doc[local_field] for doc in documents if doc.get(local_field) is not None))
+        joined = {}
+        if keys:
+            for doc in await self.find(join, {"id": {"$in": keys}}, join_projection, limit=0, profile=profile):
+                joined[doc["id"]] = doc
+        # New dicts: some engines return their stored documents
+        return [{**doc, as_field: joined.get(doc.get(local_field))} for doc in documents]
+
+    async def explain(self, collection: str, query: dict, sort: List[tuple] = None) -> Optional[dict]:
+        """How the engine would run a find with this filter (None if it cannot say)"""
+        return None
+
+    async def insert_one(self, collection: str, document: dict, profile: str = 'default'):
+        raise NotImplementedError
+
+    async def insert_many(self, collection: str, documents: list, profile: str = 'default'):
+        raise NotImplementedError
+
+    async def update_one(self, collection: str, query: dict, update: dict, profile: str = 'default'):
+        raise NotImplementedError
+
+    async def update_many(self, collection: str, query: dict, update: dict, profile: str = 'default'):
+        raise NotImplementedError
+
+    async def delete_one(self, collection: str, query: dict, profile: str = 'default'):
+        raise NotImplementedError
+
+    async def delete_many(self, collection: str, query: dict, profile: str = 'default'):
+        raise NotImplementedError
+
+    async def count(self, collection: str, query: dict = None, profile: str = 'default') -> int:
+        raise NotImplementedError
+
+    async def bulk_upsert(self, collection: str, documents: list, on_insert: dict = None):
+        """Insert or update documents by their `id`"""
+        raise NotImplementedError
+
+def _plan_summary(stage: dict) -> str:
+    """"FETCH > IXSCAN(user_id_1)" from an explain plan stage tree"""
+    name = stage.get("stage", "?")
+    if stage.get("indexName"):
+        name += f"({stage['indexName']})"
+    children = [stage["inputStage"]] if "inputStage" in stage else stage.get("inputStages", [])
+    if not children:
+        return name
+    inner = " + ".join(_plan_summary(child) for child in children)
+    return f"{name} > {inner}" if len(children) == 1 else f"{name} > [{inner}]"
+
+def available_compressors() -> str:
+    """Wire compressors usable here, best first (zlib is always available)"""
+    compressors = []
+    for name, module in (('zstd', 'zstandard'), ('snappy', 'snappy')):
+        if importlib.util.find_spec(module):
+            compressors.append(name)
+    return ','.join(compressors + ['zlib'])
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events for /api/health/db"""
+
+    def __init__(self):
+        self.counters = {"created": 0, "closed": 0, "checked_out": 0, "checked_in": 0, "checkout_failed": 0, "cleared": 0}
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+    def pool_cleared(self, event):
+        self.counters["cleared"] += 1
+
+    def connection_created(self, event):
+        self.counters["created"] += 1
+
+    def connection_closed(self, event):
+        self.counters["closed"] += 1
+
+    def connection_check_out_failed(self, event):
+        self.counters["checkout_failed"] += 1
+
+    def connection_checked_out(self, event):
+        self.counters["checked_out"] += 1
+
+    def connection_checked_in(self, event):
+        self.counters["checked_in"] += 1
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "open": self.counters["created"] - self.counters["closed"],
+            "in_use": self.counters["checked_out"] - self.counters["checked_in"]
+        }
+
+class MongoEngine(StorageEngine):
+    """MongoDB through Motor; profiles map to configured collection handles"""
+    name = 'mongodb'
+    persistent = True
+    ttl_indexes = True
+    coalesce_reads = True
+
+    def __init__(self, url: str, db_name: str, options: dict = None, profiles: dict = None):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        self.options = dict(options or {})
+        self.profiles = profiles or {"default": {}}
+        self.pool_stats = PoolStatsListener()
+        # The client connects lazily; connect() checks reachability
+        self.client = AsyncIOMotorClient(url, event_listeners=[self.pool_stats], **self.options)
+        self.db = self.client[db_name]
+        self._collections: Dict[tuple, Any] = {}
+
+    def collection(self, collection: str, profile: str = 'default'):
+        """Collection handle configured for a named profile"""
+        handle = self._collections.get((collection, profile))
+        if handle is None:
+            handle = self.db.get_collection(collection, **self.profiles[profile])
+            self._collections[(collection, profile)] = handle
+        return handle
+
+    async def connect(self):
+        await self.client.admin.command('ping')
+
+    async def ensure_indexes(self):
+        specs = [('sessions', 'expires_at', {"expireAfterSeconds": 0})]  # TTL eviction
+        for collection, fields in INDEXED_FIELDS.items():
+            if collection != 'sessions':
+                specs.append((collection, 'id', {"unique": True}))
+            specs.extend((collection, field, {"unique": field in UNIQUE_FIELDS}) for field in fields)
+        for collection, field, options in specs:
+            try:
+                await self.db[collection].create_index(field, **options)
+            except Exception as e:
+                logger.warning("Could not create index %s.%s: %s", collection, field, e)
+
+    async def close(self):
+        self.client.close()
+
+    def stats(self) -> dict:
+        servers = [
+            {
+                "address": f"{host}:{port}",
+                "type": description.server_type_name,
+                "round_trip_ms": round(description.round_trip_time * 1000, 2) if description.round_trip_time is not None else None
+            }
+            for (host, port), description in self.client.delegate.topology_description.server_descriptions().items()
+        ]
+        return {
+            "engine": self.name,
+            "pool": self.pool_stats.stats(),
+            "max_pool_size": self.options.get("maxPoolSize"),
+            "compressors": self.options.get("compressors"),
+            "profiles": list(self.profiles),
+            "servers": servers
+        }
+
+    async def find_one(self, collection, query, projection=None, profile='default'):
+        return await self.collection(collection, profile).find_one(query, projection)
+
+    async def find(self, collection, query=None, projection=None, sort=None, limit=1000, profile='default'):
+        cursor = self.collection(collection, profile).find(query or {}, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(limit or None)
+
+    async def find_joined(self, collection, query, join, local_field, as_field, join_projection=None,
+                          projection=None, sort=None, limit=1000, profile='default'):
+        # One round trip: the server runs the join ($lookup with localField and a
+        # pipeline needs MongoDB 5.0)
+        pipeline = [{"$match": query or {}}]
+        if sort:
+            pipeline.append({"$sort": dict(sort)})
+        if limit:
+            pipeline.append({"$limit": limit})
+        if projection:
+            pipeline.append({"$project": projection})
+        lookup = {"from": join, "localField": local_field, "foreignField": "id", "as": as_field}
+        if join_projection:
+            lookup["pipeline"] = [{"$project": join_projection}]
+        pipeline += [
+            {"$lookup": lookup},
+            {"$addFields": {as_field: {"$ifNull": [{"$arrayElemAt": [f"${as_field}", 0]}, None]}}}
+        ]
+        return await self.collection(collection, profile).aggregate(pipeline).to_list(None)
+
+    async def explain(self, collection, query, sort=None):
+        cursor = self.collection(collection).find(query or {})
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        winning_plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+        stats = explanation.get("executionStats", {})
+        return {
+            "plan": _plan_summary(winning_plan.get("queryPlan", winning_plan)),
+            "docs_examined": stats.get("totalDocsExamined"),
+            "keys_examined": stats.get("totalKeysExamined"),
+            "returned": stats.get("nReturned")
+        }
+
+    async def iterate(self, collection, query=None, projection=None, after=None, batch_size=500, profile='default'):
+        # One server-side cursor; getMore fetches the next batch as it is consumed
+        query = dict(query or {})
+        if after is not None:
+            query["id"] = {"$gt": after}
+        cursor = self.collection(collection, profile).find(query, projection).sort("id", 1).batch_size(batch_size)
+        try:
+            async for document in cursor:
+                yield document
+        finally:
+            await cursor.close()
+
+    async def insert_one(self, collection, document, profile='default'):
+        return await self.collection(collection, profile).insert_one(document)
+
+    async def insert_many(self, collection, documents, profile='default'):
+        return await self.collection(collection, profile).insert_many(documents, ordered=False)
+
+    async def update_one(self, collection, query, update, profile='default'):
+        return await self.collection(collection, profile).update_one(query, update)
+
+    async def update_many(self, collection, query, update, profile='default'):
+        return await self.collection(collection, profile).update_many(query, update)
+
+    async def delete_one(self, collection, query, profile='default'):
+        return await self.collection(collection, profile).delete_one(query)
+
+    async def delete_many(self, collection, query, profile='default'):
+        return await self.collection(collection, profile).delete_many(query)
+
+    async def count(self, collection, query=None, profile='default'):
+        return await self.collection(collection, profile).count_documents(query or {})
+
+    async def bulk_upsert(self, collection, documents, on_insert=None):
+        operations = [
+            UpdateOne(
+                {"id": doc["id"]},
+                {"$set": doc, "$setOnInsert": on_insert} if on_insert else {"$set": doc},
+                upsert=True
+            )
+            for doc in documents
+        ]
+        return await self.collection(collection).bulk_write(operations, ordered=False)
+
+class MemoryEngine(StorageEngine):
+    """Process-local storage with hash indexes on `id` and INDEXED_FIELDS.
+
+    Reads return the stored documents themselves; callers treat them as read-only.
+    """
+    name = 'memory'
+
+    def __init__(self):
+        self._collections: Dict[str, Dict[str, dict]] = {}
+        self._indexes: Dict[str, Dict[str, Dict[Any, Dict[str, None]]]] = {}
+
+    def _documents(self, collection: str) -> Dict[str, dict]:
+        documents = self._collections.get(collection)
+        if documents is None:
+            documents = self._collections[collection] = {}
+            self._indexes[collection] = {field: {} for field in INDEXED_FIELDS.get(collection, ())}
+        return documents
+
+    def _index(self, collection: str, doc_id: str, document: dict, add: bool = True):
+        for field, index in self._indexes[collection].items():
+            value = get_path(document, field)
+            value = None if value is _MISSING else value
+            try:
+                bucket = index.get(value)
+            except TypeError:
+                continue  # unhashable values are only found by scanning
+            if add:
+                if bucket is None:
+                    bucket = index[value] = {}
+                bucket[doc_id] = None
+            elif bucket is not None:
+                bucket.pop(doc_id, None)
+                if not bucket:
+                    del index[value]
+
+    def _candidates(self, collection: str, query: dict):
+        """Documents that may match, narrowed through an index when possible"""
+        documents = self._documents(collection)
+        indexes = self._indexes[collection]
+        for field, condition in query.items():
+            if field != 'id' and field not in indexes:
+                continue
+            if _is_operator_dict(condition):
+                if set(condition) != {'$in'}:
+                    continue
+                values = condition['$in']
+            else:
+                values = (condition,)
+            try:
+                if field == 'id':
+                    return [documents[v] for v in values if v in documents]
+                index = indexes[field]
+                ids = {}
+                for value in values:
+                    ids.update(index.get(value, {}))
+            except TypeError:
+                continue
+            return [documents[doc_id] for doc_id in ids]
+        return documents.values()
+
+    async def explain(self, collection, query, sort=None):
+        query = query or {}
+        candidates = self._candidates(collection, query)
+        index = next((
+            field for field, condition in query.items()
+            if (field == 'id' or field in self._indexes[collection])
+            and (not _is_operator_dict(condition) or set(condition) == {'$in'})
+        ), None)
+        return {
+            # _candidates returns a list only when it narrowed through an index
+            "plan": f"INDEX {index}" if isinstance(candidates, list) else "SCAN",
+            "docs_examined": len(candidates),
+            "returned": len(self._matching(collection, query))
+        }
+
+    def _matching(self, collection: str, query: dict, limit: int = None) -> list:
+        found = []
+        for document in self._candidates(collection, query or {}):
+            if matches(document, query):
+                found.append(document)
+                if limit and len(found) >= limit:
+                    break
+        return found
+
+    @staticmethod
+    def _doc_id(document: dict) -> str:
+        return document.get('id') or document['_id']
+
+    async def find(self, collection, query=None, projection=None, sort=None, limit=1000, profile='default'):
+        documents = self._matching(collection, query, None if sort else limit)
+        if sort:
+            documents = sort_documents(documents, sort)
+            if limit:
+                documents = documents[:limit]
+        return [project(doc, projection) for doc in documents] if projection else documents
+
+    async def insert_one(self, collection, document, profile='default'):
+        # Like pymongo, documents without a key get an `_id` added in place
+        doc_id = document.get('id') or document.setdefault('_id', str(uuid.uuid4()))
+        self._documents(collection)[doc_id] = document
+        self._index(collection, doc_id, document)
+        return WriteResult(inserted_id=doc_id)
+
+    async def insert_many(self, collection, documents, profile='default'):
+        for document in documents:
+            await self.insert_one(collection, document)
+        return WriteResult()
+
+    async def _update(self, collection, query, update, limit):
+        matched = self._matching(collection, query, limit)
+        modified = 0
+        for document in matched:
+            doc_id = self._doc_id(document)
+            self._index(collection, doc_id, document, add=False)
+            modified += apply_update(document, update)
+            self._index(collection, doc_id, document)
+        return WriteResult(matched_count=len(matched), modified_count=modified)
+
+    async def update_one(self, collection, query, update, profile='default'):
+        return await self._update(collection, query, update, 1)
+
+    async def update_many(self, collection, query, update, profile='default'):
+        return await self._update(collection, query, update, None)
+
+    async def _delete(self, collection, query, limit):
+        documents = self._documents(collection)
+        matched = self._matching(collection, query, limit)
+        for document in matched:
+            doc_id = self._doc_id(document)
+            self._index(collection, doc_id, document, add=False)
+            documents.pop(doc_id, None)
+        return WriteResult(deleted_count=len(matched))
+
+    async def delete_one(self, collection, query, profile='default'):
+        return await self._delete(collection, query, 1)
+
+    async def delete_many(self, collection, query, profile='default'):
+        return await self._delete(collection, query, None)
+
+    async def count(self, collection, query=None, profile='default'):
+        if not query:
+            return len(self._documents(collection))
+        return len(self._matching(collection, query))
+
+    async def bulk_upsert(self, collection, documents, on_insert=None):
+        existing_docs = self._documents(collection)
+        upserted = 0
+        for document in documents:
+            existing = existing_docs.get(document["id"])
+            if existing is not None:
+                self._index(collection, document["id"], existing, add=False)
+                existing.update(document)
+                self._index(collection, document["id"], existing)
+            else:
+                await self.insert_one(collection, {**(on_insert or {}), **document})
+                upserted += 1
+        return WriteResult(upserted_count=upserted)
+
+_SQL_COMPARISONS = {'$gt': '>', '$gte': '>=', '$lt': '<', '$lte': '<='}
+
+def _sql_scalar(value) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool, datetime))
+
+def _sql_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+class SQLiteEngine(StorageEngine):
+    """Embedded SQLite storage: one table per collection holding JSON documents.
+
+    Indexed fields are exposed as generated columns with their own indexes.
+    Conditions that SQL can express run in SQLite and the rest are applied to
+    the decoded documents. All access goes through one thread; WAL mode lets
+    other worker processes keep reading while one writes.
+    """
+    name = 'sqlite'
+    persistent = True
+    coalesce_reads = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+        self._conn: Optional[sqlite3.Connection] = None
+        self._tables = set()
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=5000')
+            self._conn = conn
+        return self._conn
+
+    def _table(self, collection: str) -> sqlite3.Connection:
+        conn = self._db()
+        if collection in self._tables:
+            return conn
+        if not _IDENTIFIER.match(collection):
+            raise ValueError(f"Invalid collection name {collection!r}")
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{collection}" (id TEXT PRIMARY KEY, doc TEXT NOT NULL)')
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_xinfo("{collection}")')}
+        for field in INDEXED_FIELDS.get(collection, ()):
+            column = field.replace('.', '__')
+            if column not in columns:
+                conn.execute(
+                    f'ALTER TABLE "{collection}" ADD COLUMN "{column}" '
+                    f"GENERATED ALWAYS AS (json_extract(doc, '$.{field}')) VIRTUAL"
+                )
+            unique = 'UNIQUE ' if field in UNIQUE_FIELDS else ''
+            conn.execute(f'CREATE {unique}INDEX IF NOT EXISTS "{collection}_{column}" ON "{collection}" ("{column}")')
+        self._tables.add(collection)
+        return conn
+
+    def _expr(self, collection: str, field: str, date: bool = False) -> str:
+        if not _FIELD_PATH.match(field):
+            raise ValueError(f"Invalid field path {field!r}")
+        if field == 'id':
+            return 'id'
+        if not date and field in INDEXED_FIELDS.get(collection, ()):
+            return f'"{field.replace(".", "__")}"'
+        suffix = '."$date"' if date else ''
+        return f"json_extract(doc, '$.{field}{suffix}')"
+
+    def _where(self, collection: str, query: dict):
+        """Split a query into SQL clauses and a residual evaluated in Python"""
+        clauses, params, residual = [], [], {}
+        for field, condition in query.items():
+            if not _is_operator_dict(condition):
+                if not _sql_scalar(condition):
+                    residual[field] = condition
+                elif condition is None:
+                    clauses.append(f"{self._expr(collection, field)} IS NULL")
+                else:
+                    clauses.append(f"{self._expr(collection, field, isinstance(condition, datetime))} = ?")
+                    params.append(_sql_value(condition))
+                continue
+            parts, part_params = [], []
+            for op, operand in condition.items():
+                if op in _SQL_COMPARISONS and _sql_scalar(operand) and operand is not None:
+                    parts.append(f"{self._expr(collection, field, isinstance(operand, datetime))} {_SQL_COMPARISONS[op]} ?")
+                    part_params.append(_sql_value(operand))
+                elif op == '$in' and all(_sql_scalar(v) and v is not None and not isinstance(v, datetime) for v in operand):
+                    parts.append(f"{self._expr(collection, field)} IN ({','.join('?' * len(operand))})" if operand else '0')
+                    part_params.extend(_sql_value(v) for v in operand)
+                else:
+                    parts = None
+                    break
+            if parts is None:
+                residual[field] = condition
+            else:
+                clauses.extend(parts)
+                params.extend(part_params)
+        return clauses, params, residual
+
+    def _select_sql(self, collection: str, query: dict, sort=None, limit=None):
+        """SELECT for a query, its parameters and the residual filter left to Python"""
+        clauses, params, residual = self._where(collection, query)
+        sql = f'SELECT id, doc FROM "{collection}"'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        if not residual:
+            if sort:
+                sql += ' ORDER BY ' + ', '.join(
+                    f"{self._expr(collection, field)} {'DESC' if direction < 0 else 'ASC'}" for field, direction in sort
+                )
+            if limit:
+                sql += f' LIMIT {int(limit)}'
+        return sql, params, residual
+
+    def _select(self, collection: str, query: dict, sort=None, limit=None) -> list:
+        conn = self._table(collection)
+        sql, params, residual = self._select_sql(collection, query or {}, sort, limit)
+        if not residual:
+            return [(doc_id, loads_ext(doc)) for doc_id, doc in conn.execute(sql, params)]
+
+        rows = [(doc_id, document) for doc_id, document in
+                ((doc_id, loads_ext(doc)) for doc_id, doc in conn.execute(sql, params))
+                if matches(document, residual)]
+        if sort:
+            order = sort_documents([document for _, document in rows], sort)
+            position = {id(document): i for i, document in enumerate(order)}
+            rows.sort(key=lambda row: position[id(row[1])])
+        return rows[:limit] if limit else rows
+
+    def _write(self, collection: str, fn):
+        conn = self._table(collection)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return result
+
+    def stats(self) -> dict:
+        return {"engine": self.name, "path": self.path, "tables": sorted(self._tables)}
+
+    async def connect(self):
+        await self._run(self._db)
+
+    async def ensure_indexes(self):
+        def create():
+            for collection in INDEXED_FIELDS:
+                self._table(collection)
+        await self._run(create)
+
+    async def close(self):
+        def close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await self._run(close)
+        self._executor.shutdown(wait=False)
+
+    async def explain(self, collection, query, sort=None):
+        def plan():
+            conn = self._table(collection)
+            sql, params, residual = self._select_sql(collection, query or {}, sort)
+            rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+            return {"plan": "; ".join(row[-1] for row in rows), "python_filter": sorted(residual)}
+        return await self._run(plan)
+
+    async def find(self, collection, query=None, projection=None, sort=None, limit=1000, profile='default'):
+        rows = await self._run(self._select, collection, query, sort, limit)
+        return [project(document, projection) for _, document in rows]
+
+    async def insert_one(self, collection, document, profile='default'):
+        doc_id = document.get('id') or str(uuid.uuid4())
+
+        def insert(conn):
+            conn.execute(f'INSERT INTO "{collection}" (id, doc) VALUES (?, ?)', (doc_id, dumps_ext(document)))
+            return WriteResult(inserted_id=doc_id)
+        return await self._run(self._write, collection, insert)
+
+    async def insert_many(self, collection, documents, profile='default'):
+        rows = [(doc.get('id') or str(uuid.uuid4()), dumps_ext(doc)) for doc in documents]
+
+        def insert(conn):
+            conn.executemany(f'INSERT INTO "{collection}" (id, doc) VALUES (?, ?)', rows)
+            return WriteResult()
+        return await self._run(self._write, collection, insert)
+
+    async def _update(self, collection, query, update, limit):
+        def update_rows(conn):
+            rows = self._select(collection, query, limit=limit)
+            modified = 0
+            for doc_id, document in rows:
+                if apply_update(document, update):
+                    conn.execute(f'UPDATE "{collection}" SET doc = ? WHERE id = ?', (dumps_ext(document), doc_id))
+                    modified += 1
+            return WriteResult(matched_count=len(rows), modified_count=modified)
+        return await self._run(self._write, collection, update_rows)
+
+    async def update_one(self, collection, query, update, profile='default'):
+        return await self._update(collection, query, update, 1)
+
+    async def update_many(self, collection, query, update, profile='default'):
+        return await self._update(collection, query, update, None)
+
+    async def _delete(self, collection, query, limit):
+        def delete_rows(conn):
+            ids = [doc_id for doc_id, _ in self._select(collection, query, limit=limit)]
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                conn.execute(f'DELETE FROM "{collection}" WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+            return WriteResult(deleted_count=len(ids))
+        return await self._run(self._write, collection, delete_rows)
+
+    async def delete_one(self, collection, query, profile='default'):
+        return await self._delete(collection, query, 1)
+
+    async def delete_many(self, collection, query, profile='default'):
+        return await self._delete(collection, query, None)
+
+    async def count(self, collection, query=None, profile='default'):
+        def count_rows():
+            conn = self._table(collection)
+            clauses, params, residual = self._where(collection, query or {})
+            if residual:
+                return len(self._select(collection, query))
+            sql = f'SELECT COUNT(*) FROM "{collection}"' + (' WHERE ' + ' AND '.join(clauses) if clauses else '')
+            return conn.execute(sql, params).fetchone()[0]
+        return await self._run(count_rows)
+
+    async def bulk_upsert(self, collection, documents, on_insert=None):
+        def upsert(conn):
+            upserted = 0
+            for document in documents:
+                row = conn.execute(f'SELECT doc FROM "{collection}" WHERE id = ?', (document["id"],)).fetchone()
+                if row:
+                    merged = {**loads_ext(row[0]), **document}
+                    conn.execute(f'UPDATE "{collection}" SET doc = ? WHERE id = ?', (dumps_ext(merged), document["id"]))
+                else:
+                    conn.execute(f'INSERT INTO "{collection}" (id, doc) VALUES (?, ?)',
+                                 (document["id"], dumps_ext({**(on_insert or {}), **document})))
+                    upserted += 1
+            return WriteResult(upserted_count=upserted)
+        return await self._run(self._write, collection, upsert)
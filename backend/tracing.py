@@ -0,0 +1,186 @@
+"""Lightweight request tracing.
+
+Each traced request gets a tree of spans. The current span lives in a context
+variable, so it follows the async call chain, including tasks and threads
+started from it (asyncio copies the context into new tasks and to_thread
+calls). Outside a traced request `span()` returns a shared no-op, so the
+instrumented helpers cost one context variable lookup when tracing is off.
+
+Finished traces go to an exporter: InMemoryExporter for tests and benchmarks,
+FileExporter for one JSON line per span.
+"""
+import contextvars
+import json
+import random
+import secrets
+import time
+from collections import deque
+from typing import Optional
+
+MAX_SPANS_PER_TRACE = 2000
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+class _NoopSpan:
+    """Stands in for a span when nothing is being traced"""
+    __slots__ = ()
+    trace_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+    def end(self, error: str = None):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class Trace:
+    __slots__ = ('trace_id', 'exporter', 'spans', 'dropped', 'start_ns', 'start_unix_us')
+
+    def __init__(self, trace_id: str, exporter):
+        self.trace_id = trace_id
+        self.exporter = exporter
+        self.spans = []
+        self.dropped = 0
+        self.start_ns = time.perf_counter_ns()
+        self.start_unix_us = time.time_ns() // 1000
+
+    def finished(self, span: 'Span', root: bool):
+        if len(self.spans) < MAX_SPANS_PER_TRACE:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+        if root:
+            self.exporter.export(self)
+
+class Span:
+    __slots__ = ('name', 'trace', 'span_id', 'parent_id', 'attributes', 'start_ns', 'end_ns', 'error', 'root', '_token')
+
+    def __init__(self, name: str, trace: Trace, parent_id: Optional[str], attributes: dict, root: bool = False):
+        self.name = name
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns = None
+        self.error = None
+        self.root = root
+        self._token = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        self.end(exc_type.__name__ if exc_type else None)
+        return False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, error: str = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.perf_counter_ns()
+        self.error = error
+        self.trace.finished(self, self.root)
+
+    def traceparent(self) -> str:
+        """W3C trace context header value, for propagating to upstream calls"""
+        return f"00-{self.trace.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_unix_us": self.trace.start_unix_us + (self.start_ns - self.trace.start_ns) // 1000,
+            "duration_us": (self.end_ns - self.start_ns) // 1000 if self.end_ns is not None else None,
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+def parse_traceparent(header: Optional[str]):
+    """(trace id, parent span id) from a W3C traceparent header, or (None, None)"""
+    parts = (header or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None, None
+    return parts[1], parts[2]
+
+class Tracer:
+    def __init__(self, exporter=None, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def trace(self, name: str, traceparent: str = None, **attributes):
+        """Root span of a new trace (continuing an upstream one when given)"""
+        if self.exporter is None or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return NOOP_SPAN
+        trace_id, parent_id = parse_traceparent(traceparent)
+        trace = Trace(trace_id or secrets.token_hex(16), self.exporter)
+        return Span(name, trace, parent_id, attributes, root=True)
+
+    def span(self, name: str, **attributes):
+        """Child of the current span
+
+        Use it as a context manager, which makes it current for the block. Around
+        an async generator, whose body runs in the consumer's context, call end()
+        on it instead so it never becomes current.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(name, parent.trace, parent.span_id, attributes)
+
+    def current_span(self):
+        return _current_span.get() or NOOP_SPAN
+
+class InMemoryExporter:
+    """Keeps the most recent finished traces as span dicts"""
+
+    def __init__(self, max_traces: int = 1000):
+        self.traces = deque(maxlen=max_traces)
+
+    def export(self, trace: Trace):
+        self.traces.append([span.to_dict() for span in trace.spans])
+
+    def spans(self, name: str = None) -> list:
+        return [span for trace in self.traces for span in trace if name is None or span["name"] == name]
+
+    def clear(self):
+        self.traces.clear()
+
+class FileExporter:
+    """Appends one JSON line per span"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def export(self, trace: Trace):
+        self._file.write(''.join(json.dumps(span.to_dict(), default=str) + '\n' for span in trace.spans))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
@@ -183,18 +183,6 @@ const AuthProvider = ({ children }) => {
 function App() {
   const [currentTheme, setCurrentTheme] = useState('classic');
 
-  // Initialize templates on app start
-  useEffect(() => {
-    const initTemplates = async () => {
-      try {
-        await axios.post(`${API}/init-templates`);
-      } catch (error) {
-        console.error('Failed to initialize templates:', error);
-      }
-    };
-    initTemplates();
-  }, []);
-
   return (
     <AuthProvider>
       <ThemeProvider theme={themes[currentTheme]}>
@@ -292,6 +292,7 @@ const DashboardPage = () => {
   const { user } = useAuth();
   const navigate = useNavigate();
   const [invitations, setInvitations] = useState([]);
+  const [stats, setStats] = useState({});
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -303,14 +304,67 @@ const DashboardPage = () => {
     fetchInvitations();
   }, [user, navigate]);
 
+  // RSVPs and views are pushed by the server instead of re-fetching the list
+  useEffect(() => {
+    if (!user || invitations.length === 0) return;
+    let source = null;
+    let retry = null;
+    let closed = false;
+
+    const handleMessage = (message) => {
+      const event = JSON.parse(message.data);
+      if (event.type === 'snapshot') {
+        setStats(event.stats);
+      } else if (event.delta) {
+        setStats(prev => {
+          const current = { ...(prev[event.invitation_id] || {}) };
+          Object.entries(event.delta).forEach(([name, value]) => {
+            current[name] = (current[name] || 0) + value;
+          });
+          return { ...prev, [event.invitation_id]: current };
+        });
+      }
+    };
+
+    // EventSource can't send headers, so each connection redeems a single-use ticket
+    const connect = async () => {
+      try {
+        const response = await axios.post(`${API}/invitations/events/ticket`, null, {
+          headers: {
+            'Authorization': `Bearer ${localStorage.getItem('session_token')}`
+          }
+        });
+        if (closed) return;
+        source = new EventSource(`${API}/invitations/events?ticket=${encodeURIComponent(response.data.ticket)}`);
+        source.onmessage = handleMessage;
+        source.onerror = () => {
+          // The browser would retry with the spent ticket; reconnect with a new one
+          source.close();
+          if (!closed) retry = setTimeout(connect, 5000);
+        };
+      } catch (error) {
+        if (!closed) retry = setTimeout(connect, 5000);
+      }
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      if (source) source.close();
+    };
+  }, [user, invitations.length]);
+
   const fetchInvitations = async () => {
     try {
-      const response = await axios.get(`${API}/invitations`, {
+      // One request for the invitations, their templates and their counters
+      const response = await axios.get(`${API}/dashboard`, {
         headers: {
           'Authorization': `Bearer ${localStorage.getItem('session_token')}`
         }
       });
-      setInvitations(response.data);
+      setInvitations(response.data.invitations);
+      setStats(Object.fromEntries(response.data.invitations.map(invitation => [invitation.id, invitation.stats])));
     } catch (error) {
       console.error('Failed to fetch invitations:', error);
     } finally {
@@ -467,8 +521,16 @@ const DashboardPage = () => {
                     </InvitationTitle>
                     <InvitationMeta>
                       Created {new Date(invitation.created_at).toLocaleDateString()}
+                      {invitation.template && ` · ${invitation.template.name} (${invitation.template.theme})`}
                       <br />
                       {invitation.invitation_data.venue_name}
+                      {stats[invitation.id] && (
+                        <>
+                          <br />
+                          {stats[invitation.id].views || 0} views · {stats[invitation.id].rsvp_attending || 0} attending
+                          ({stats[invitation.id].guests || 0} guests) · {stats[invitation.id].rsvp_declined || 0} declined
+                        </>
+                      )}
                     </InvitationMeta>
                     
                     <InvitationActions>
@@ -424,7 +424,7 @@ const LandingPage = () => {
                   viewport={{ once: true }}
                 >
                   <Link to={`/templates/${template.id}`}>
-                    <TemplateImage src={template.preview_url} />
+                    <TemplateImage src={`${BACKEND_URL}${template.preview_url}`} />
                     <TemplateInfo>
                       <TemplateTitle>{template.name}</TemplateTitle>
                       <TemplateDescription>{template.description}</TemplateDescription>
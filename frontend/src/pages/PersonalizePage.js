@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate, Link } from 'react-router-dom';
 import styled from 'styled-components';
 import { motion } from 'framer-motion';
@@ -8,6 +8,7 @@ import { useAuth } from '../App';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const PREVIEW_SOCKET_URL = `${API.replace(/^http/, 'ws')}/preview/ws`;
 
 const PageContainer = styled.div`
   min-height: 100vh;
@@ -284,6 +285,92 @@ const PersonalizePage = () => {
     additional_message: ''
   });
 
+  // Server-rendered preview: only changed fields are sent, and the reply is either
+  // the full HTML or patches for the placeholder slots that changed
+  const previewRef = useRef(null);
+  const previewSocketRef = useRef(null);
+  const previewIdRef = useRef(null);
+  const sentDataRef = useRef({});
+  const latestDataRef = useRef(formData);
+  const previewSeqRef = useRef(0);
+  latestDataRef.current = formData;
+
+  const applyPreview = (result) => {
+    if (!previewRef.current || result.error) return;
+    if (result.html !== undefined) {
+      previewRef.current.innerHTML = result.html;
+    }
+    (result.patches || []).forEach(({ slot, html }) => {
+      previewRef.current.querySelectorAll(`[data-slot="${slot}"]`).forEach(el => {
+        el.innerHTML = html;
+      });
+    });
+  };
+
+  // HTTP fallback. The full form is sent so an expired preview_id still renders
+  // correctly; the server diffs it against the previous render either way.
+  const renderPreviewOverHttp = async (data) => {
+    try {
+      const response = await axios.post(`${API}/preview`, {
+        template_id: templateId,
+        preview_id: previewIdRef.current,
+        invitation_data: data
+      });
+      previewIdRef.current = response.data.preview_id;
+      sentDataRef.current = data;
+      applyPreview(response.data);
+    } catch (error) {
+      console.error('Failed to render preview:', error);
+    }
+  };
+
+  useEffect(() => {
+    if (!template) return;
+    const socket = new WebSocket(PREVIEW_SOCKET_URL);
+    socket.onmessage = (event) => applyPreview(JSON.parse(event.data));
+    socket.onopen = () => {
+      // A new channel starts from a full render of the current form
+      const data = latestDataRef.current;
+      socket.send(JSON.stringify({ template_id: templateId, invitation_data: data, seq: ++previewSeqRef.current }));
+      sentDataRef.current = data;
+    };
+    socket.onclose = () => {
+      // Unmounting clears the ref first, so only unexpected closes fall back
+      if (previewSocketRef.current !== socket) return;
+      previewSocketRef.current = null;
+      renderPreviewOverHttp(latestDataRef.current);
+    };
+    previewSocketRef.current = socket;
+    return () => {
+      previewSocketRef.current = null;
+      socket.close();
+    };
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [template, templateId]);
+
+  useEffect(() => {
+    if (!template) return;
+    const changes = {};
+    Object.keys(formData).forEach(key => {
+      if (JSON.stringify(formData[key]) !== JSON.stringify(sentDataRef.current[key])) {
+        changes[key] = formData[key];
+      }
+    });
+    if (Object.keys(changes).length === 0) return;
+
+    const socket = previewSocketRef.current;
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      socket.send(JSON.stringify({ invitation_data: changes, seq: ++previewSeqRef.current }));
+      sentDataRef.current = formData;
+      return;
+    }
+    if (socket && socket.readyState === WebSocket.CONNECTING) return;
+
+    const timer = setTimeout(() => renderPreviewOverHttp(formData), 150);
+    return () => clearTimeout(timer);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [formData, template, templateId]);
+
   useEffect(() => {
     if (!user) {
       navigate('/login', { state: { returnTo: `/personalize/${templateId}` } });
@@ -364,32 +451,10 @@ const PersonalizePage = () => {
   const renderPreview = () => {
     if (!template) return null;
 
-    const eventsHtml = formData.events
-      .filter(event => event.name && event.time)
-      .map(event => `<p>${event.name} - ${event.time}</p>`)
-      .join('');
-
-    const previewData = {
-      bride_name: formData.bride_name || 'Bride Name',
-      groom_name: formData.groom_name || 'Groom Name',
-      wedding_date: formData.wedding_date || 'Wedding Date',
-      wedding_time: formData.wedding_time || 'Time',
-      venue_name: formData.venue_name || 'Venue Name',
-      venue_address: formData.venue_address || 'Venue Address',
-      events: eventsHtml || '<p>Event Details</p>',
-      qr_code: '<div style="width: 120px; height: 120px; background: #f0f0f0; border-radius: 10px; display: flex; align-items: center; justify-content: center; margin: 1rem auto; font-size: 0.8rem; color: #666;">QR Code</div>'
-    };
-
-    let htmlContent = template.html_content;
-    Object.keys(previewData).forEach(key => {
-      const regex = new RegExp(`{{${key}}}`, 'g');
-      htmlContent = htmlContent.replace(regex, previewData[key]);
-    });
-
     return (
       <TemplatePreview
         css={template.css_content}
-        dangerouslySetInnerHTML={{ __html: htmlContent }}
+        ref={previewRef}
       />
     );
   };
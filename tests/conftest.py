@@ -0,0 +1,67 @@
+"""Shared fixtures: the backend app on the in-memory storage engine"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+_scratch = tempfile.mkdtemp(prefix="wedding-invitations-tests-")
+os.environ.setdefault("STORAGE_ENGINE", "memory")
+os.environ.setdefault("MONGO_URL", "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=300")
+os.environ.setdefault("SNAPSHOT_DIR", os.path.join(_scratch, "snapshots"))
+os.environ.setdefault("THUMBNAIL_DIR", os.path.join(_scratch, "thumbnails"))
+os.environ.setdefault("PROFILING_TOKEN", "test-profiling-token")  # installs the profiling middleware
+
+import server  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(server.app) as client:
+        yield client
+
+
+@pytest.fixture
+def login(client):
+    """Create a user with a session; returns (user, auth headers)"""
+    def login(premium: bool = False):
+        async def create():
+            user = server.User(email=f"{uuid.uuid4().hex[:12]}@example.com", name="Test User", premium=premium)
+            await server.db_insert_one('users', user.dict())
+            return user, await server.create_session(user)
+        user, token = client.portal.call(create)
+        return user, {"Authorization": f"Bearer {token}"}
+    return login
+
+
+SAMPLE_INVITATION_DATA = {
+    "bride_name": "Ana",
+    "groom_name": "Ben",
+    "wedding_date": "2027-06-12",
+    "wedding_time": "16:00",
+    "venue_name": "Rose Garden",
+    "venue_address": "1 Garden Lane",
+}
+
+
+@pytest.fixture
+def create_invitation(client):
+    """Create an invitation for the given auth headers; returns its JSON"""
+    def create_invitation(headers, template_id: str = "classic-elegance", **data):
+        response = client.post(
+            "/api/invitations", headers=headers,
+            json={"template_id": template_id, "invitation_data": {**SAMPLE_INVITATION_DATA, **data}}
+        )
+        assert response.status_code == 200, response.text
+        return response.json()
+    return create_invitation
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,55 @@
+import json
+
+import server
+
+
+def export_lines(response):
+    assert response.status_code == 200, response.text
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_cursor_resumes_after_last_document(client, login, create_invitation):
+    _, headers = login()
+    for _ in range(5):
+        create_invitation(headers)
+    
+    lines = export_lines(client.get("/api/export", headers=headers))
+    documents = [line for line in lines if line["type"] == "document"]
+    assert len(documents) == 5
+    assert lines[-1] == {"type": "end", "counts": {"invitations": 5, "templates": 0, "payment_transactions": 0}}
+    
+    resumed = export_lines(client.get("/api/export", headers=headers, params={"cursor": documents[1]["cursor"]}))
+    assert [line["data"]["id"] for line in resumed if line["type"] == "document"] == \
+        [document["data"]["id"] for document in documents[2:]]
+
+
+def test_invalid_cursor(client, login):
+    _, headers = login()
+    assert client.get("/api/export", headers=headers, params={"cursor": "zzz"}).status_code == 400
+
+
+def test_resumes_do_not_count_against_the_rate_limit(client, login, create_invitation):
+    _, headers = login()
+    create_invitation(headers)
+    burst = int(server.RATE_LIMIT_POLICIES["account_export"].burst)
+    
+    cursor = export_lines(client.get("/api/export", headers=headers))[0]["cursor"]
+    for _ in range(burst + 2):
+        assert client.get("/api/export", headers=headers, params={"cursor": cursor}).status_code == 200
+    
+    for _ in range(burst - 1):
+        assert client.get("/api/export", headers=headers).status_code == 200
+    response = client.get("/api/export", headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_cursor_from_another_users_export_counts_as_new(client, login, create_invitation):
+    _, owner = login()
+    _, other = login()
+    create_invitation(owner)
+    cursor = export_lines(client.get("/api/export", headers=owner))[0]["cursor"]
+    
+    burst = int(server.RATE_LIMIT_POLICIES["account_export"].burst)
+    statuses = [client.get("/api/export", headers=other, params={"cursor": cursor}).status_code for _ in range(burst + 1)]
+    assert statuses[-1] == 429
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_single_flight_shares_one_call():
+    flight = server.SingleFlight()
+    calls = 0
+    release = asyncio.Event()
+    
+    async def load():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "value"
+    
+    waiters = [asyncio.ensure_future(flight.do("key", load)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*waiters) == ["value"] * 5
+    assert calls == 1
+
+
+async def test_single_flight_propagates_errors_and_forgets_them():
+    flight = server.SingleFlight()
+    attempts = 0
+    
+    async def fail():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0)
+        raise RuntimeError("boom")
+    
+    results = await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert attempts == 1
+    
+    # The failure is not cached: the next call runs again
+    with pytest.raises(RuntimeError):
+        await flight.do("key", fail)
+    assert attempts == 2
+
+
+async def test_single_flight_survives_a_cancelled_caller():
+    flight = server.SingleFlight()
+    release = asyncio.Event()
+    
+    async def load():
+        await release.wait()
+        return "value"
+    
+    first = asyncio.ensure_future(flight.do("key", load))
+    second = asyncio.ensure_future(flight.do("key", load))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+    assert await second == "value"
+
+
+def controller(capacity: int = 4):
+    return server.AdmissionController(capacity, [
+        server.AdmissionClass('guest', 0, '4/8', 1.0, 1.0, 1),
+        server.AdmissionClass('bulk', 3, '2/2', 0.5, 1.0, 30),
+    ])
+
+
+async def test_admission_queues_within_class_limit():
+    admission = controller()
+    bulk = admission.classes['bulk']
+    assert await admission.acquire(bulk)
+    assert await admission.acquire(bulk)
+    
+    queued = asyncio.ensure_future(admission.acquire(bulk))
+    await asyncio.sleep(0)
+    assert admission.stats()["classes"]["bulk"]["waiting"] == 1
+    admission.release(bulk)
+    assert await queued is True
+    assert bulk.in_flight == 2
+
+
+async def test_admission_sheds_when_queue_is_full():
+    admission = controller()
+    bulk = admission.classes['bulk']
+    for _ in range(2):
+        assert await admission.acquire(bulk)
+    waiting = [asyncio.ensure_future(admission.acquire(bulk)) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert await admission.acquire(bulk) is False
+    assert bulk.shed == 1
+    for waiter in waiting:
+        waiter.cancel()
+
+
+async def test_admission_sheds_lower_priority_for_starved_higher_priority():
+    admission = controller(capacity=2)
+    guest, bulk = admission.classes['guest'], admission.classes['bulk']
+    assert await admission.acquire(guest)
+    assert await admission.acquire(guest)  # shared capacity exhausted
+    
+    bulk_waiter = asyncio.ensure_future(admission.acquire(bulk))
+    guest_waiter = asyncio.ensure_future(admission.acquire(guest))
+    await asyncio.sleep(0)
+    assert await bulk_waiter is False  # shed in favour of the queued guest
+    
+    admission.release(guest)
+    assert await guest_waiter is True
+    assert admission.in_flight == 2
+
+
+async def test_admission_times_out_queued_requests():
+    admission = server.AdmissionController(1, [server.AdmissionClass('bulk', 3, '1/4', 1.0, 0.01, 30)])
+    bulk = admission.classes['bulk']
+    assert await admission.acquire(bulk)
+    assert await admission.acquire(bulk) is False
+    assert bulk.shed == 1 and not bulk.queue
+
+
+def test_admission_middleware_returns_503_with_retry_after(client, monkeypatch):
+    busy = server.AdmissionController(1, [server.AdmissionClass('default', 1, '0/0', 1.0, 0, 7)])
+    monkeypatch.setattr(server, "admission", busy)
+    response = client.get("/api/templates")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+    assert client.get("/api/health/live").status_code == 200  # probes bypass admission
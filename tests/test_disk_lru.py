@@ -0,0 +1,70 @@
+import os
+
+import disk_lru
+from disk_lru import DiskLRUCache
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=25)
+    cache.put("a", b"a" * 10)
+    cache.put("b", b"b" * 10)
+    assert cache.get("a")
+    cache.put("c", b"c" * 10)
+    assert sorted(os.listdir(tmp_path)) == ["a", "c"]
+    assert cache.stats()["bytes"] == 20
+    assert cache.stats()["evictions"] == 1
+
+
+def test_overwrite_replaces_size(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=100)
+    cache.put("a", b"a" * 10)
+    cache.put("a", b"a" * 30)
+    assert cache.stats()["bytes"] == 30
+    assert cache.stats()["entries"] == 1
+
+
+def test_index_is_rebuilt_from_disk_at_startup(tmp_path):
+    for age, name in enumerate(["newest", "middle", "oldest"]):
+        path = tmp_path / name
+        path.write_bytes(b"x" * 10)
+        os.utime(path, (1000 - age, 1000 - age))
+    (tmp_path / ".tmp-partial").write_bytes(b"x" * 50)
+    
+    cache = DiskLRUCache(str(tmp_path), max_bytes=30)
+    assert cache.stats()["bytes"] == 30
+    cache.put("new", b"y" * 10)
+    assert not (tmp_path / "oldest").exists()
+    assert (tmp_path / "middle").exists()
+
+
+def test_puts_do_not_scan_the_directory(tmp_path, monkeypatch):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=15)
+    
+    def scandir(path):
+        raise AssertionError("directory scanned")
+    monkeypatch.setattr(disk_lru.os, "scandir", scandir)
+    for name in "abcd":
+        cache.put(name, b"x" * 10)
+    assert os.listdir(tmp_path) == ["d"]
+
+
+def test_files_deleted_by_another_worker(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=100)
+    cache.put("a", b"a" * 10)
+    cache.put("b", b"b" * 10)
+    os.unlink(tmp_path / "a")
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 10
+    
+    # An unlink during eviction that finds the file gone is not an error
+    os.unlink(tmp_path / "b")
+    cache.max_bytes = 5
+    cache.put("c", b"c" * 5)
+    assert os.listdir(tmp_path) == ["c"]
+    assert cache.stats()["bytes"] == 5
+
+
+def test_missing_directory_is_created_on_first_put(tmp_path):
+    cache = DiskLRUCache(str(tmp_path / "thumbnails"), max_bytes=100)
+    assert cache.stats()["entries"] == 0
+    assert cache.put("a", b"a") == str(tmp_path / "thumbnails" / "a")
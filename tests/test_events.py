@@ -0,0 +1,77 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+import server
+
+
+def mint_ticket(client, headers) -> str:
+    response = client.post("/api/invitations/events/ticket", headers=headers)
+    assert response.status_code == 200
+    return response.json()["ticket"]
+
+
+def test_ticket_requires_session(client):
+    assert client.post("/api/invitations/events/ticket").status_code == 401
+
+
+def test_ticket_opens_one_stream(client, login, create_invitation):
+    _, headers = login()
+    invitation = create_invitation(headers)
+    ticket = mint_ticket(client, headers)
+    
+    with client.websocket_connect(f"/api/invitations/events/ws?ticket={ticket}") as websocket:
+        snapshot = websocket.receive_json()
+        assert snapshot["type"] == "snapshot"
+        assert set(snapshot["stats"]) == {invitation["id"]}
+    
+    # Spent
+    with pytest.raises(WebSocketDisconnect) as disconnect:
+        with client.websocket_connect(f"/api/invitations/events/ws?ticket={ticket}") as websocket:
+            websocket.receive_json()
+    assert disconnect.value.code == 4401
+    assert client.get(f"/api/invitations/events?ticket={ticket}").status_code == 401
+
+
+def test_session_token_in_url_is_refused(client, login):
+    _, headers = login()
+    token = headers["Authorization"].split(" ", 1)[1]
+    assert client.get(f"/api/invitations/events?token={token}").status_code == 401
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(f"/api/invitations/events/ws?token={token}") as websocket:
+            websocket.receive_json()
+
+
+
+def test_concurrent_redeems_of_one_ticket(client, login):
+    _, headers = login()
+    ticket = mint_ticket(client, headers)
+    
+    async def redeem_all():
+        return await asyncio.gather(*(server.redeem_stream_ticket(ticket) for _ in range(8)))
+    users = client.portal.call(redeem_all)
+    assert sum(user is not None for user in users) == 1
+
+
+@pytest.mark.anyio
+async def test_pop_across_workers_succeeds_once():
+    path = os.path.join(tempfile.mkdtemp(), "cache.sock")
+    backends = [server.UnixSocketCacheBackend(path, 64) for _ in range(2)]
+    caches = [server.TwoLevelCache(backend, 16, ttl=60) for backend in backends]
+    for backend in backends:
+        await backend.start()
+    try:
+        while not all(backend.stats()["connected"] for backend in backends):
+            await asyncio.sleep(0.01)
+        # Both workers hold a local copy, as after a set and a read
+        await caches[0].set("ticket", {"id": "u1"})
+        while await caches[1].get("ticket") is None:
+            await asyncio.sleep(0.01)
+        results = await asyncio.gather(*(cache.pop("ticket") for cache in caches * 4))
+        assert [value for value in results if value is not None] == [{"id": "u1"}]
+    finally:
+        for backend in backends:
+            await backend.close()
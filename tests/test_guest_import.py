@@ -0,0 +1,63 @@
+import pytest
+from fastapi import HTTPException
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def lines_of(text: str):
+    for line in text.split('\n'):
+        yield line
+
+
+async def csv_rows(text: str):
+    return [row async for row in server.iter_csv_guest_rows(lines_of(text))]
+
+
+async def test_csv_header_aliases_and_unknown_columns():
+    rows = await csv_rows("Full Name,E-mail,Guests,Email\nAna,x,2,ana@example.com")
+    assert rows == [(1, {"name": "Ana", "party_size": "2", "email": "ana@example.com"}, None)]
+
+
+async def test_csv_quoted_field_spanning_lines():
+    rows = await csv_rows('name,notes\n"Smith, Ana","line one\nline two"\nBen,')
+    assert [fields["name"] for _, fields, _ in rows] == ["Smith, Ana", "Ben"]
+    assert [row_number for row_number, _, _ in rows] == [1, 2]
+
+
+async def test_csv_blank_and_overlong_rows():
+    async def lines():
+        for line in ("name", "Ana", "", None, "Ben"):
+            yield line
+    
+    rows = [row async for row in server.iter_csv_guest_rows(lines())]
+    assert rows == [(1, {"name": "Ana"}, None), (2, None, None), (3, None, "Row is too long"), (4, {"name": "Ben"}, None)]
+
+
+async def test_csv_requires_a_name_column():
+    with pytest.raises(HTTPException) as error:
+        await csv_rows("email\nana@example.com")
+    assert error.value.status_code == 400
+
+
+async def test_ndjson_rows():
+    rows = [row async for row in server.iter_ndjson_guest_rows(lines_of('{"name": "Ana"}\n[1]\n{oops\n'))]
+    assert rows == [(1, {"name": "Ana"}, None), (2, None, "Expected a JSON object"), (3, None, "Invalid JSON"), (4, None, None)]
+
+
+def test_import_endpoint_reports_rejected_rows(client, login, create_invitation):
+    _, headers = login()
+    invitation = create_invitation(headers)
+    response = client.post(
+        f"/api/invitations/{invitation['id']}/guests/import", headers={**headers, "Content-Type": "text/csv"},
+        content="name,party size\nAna,2\n,1\nBen,99\nCara,1\n"
+    )
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert (result["imported"], result["skipped"]) == (2, 2)
+    assert [error["row"] for error in result["errors"]] == [2, 3]
+    
+    guests = client.get(f"/api/invitations/{invitation['id']}/guests", headers=headers).json()
+    assert [guest["name"] for guest in guests] == ["Ana", "Cara"]
+    assert all(guest["link"].endswith(f"/i/{invitation['url_slug']}?g={guest['token']}") for guest in guests)
@@ -0,0 +1,62 @@
+def test_patch_bumps_version_and_records_history(client, login, create_invitation):
+    _, headers = login()
+    invitation = create_invitation(headers)
+    assert invitation["version"] == 1
+    
+    response = client.patch(
+        f"/api/invitations/{invitation['id']}", headers=headers,
+        json={"invitation_data": {"venue_name": "Lake House"}, "version": 1}
+    )
+    assert response.status_code == 200
+    updated = response.json()
+    assert updated["version"] == 2
+    assert updated["invitation_data"]["venue_name"] == "Lake House"
+    assert updated["url_slug"] == invitation["url_slug"]
+    
+    history = client.get(f"/api/invitations/{invitation['id']}/history", headers=headers).json()
+    assert [revision["version"] for revision in history] == [2]
+    assert history[0]["changes"] == {"invitation_data.venue_name": ["Rose Garden", "Lake House"]}
+
+
+def test_patch_with_stale_version_conflicts(client, login, create_invitation):
+    _, headers = login()
+    invitation = create_invitation(headers)
+    url = f"/api/invitations/{invitation['id']}"
+    assert client.patch(url, headers=headers, json={"invitation_data": {"venue_name": "A"}, "version": 1}).status_code == 200
+    
+    response = client.patch(url, headers=headers, json={"invitation_data": {"venue_name": "B"}, "version": 1})
+    assert response.status_code == 409
+    assert client.get(url, headers=headers).json()["invitation_data"]["venue_name"] == "A"
+
+
+def test_unchanged_patch_keeps_version(client, login, create_invitation):
+    _, headers = login()
+    invitation = create_invitation(headers)
+    response = client.patch(
+        f"/api/invitations/{invitation['id']}", headers=headers,
+        json={"invitation_data": {"venue_name": "Rose Garden"}}
+    )
+    assert response.json()["version"] == 1
+    assert client.get(f"/api/invitations/{invitation['id']}/history", headers=headers).json() == []
+
+
+def test_patch_invalid_merge_returns_structured_errors(client, login, create_invitation):
+    _, headers = login()
+    invitation = create_invitation(headers)
+    response = client.patch(
+        f"/api/invitations/{invitation['id']}", headers=headers,
+        json={"invitation_data": {"bride_name": None}}
+    )
+    assert response.status_code == 422
+    errors = response.json()["detail"]
+    assert isinstance(errors, list)
+    assert errors[0]["loc"] == ["body", "invitation_data", "bride_name"]
+    assert "url" not in errors[0]
+
+
+def test_patch_other_users_invitation_is_not_found(client, login, create_invitation):
+    _, owner = login()
+    _, other = login()
+    invitation = create_invitation(owner)
+    response = client.patch(f"/api/invitations/{invitation['id']}", headers=other, json={"is_published": False})
+    assert response.status_code == 404
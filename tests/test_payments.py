@@ -0,0 +1,25 @@
+import pytest
+
+import server
+
+
+@pytest.fixture
+def unconfigured(monkeypatch):
+    monkeypatch.setattr(server, "stripe_api_key", None)
+    monkeypatch.setattr(server, "_stripe_checkout", None)
+
+
+def test_checkout_status_without_stripe_key(client, unconfigured):
+    response = client.get("/api/payments/checkout/status/abc")
+    assert response.status_code == 503
+    assert response.json()["detail"] == "Payments are not configured"
+
+
+def test_checkout_session_without_stripe_key(client, unconfigured):
+    response = client.post("/api/payments/checkout/session", json={"host_url": "http://localhost:3000"})
+    assert response.status_code == 503
+
+
+def test_webhook_without_stripe_key(client, unconfigured):
+    response = client.post("/api/webhook/stripe", content=b"{}")
+    assert response.status_code == 503
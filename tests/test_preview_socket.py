@@ -0,0 +1,22 @@
+import pytest
+
+
+@pytest.mark.parametrize("payload", ["[1, 2]", "42", "\"text\"", "{not json"])
+def test_malformed_message_gets_error_frame(client, payload):
+    with client.websocket_connect("/api/preview/ws") as websocket:
+        websocket.send_text(payload)
+        reply = websocket.receive_json()
+        assert reply["seq"] is None
+        assert reply["error"]
+        
+        # The socket stays usable
+        websocket.send_json({"template_id": "classic-elegance", "invitation_data": {"bride_name": "Ana"}, "seq": 1})
+        reply = websocket.receive_json()
+        assert reply["seq"] == 1
+        assert "error" not in reply
+
+
+def test_unknown_template(client):
+    with client.websocket_connect("/api/preview/ws") as websocket:
+        websocket.send_json({"template_id": "no-such-template", "seq": 7})
+        assert websocket.receive_json() == {"seq": 7, "error": "Template not found"}
@@ -0,0 +1,24 @@
+import pytest
+
+import server
+
+
+@pytest.fixture
+def profiling_token(monkeypatch):
+    monkeypatch.setattr(server, "PROFILE_SAMPLE_RATE", 0)
+    return server.PROFILING_TOKEN
+
+
+@pytest.mark.parametrize("token", [b"caf\xe9", b"wrong"])
+def test_bad_token_is_refused(client, profiling_token, token):
+    response = client.get("/api/templates", headers={"X-Profile-Token": token})
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    assert client.get("/api/debug/profiles", headers={"X-Profile-Token": token}).status_code == 403
+
+
+def test_valid_token_profiles_the_request(client, profiling_token):
+    response = client.get("/api/templates", headers={"X-Profile-Token": profiling_token})
+    assert response.status_code == 200
+    assert "x-profile-id" in response.headers
+    assert client.get("/api/debug/profiles", headers={"X-Profile-Token": profiling_token}).status_code == 200
@@ -0,0 +1,50 @@
+import asyncio
+
+import server
+
+
+def test_public_read_sees_edit_and_unpublish(client, login, create_invitation):
+    _, headers = login()
+    invitation = create_invitation(headers)
+    url = f"/api/invitations/{invitation['id']}"
+    public_url = f"/api/public/invitations/{invitation['url_slug']}"
+    assert client.patch(url, headers=headers, json={"is_published": True}).status_code == 200
+    assert client.get(public_url).status_code == 200  # cached from here on
+    
+    client.patch(url, headers=headers, json={"invitation_data": {"venue_name": "Lake House"}})
+    assert client.get(public_url).json()["invitation"]["invitation_data"]["venue_name"] == "Lake House"
+    
+    client.patch(url, headers=headers, json={"is_published": False})
+    assert client.get(public_url).status_code == 404
+
+
+def test_reads_after_invalidation_use_the_primary(client, monkeypatch):
+    profiles = []
+    
+    async def find_one(collection, query, coalesce=True, profile='default', **kwargs):
+        profiles.append(profile)
+        return {"url_slug": query["url_slug"], "is_published": True}
+    
+    monkeypatch.setattr(server, "db_find_one", find_one)
+    
+    async def scenario():
+        await server.get_published_invitation_doc("settle-test")
+        await server.cache.invalidate("invitation:slug:settle-test")
+        await server.get_published_invitation_doc("settle-test")
+    
+    client.portal.call(scenario)
+    assert profiles == ["public_read", "default"]
+
+
+def test_load_racing_an_invalidation_is_not_cached():
+    cache = server.TwoLevelCache(server.CacheBackend(), 16, ttl=60)
+    
+    async def scenario():
+        async def loader():
+            await cache.invalidate("key")  # the write lands while the old value is in flight
+            return {"value": "old"}
+        
+        assert await cache.get_or_load("key", loader) == {"value": "old"}
+        return await cache.get("key")
+    
+    assert asyncio.run(scenario()) is None
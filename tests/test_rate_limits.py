@@ -0,0 +1,46 @@
+import server
+
+
+def test_token_bucket_refills():
+    buckets = server.TokenBuckets(100)
+    assert buckets.take("k", rate=1.0, burst=2, now=0) == 0.0
+    assert buckets.take("k", rate=1.0, burst=2, now=0) == 0.0
+    assert buckets.take("k", rate=1.0, burst=2, now=0) == 1.0  # seconds until the next token
+    assert buckets.take("k", rate=1.0, burst=2, now=1.0) == 0.0
+
+
+def test_token_buckets_stay_bounded():
+    buckets = server.TokenBuckets(4)
+    for i in range(20):
+        buckets.take(f"k{i}", rate=1.0, burst=1, now=0)
+    assert len(buckets._buckets) <= 4
+
+
+def test_over_limit_requests_get_429_with_retry_after(client, login):
+    _, headers = login()
+    policy = server.RATE_LIMIT_POLICIES["create_invitation"]
+    body = {"template_id": "no-such-template", "invitation_data": {
+        "bride_name": "A", "groom_name": "B", "wedding_date": "d", "wedding_time": "t", "venue_name": "v", "venue_address": "a"
+    }}
+    statuses = [client.post("/api/invitations", headers=headers, json=body).status_code for _ in range(int(policy.burst))]
+    assert set(statuses) == {404}  # allowed through to the handler
+    
+    response = client.post("/api/invitations", headers=headers, json=body)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    
+    # Buckets are per user
+    _, other = login()
+    assert client.post("/api/invitations", headers=other, json=body).status_code == 404
+
+
+def test_rsvp_is_limited_per_ip(client):
+    policy = server.RATE_LIMIT_POLICIES["rsvp"]
+    body = {"name": "Guest", "attending": True}
+    url = "/api/public/invitations/no-such-invitation/rsvp"
+    statuses = [client.post(url, json=body).status_code for _ in range(int(policy.burst))]
+    assert set(statuses) == {404}
+    
+    response = client.post(url, json=body)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
@@ -0,0 +1,46 @@
+import server
+
+
+def build_index():
+    index = server.TemplateSearchIndex()
+    for template in server.DEFAULT_TEMPLATES:
+        index.add(template)
+    return index
+
+
+def test_ranks_matching_templates():
+    result = build_index().search("classic", {})
+    assert result["total"] >= 1
+    assert result["results"][0]["theme"] == "classic"
+
+
+def test_last_token_matches_as_prefix():
+    index = build_index()
+    assert index.search("class", {})["total"] == index.search("classic", {})["total"]
+
+
+def test_unknown_word_before_last_token_matches_nothing():
+    result = build_index().search("zzz classic", {})
+    assert result["total"] == 0
+    assert result["results"] == []
+
+
+def test_unknown_word_endpoint(client):
+    response = client.get("/api/templates/search", params={"q": "zzz classic"})
+    assert response.status_code == 200
+    assert response.json()["total"] == 0
+
+
+def test_facet_filters():
+    index = build_index()
+    result = index.search("", {"theme": "modern"})
+    assert result["total"] >= 1
+    assert all(document["theme"] == "modern" for document in result["results"])
+    assert index.search("", {"theme": "no-such-theme"})["total"] == 0
+
+
+def test_removed_template_is_not_found():
+    index = build_index()
+    template = server.DEFAULT_TEMPLATES[0]
+    index.remove(template["id"])
+    assert template["id"] not in {document["id"] for document in index.search("", {})["results"]}
@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+def test_session_store_expiry_and_sweep():
+    store = server.SessionStore()
+    store.add("a", "user-a", expires_at=100)
+    store.add("b", "user-b", expires_at=200)
+    assert store.get("a", now=50).user_id == "user-a"
+    assert store.get("a", now=150) is None  # expired on read
+    
+    assert store.sweep(now=150) == 0  # "a" is already gone; its heap entry is stale
+    assert len(store) == 1
+    assert store.sweep(now=250) == 1
+    assert len(store) == 0
+
+
+def test_session_store_revoke():
+    store = server.SessionStore()
+    store.add("a", "user-a", expires_at=100)
+    assert store.revoke("a") is True
+    assert store.revoke("a") is False
+    assert store.get("a", now=0) is None
+    assert store.sweep(now=150) == 0
+
+
+def test_session_store_replaced_entry_survives_its_old_expiry():
+    store = server.SessionStore()
+    store.add("a", "user-a", expires_at=100)
+    store.add("a", "user-a", expires_at=300)
+    assert store.sweep(now=150) == 0
+    assert store.get("a", now=150).user_id == "user-a"
+
+
+def test_session_store_sweep_is_batched():
+    store = server.SessionStore()
+    for i in range(10):
+        store.add(f"t{i}", "user", expires_at=i)
+    assert store.sweep(now=100, limit=4) == 4
+    assert store.sweep(now=100, limit=100) == 6
+
+
+@pytest.fixture
+def signing(monkeypatch):
+    def use(keys: dict):
+        monkeypatch.setattr(server, "signing_keys", {kid: secret.encode() for kid, secret in keys.items()})
+        monkeypatch.setattr(server, "active_signing_kid", next(iter(keys)))
+    use({"k1": "first-secret"})
+    monkeypatch.setattr(server, "revoked_tokens", server.SessionStore())
+    return use
+
+
+USER = server.UserRecord(id="user-1", email="a@example.com", name="A", premium=True)
+
+
+def test_signed_token_round_trip(signing):
+    token = server.issue_signed_token(USER)
+    assert server.is_signed_token(token)
+    claims = server.verify_signed_token(token)
+    assert server.user_from_claims(claims) == server.UserRecord(id="user-1", email="a@example.com", name="A", premium=True)
+
+
+def test_tampered_or_expired_signed_token(signing, monkeypatch):
+    token = server.issue_signed_token(USER)
+    version, kid, payload, signature = token.split('.')
+    forged = server._b64encode(server._b64decode(payload).replace(b'"prm":true', b'"prm":false'))
+    assert server.verify_signed_token(f"{version}.{kid}.{forged}.{signature}") is None
+    assert server.verify_signed_token("v1.k1.garbage") is None
+    
+    monkeypatch.setattr(time, "time", lambda: 2 ** 40)
+    assert server.verify_signed_token(token) is None
+
+
+def test_signing_key_rotation(signing):
+    old = server.issue_signed_token(USER)
+    signing({"k2": "second-secret", "k1": "first-secret"})  # new key signs, old still verifies
+    new = server.issue_signed_token(USER)
+    assert new.split('.')[1] == "k2"
+    assert server.verify_signed_token(old) is not None
+    assert server.verify_signed_token(new) is not None
+    
+    signing({"k2": "second-secret"})  # old key dropped
+    assert server.verify_signed_token(old) is None
+    assert server.verify_signed_token(new) is not None
+
+
+async def test_signed_token_revocation(signing):
+    token = server.issue_signed_token(USER)
+    assert await server.get_user_from_token(token) is not None
+    assert await server.revoke_session(token) is True
+    assert server.verify_signed_token(token) is None
+    assert await server.get_user_from_token(token) is None
+    assert await server.revoke_session(token) is False
+
+
+def test_opaque_session_logout(client, login):
+    _, headers = login()
+    assert client.get("/api/auth/me", headers=headers).status_code == 200
+    assert client.post("/api/auth/logout", headers=headers).status_code == 200
+    assert client.get("/api/auth/me", headers=headers).status_code == 401
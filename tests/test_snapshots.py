@@ -0,0 +1,56 @@
+import os
+
+import server
+from snapshots import SnapshotStore
+
+
+def test_store_create_only_and_prune(tmp_path):
+    store = SnapshotStore(str(tmp_path), "gen-2")
+    assert store.write("slug", {"json": b"{}", "html": b"<p></p>"}, replace=False) is True
+    assert store.write("slug", {"json": b"{\"new\":1}", "html": b""}, replace=False) is False
+    assert open(store.path("slug", "json"), "rb").read() == b"{}"
+    assert store.exists("slug")
+    
+    os.makedirs(tmp_path / "gen-1")
+    assert store.prune() == 1
+    assert os.listdir(tmp_path) == ["gen-2"]
+    
+    store.remove("slug")
+    assert not store.exists("slug")
+    assert not os.path.exists(store.path("slug", "json", gzipped=True))
+
+
+def test_published_invitation_is_served_from_its_snapshot(client, login, create_invitation):
+    _, headers = login()
+    invitation = create_invitation(headers)
+    slug = invitation["url_slug"]
+    public_url = f"/api/public/invitations/{slug}"
+    app_response = client.get(public_url, params={"g": "none"})  # a query string bypasses snapshots
+    
+    path = server.snapshot_store.path(slug, "json")
+    assert open(path, "rb").read() == app_response.content
+    
+    response = client.get(public_url)
+    assert response.content == app_response.content
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    
+    page = client.get(f"{public_url}/page")
+    assert page.headers["content-type"].startswith("text/html")
+    assert "Ana &amp; Ben" in page.text
+
+
+def test_snapshot_follows_edits_and_unpublish(client, login, create_invitation):
+    _, headers = login()
+    invitation = create_invitation(headers)
+    url = f"/api/invitations/{invitation['id']}"
+    public_url = f"/api/public/invitations/{invitation['url_slug']}"
+    
+    client.patch(url, headers=headers, json={"invitation_data": {"venue_name": "Lake House"}})
+    assert b"Lake House" in open(server.snapshot_store.path(invitation["url_slug"], "json"), "rb").read()
+    assert client.get(public_url).json()["invitation"]["invitation_data"]["venue_name"] == "Lake House"
+    
+    client.patch(url, headers=headers, json={"is_published": False})
+    assert not server.snapshot_store.exists(invitation["url_slug"])
+    assert client.get(public_url).status_code == 404
+    assert client.get(f"{public_url}/page").status_code == 404
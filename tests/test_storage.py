@@ -0,0 +1,128 @@
+"""Storage engine conformance: every engine answers the same queries the same way"""
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from storage import MemoryEngine, MongoEngine, SQLiteEngine
+
+pytestmark = pytest.mark.anyio
+
+NOW = datetime(2030, 1, 1, 12, 0, 0)
+MONGO_URL = os.environ.get("STORAGE_TEST_MONGO_URL")
+
+
+@pytest.fixture(params=[
+    "memory",
+    "sqlite",
+    pytest.param("mongodb", marks=pytest.mark.skipif(not MONGO_URL, reason="STORAGE_TEST_MONGO_URL not set")),
+])
+async def engine(request, tmp_path):
+    if request.param == "memory":
+        engine = MemoryEngine()
+    elif request.param == "sqlite":
+        engine = SQLiteEngine(str(tmp_path / "storage.db"))
+    else:
+        db_name = f"storage_test_{uuid.uuid4().hex[:8]}"
+        engine = MongoEngine(MONGO_URL, db_name, {"serverSelectionTimeoutMS": 2000})
+    await engine.connect()
+    await engine.ensure_indexes()
+    await engine.insert_many('invitations', [
+        {"id": f"inv-{i}", "user_id": f"user-{i % 3}", "url_slug": f"slug-{i}", "is_published": i % 2 == 0,
+         "views": i, "created_at": NOW + timedelta(hours=i), "invitation_data": {"bride_name": f"B{i}"}}
+        for i in range(10)
+    ])
+    await engine.insert_one('invitations', {"id": "inv-x", "user_id": "user-x", "url_slug": "slug-x", "views": None})
+    try:
+        yield engine
+    finally:
+        if request.param == "mongodb":
+            await engine.client.drop_database(db_name)
+        await engine.close()
+
+
+async def ids(engine, query, **kwargs):
+    return [doc["id"] for doc in await engine.find('invitations', query, **kwargs)]
+
+
+async def test_find_one(engine):
+    doc = await engine.find_one('invitations', {"url_slug": "slug-4"})
+    assert doc["id"] == "inv-4"
+    assert doc["created_at"] == NOW + timedelta(hours=4)
+    assert await engine.find_one('invitations', {"url_slug": "nope"}) is None
+
+
+async def test_projection(engine):
+    doc = await engine.find_one('invitations', {"id": "inv-1"}, {"_id": 0, "id": 1, "invitation_data.bride_name": 1})
+    assert doc == {"id": "inv-1", "invitation_data": {"bride_name": "B1"}}
+
+
+async def test_query_operators(engine):
+    assert await ids(engine, {"user_id": "user-0"}, sort=[("views", -1)]) == ["inv-9", "inv-6", "inv-3", "inv-0"]
+    assert await ids(engine, {"views": {"$gte": 3, "$lt": 6}}, sort=[("views", 1)]) == ["inv-3", "inv-4", "inv-5"]
+    assert await ids(engine, {"created_at": {"$gt": NOW + timedelta(hours=7)}}, sort=[("created_at", 1)]) == ["inv-8", "inv-9"]
+    assert await ids(engine, {"id": {"$in": ["inv-2", "inv-5", "missing"]}}, sort=[("id", 1)]) == ["inv-2", "inv-5"]
+    assert await ids(engine, {"is_published": True, "user_id": {"$ne": "user-0"}}, sort=[("id", 1)], limit=2) == \
+        ["inv-2", "inv-4"]
+    assert (await engine.find_one('invitations', {"invitation_data.bride_name": "B7"}))["id"] == "inv-7"
+
+
+async def test_nulls_and_missing_fields(engine):
+    assert await engine.count('invitations', {"is_published": None}) == 1
+    assert await engine.count('invitations', {"is_published": {"$exists": False}}) == 1
+    assert (await engine.find('invitations', {}, sort=[("views", 1)], limit=1))[0]["id"] == "inv-x"
+    assert await engine.count('invitations') == 11
+
+
+async def test_iterate(engine):
+    docs = [doc async for doc in engine.iterate('invitations', {"user_id": {"$ne": "user-x"}}, {"_id": 0, "id": 1}, batch_size=3)]
+    assert [doc["id"] for doc in docs] == [f"inv-{i}" for i in range(10)]
+    docs = [doc async for doc in engine.iterate('invitations', {"user_id": "user-1"}, {"_id": 0, "id": 1}, after="inv-4", batch_size=1)]
+    assert [doc["id"] for doc in docs] == ["inv-7"]
+
+
+async def test_find_joined(engine):
+    await engine.insert_many('templates', [{"id": f"tpl-{i}", "name": f"T{i}", "html_content": "<p></p>"} for i in range(2)])
+    await engine.update_many('invitations', {"user_id": "user-0"}, {"$set": {"template_id": "tpl-1"}})
+    await engine.update_one('invitations', {"id": "inv-3"}, {"$set": {"template_id": "missing"}})
+    
+    docs = await engine.find_joined('invitations', {"user_id": "user-0"}, 'templates', 'template_id', 'template',
+                                    join_projection={"_id": 0, "id": 1, "name": 1},
+                                    projection={"_id": 0, "id": 1, "template_id": 1}, sort=[("id", 1)])
+    joined = {"id": "tpl-1", "name": "T1"}
+    assert [(doc["id"], doc["template"]) for doc in docs] == \
+        [("inv-0", joined), ("inv-3", None), ("inv-6", joined), ("inv-9", joined)]
+    
+    docs = await engine.find_joined('invitations', {"user_id": "user-1"}, 'templates', 'template_id', 'template', limit=1)
+    assert [doc["template"] for doc in docs] == [None]
+    assert "template" not in await engine.find_one('invitations', {"id": "inv-0"})
+
+
+async def test_update_one(engine):
+    result = await engine.update_one('invitations', {"id": "inv-1"},
+                                     {"$set": {"invitation_data.bride_name": "Ann", "url_slug": "renamed"}, "$inc": {"views": 10}})
+    assert result.matched_count == 1
+    doc = await engine.find_one('invitations', {"url_slug": "renamed"})
+    assert (doc["id"], doc["views"], doc["invitation_data"]["bride_name"]) == ("inv-1", 11, "Ann")
+    assert await engine.find_one('invitations', {"url_slug": "slug-1"}) is None
+    assert (await engine.update_one('invitations', {"id": "missing"}, {"$set": {"views": 1}})).matched_count == 0
+
+
+async def test_bulk_upsert(engine):
+    await engine.bulk_upsert('invitations', [{"id": "inv-2", "views": 200}, {"id": "inv-new", "user_id": "user-9"}],
+                             on_insert={"is_published": False})
+    doc = await engine.find_one('invitations', {"id": "inv-2"})
+    assert (doc["views"], doc["url_slug"]) == (200, "slug-2")
+    assert (await engine.find_one('invitations', {"id": "inv-new"}))["is_published"] is False
+
+
+async def test_deletes(engine):
+    assert (await engine.delete_many('invitations', {"views": {"$lt": 3}})).deleted_count == 3
+    assert (await engine.delete_one('invitations', {"user_id": "user-x"})).deleted_count == 1
+    assert await engine.count('invitations') == 7
+
+
+async def test_document_without_id(engine):
+    await engine.insert_one('sessions', {"token_hash": "abc", "user_id": "u1", "expires_at": NOW})
+    assert (await engine.find_one('sessions', {"token_hash": "abc"}, {"_id": 0}))["user_id"] == "u1"
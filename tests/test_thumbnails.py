@@ -0,0 +1,92 @@
+import io
+
+import pytest
+from PIL import Image
+
+import rendering
+import server
+from disk_lru import DiskLRUCache
+
+
+@pytest.fixture
+def custom_template(client, login):
+    def custom_template(name: str, css: str, theme: str = "classic"):
+        _, headers = login(premium=True)
+        response = client.post("/api/templates", headers=headers, json={
+            "name": name, "description": "", "theme": theme, "html_content": "<div></div>", "css_content": css
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+    return custom_template
+
+
+def thumbnail_location(client, preview_url: str, **params) -> str:
+    response = client.get(preview_url, params=params, follow_redirects=False)
+    assert response.status_code == 302
+    return response.headers["location"]
+
+
+def test_seeded_templates_use_local_previews(client):
+    for template in client.get("/api/templates").json():
+        assert template["preview_url"] == f"/api/templates/{template['id']}/preview"
+
+
+def test_thumbnail_is_immutable_and_sized(client):
+    location = thumbnail_location(client, "/api/templates/classic-elegance/preview", size="sm", format="webp")
+    assert location.startswith("/api/thumbnails/classic-elegance-")
+    
+    response = client.get(location)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert Image.open(io.BytesIO(response.content)).width == rendering.THUMBNAIL_WIDTHS["sm"]
+
+
+def test_format_follows_accept(client):
+    response = client.get("/api/templates/classic-elegance/preview", headers={"Accept": "image/avif,image/webp"},
+                          follow_redirects=False)
+    expected = "avif" if "avif" in rendering.thumbnail_formats() else "webp"
+    assert response.headers["location"].endswith(f"-md.{expected}")
+    assert response.headers["vary"] == "Accept"
+
+
+def test_templates_sharing_a_theme_get_their_own_thumbnails(client, custom_template):
+    first = custom_template("Midnight", "body { background: #101030; color: #eeeeee; }")
+    second = custom_template("Sunrise", "body { background: #ffe0b0; color: #402000; }")
+    assert first["preview_url"] == f"/api/templates/{first['id']}/preview"
+    
+    first_location = thumbnail_location(client, first["preview_url"], size="sm", format="webp")
+    second_location = thumbnail_location(client, second["preview_url"], size="sm", format="webp")
+    assert first["id"] in first_location and second["id"] in second_location
+    first_image = client.get(first_location).content
+    assert first_image != client.get(second_location).content
+    
+    # Served from the disk cache the second time
+    assert client.get(first_location).content == first_image
+
+
+def test_render_is_served_even_if_evicted_at_once(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "thumbnail_cache", DiskLRUCache(str(tmp_path), max_bytes=1))
+    location = thumbnail_location(client, "/api/templates/classic-elegance/preview", size="sm", format="webp")
+    
+    response = client.get(location)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(response.content)).width == rendering.THUMBNAIL_WIDTHS["sm"]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_unknown_or_stale_thumbnails_are_not_found(client):
+    location = thumbnail_location(client, "/api/templates/classic-elegance/preview", format="webp")
+    stale = location.replace(location.rsplit("-", 2)[1], "0" * 12)
+    assert client.get(stale).status_code == 404
+    assert client.get("/api/thumbnails/no-such-template-000000000000-md.webp").status_code == 404
+    assert client.get("/api/templates/classic-elegance/preview", params={"size": "xl"}).status_code == 400
+
+
+def test_palette_from_default_stylesheets():
+    for template in server.DEFAULT_TEMPLATES:
+        palette = rendering.template_palette(template)
+        curated = rendering.THEME_PALETTES[template["theme"]]
+        assert palette["background"] == curated["background"]
+        assert palette["text"] == curated["text"]